@@ -0,0 +1,692 @@
+#! /usr/bin/python3
+"""Пакетное построение документов.
+
+Сценарий строит документы по списку заданий без участия пользователя.
+Для каждого задания на основе шаблона создаётся документ, в параметрах
+документа указывается файл с данными о схеме, выполняется построение
+перечня/спецификации/ведомости теми же макросами, что и в LibreOffice,
+заполняется основная надпись, после чего документ сохраняется в формате
+ODT и (или) PDF.
+
+Каждый обработчик заданий использует одно соединение с LibreOffice,
+запущенным в фоновом режиме (soffice --headless). Если LibreOffice уже
+ожидает соединения на порту обработчика, используется он, иначе
+запускается новый экземпляр с отдельным профилем пользователя.
+LibreOffice выполняет все обращения к документам последовательно, поэтому
+для параллельного построения запускается несколько обработчиков
+(--workers), каждый со своим экземпляром LibreOffice на отдельном порту
+(--port, --port + 1, ...). Задания распределяются между обработчиками
+через общую очередь. Если экземпляр LibreOffice аварийно завершается, он
+перезапускается, а задание выполняется повторно.
+
+Список заданий -- файл CSV (с заголовком) или JSON (список объектов)
+со следующими полями:
+template -- шаблон (*.ott) или документ, на основе которого строится
+    новый документ;
+source -- файл с данными о схеме (список цепей или схема KiCad);
+odt -- имя сохраняемого документа (необязательно);
+pdf -- имя сохраняемого PDF-файла (необязательно).
+Относительные пути отсчитываются от каталога файла заданий.
+
+С параметром --direct таблица не заполняется через uno-интерфейс, а
+записывается макросом построения сразу в файл ODT (поле odt обязательно).
+LibreOffice при этом всё равно необходим: пакетом для нового документа
+служит сохранённая во временный файл копия созданного из шаблона
+документа, а построенный документ открывается повторно, чтобы добавить
+лист регистрации изменений, заполнить основную надпись и сохранить PDF.
+
+Для работы сценария требуется Python с модулем uno (входит в состав
+LibreOffice).
+
+Пример:
+    python3 batch.py jobs.csv --workers 4 --report report.csv
+
+"""
+
+import argparse
+import csv
+import json
+import os
+import queue
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import zipfile
+
+import uno
+from com.sun.star.connection import NoConnectException
+
+# Макросы построения в шаблонах разных типов.
+BUILDER_SCRIPTS = ("index.py", "spec.py", "bom.py")
+
+SCRIPT_URL = "vnd.sun.star.script:{}${}?language=Python&location=document"
+
+# Фильтры сохранения документа.
+ODT_FILTER = "writer8"
+PDF_FILTER = "writer_pdf_Export"
+
+# Поля отчёта о выполнении заданий.
+REPORT_FIELDS = (
+    "template",
+    "source",
+    "odt",
+    "pdf",
+    "status",
+    "error",
+    "worker",
+    "load",
+    "build",
+    "stamp",
+    "save",
+    "total",
+)
+
+
+class BatchError(Exception):
+    pass
+
+
+def makeProperties(**values):
+    """Сформировать последовательность PropertyValue из аргументов."""
+    properties = []
+    for name, value in values.items():
+        prop = uno.createUnoStruct("com.sun.star.beans.PropertyValue")
+        prop.Name = name
+        prop.Value = value
+        properties.append(prop)
+    return tuple(properties)
+
+
+class Office():
+    """Соединение с LibreOffice.
+
+    Соединение устанавливается один раз и используется для всех заданий.
+    Если LibreOffice не ожидает соединения на указанном порту, запускается
+    новый экземпляр в фоновом режиме. Чтобы не мешать уже открытому
+    LibreOffice, запущенный экземпляр использует отдельный профиль
+    пользователя (временный, если каталог профиля не указан).
+
+    """
+
+    def __init__(self, host="localhost", port=2002, soffice="soffice",
+                 profileDir=None, timeout=60):
+        self.host = host
+        self.port = port
+        self.soffice = soffice
+        self.profileDir = profileDir
+        self.timeout = timeout
+
+        self.process = None
+        self.tempProfileDir = None
+        self.context = None
+        self.desktop = None
+
+    def connect(self):
+        """Установить соединение, при необходимости запустив LibreOffice."""
+        localContext = uno.getComponentContext()
+        resolver = localContext.ServiceManager.createInstanceWithContext(
+            "com.sun.star.bridge.UnoUrlResolver",
+            localContext
+        )
+        url = "uno:socket,host={},port={};urp;StarOffice.ComponentContext".format(
+            self.host,
+            self.port
+        )
+        deadline = time.monotonic() + self.timeout
+        while True:
+            try:
+                self.context = resolver.resolve(url)
+                break
+            except NoConnectException:
+                if self.process is None:
+                    self.start()
+                elif self.process.poll() is not None:
+                    raise BatchError(
+                        "LibreOffice завершил работу с кодом {}.".format(
+                            self.process.returncode
+                        )
+                    )
+                if time.monotonic() > deadline:
+                    raise BatchError(
+                        "Не удалось соединиться с LibreOffice ({}:{}).".format(
+                            self.host,
+                            self.port
+                        )
+                    )
+                time.sleep(0.5)
+        self.desktop = self.context.ServiceManager.createInstanceWithContext(
+            "com.sun.star.frame.Desktop",
+            self.context
+        )
+
+    def start(self):
+        """Запустить LibreOffice в фоновом режиме."""
+        profileDir = self.profileDir
+        if profileDir is None:
+            self.tempProfileDir = tempfile.mkdtemp(prefix="eskd-soffice-")
+            profileDir = self.tempProfileDir
+        self.process = subprocess.Popen(
+            [
+                self.soffice,
+                "--headless",
+                "--invisible",
+                "--nologo",
+                "--nodefault",
+                "--norestore",
+                "--nolockcheck",
+                "-env:UserInstallation=" + uno.systemPathToFileUrl(
+                    os.path.abspath(profileDir)
+                ),
+                "--accept=socket,host={},port={};urp;".format(
+                    self.host,
+                    self.port
+                ),
+            ],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL
+        )
+
+    def isAlive(self):
+        """Проверить, работает ли соединение с LibreOffice."""
+        if self.desktop is None:
+            return False
+        if self.process is not None and self.process.poll() is not None:
+            return False
+        try:
+            self.desktop.getComponents()
+        except Exception:
+            return False
+        return True
+
+    def close(self):
+        """Закрыть соединение.
+
+        Запущенный сценарием экземпляр LibreOffice завершается, а его
+        временный профиль удаляется.
+
+        """
+        if self.process is not None:
+            try:
+                self.desktop.terminate()
+            except Exception:
+                # Соединение разрывается при завершении LibreOffice.
+                pass
+            try:
+                self.process.wait(self.timeout)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+                self.process.wait()
+            self.process = None
+        if self.tempProfileDir is not None:
+            shutil.rmtree(self.tempProfileDir, ignore_errors=True)
+            self.tempProfileDir = None
+        self.context = None
+        self.desktop = None
+
+    def restart(self):
+        """Восстановить соединение после сбоя LibreOffice."""
+        if self.process is not None and self.process.poll() is None:
+            self.process.kill()
+            self.process.wait()
+        self.process = None
+        self.close()
+        self.connect()
+
+
+class Job():
+    """Задание на построение документа.
+
+    Атрибуты:
+    template -- шаблон или документ, на основе которого строится документ;
+    source -- файл с данными о схеме;
+    odt -- имя сохраняемого документа или пустая строка;
+    pdf -- имя сохраняемого PDF-файла или пустая строка.
+
+    """
+
+    def __init__(self, template, source, odt="", pdf=""):
+        self.template = template
+        self.source = source
+        self.odt = odt
+        self.pdf = pdf
+
+
+def loadJobs(fileName):
+    """Считать список заданий из файла CSV или JSON.
+
+    Возвращаемое значение -- список объектов Job.
+
+    """
+    baseDir = os.path.dirname(os.path.abspath(fileName))
+    with open(fileName, encoding="utf-8") as jobsFile:
+        if fileName.lower().endswith(".json"):
+            records = json.load(jobsFile)
+            if isinstance(records, dict):
+                records = records.get("jobs", [])
+        else:
+            sample = jobsFile.readline()
+            jobsFile.seek(0)
+            dialect = csv.Sniffer().sniff(sample, delimiters=",;\t")
+            records = list(csv.DictReader(jobsFile, dialect=dialect))
+    jobs = []
+    for index, record in enumerate(records, 1):
+        values = {}
+        for field in ("template", "source", "odt", "pdf"):
+            value = (record.get(field) or "").strip()
+            if value:
+                value = os.path.join(baseDir, os.path.expanduser(value))
+            values[field] = value
+        if not values["template"] or not values["source"]:
+            raise BatchError(
+                "Задание {}: не указан шаблон или файл с данными о схеме.".format(index)
+            )
+        if not values["odt"] and not values["pdf"]:
+            raise BatchError(
+                "Задание {}: не указано имя сохраняемого документа.".format(index)
+            )
+        jobs.append(Job(**values))
+    return jobs
+
+
+def getBuilderScript(templateFileName):
+    """Определить макрос построения по содержимому шаблона."""
+    with zipfile.ZipFile(templateFileName) as package:
+        names = set(package.namelist())
+    for script in BUILDER_SCRIPTS:
+        if "Scripts/python/" + script in names:
+            return script
+    raise BatchError(
+        "Шаблон не содержит макросов построения: {}".format(templateFileName)
+    )
+
+
+def invokeScript(doc, script, function, *args):
+    """Вызвать макрос, встроенный в документ.
+
+    Возвращаемое значение -- значение, возвращённое макросом.
+
+    """
+    scriptProvider = doc.getScriptProvider()
+    result = scriptProvider.getScript(
+        SCRIPT_URL.format(script, function)
+    ).invoke(args, (), ())
+    return result[0]
+
+
+def openDocument(office, fileName):
+    """Открыть документ (или создать его на основе шаблона) в фоновом режиме."""
+    doc = office.desktop.loadComponentFromURL(
+        uno.systemPathToFileUrl(os.path.abspath(fileName)),
+        "_blank",
+        0,
+        makeProperties(
+            Hidden=True,
+            MacroExecutionMode=uno.getConstantByName(
+                "com.sun.star.document.MacroExecMode.ALWAYS_EXECUTE_NO_WARN"
+            )
+        )
+    )
+    if doc is None:
+        raise BatchError("Не удалось открыть документ: {}".format(fileName))
+    return doc
+
+
+def waitForInit(doc, timeout):
+    """Дождаться начальной настройки документа.
+
+    Встроенные модули импортируются макросом listener.init по событию
+    создания документа, которое обрабатывается уже после завершения
+    загрузки.
+
+    """
+    deadline = time.monotonic() + timeout
+    while not invokeScript(doc, "listener.py", "isInitialized"):
+        if time.monotonic() > deadline:
+            raise BatchError("Не выполнена начальная настройка документа.")
+        time.sleep(0.1)
+
+
+def runJob(office, job, fillStamp=True, timeout=60, direct=False):
+    """Выполнить задание.
+
+    Если direct == True, таблица записывается сразу в файл ODT без
+    заполнения документа (см. buildSync в макросах построения).
+
+    Возвращаемое значение -- словарь с полями REPORT_FIELDS: состояние
+        ("ok" или "error"), текст ошибки и время выполнения этапов
+        в секундах.
+
+    """
+    result = dict.fromkeys(REPORT_FIELDS, "")
+    result.update(
+        template=job.template,
+        source=job.source,
+        odt=job.odt,
+        pdf=job.pdf,
+        status="ok"
+    )
+    startTime = time.perf_counter()
+    stageTime = startTime
+
+    def finishStage(stage):
+        nonlocal stageTime
+        now = time.perf_counter()
+        result[stage] = round(now - stageTime, 3)
+        stageTime = now
+
+    doc = None
+    odtModified = False
+    try:
+        if not os.path.isfile(job.source):
+            raise BatchError("Файл не найден: {}".format(job.source))
+        if direct and not job.odt:
+            raise BatchError("Не указан файл ODT для построения без заполнения документа.")
+        script = getBuilderScript(job.template)
+        doc = openDocument(office, job.template)
+        waitForInit(doc, timeout)
+        finishStage("load")
+
+        if direct:
+            odtFileName = os.path.abspath(job.odt)
+            os.makedirs(os.path.dirname(odtFileName), exist_ok=True)
+            error = invokeScript(
+                doc,
+                script,
+                "buildSync",
+                os.path.abspath(job.source),
+                odtFileName
+            )
+            if error:
+                raise BatchError(error)
+            doc.close(True)
+            doc = None
+            # Лист регистрации изменений добавляется, основная надпись
+            # заполняется, а PDF формируется уже в построенном документе.
+            doc = openDocument(office, odtFileName)
+            waitForInit(doc, timeout)
+            odtModified = invokeScript(doc, script, "appendRevTableSync")
+        else:
+            error = invokeScript(doc, script, "buildSync", os.path.abspath(job.source))
+            if error:
+                raise BatchError(error)
+        finishStage("build")
+
+        if fillStamp:
+            error = invokeScript(doc, "stamp.py", "fillSync")
+            if error:
+                raise BatchError(error)
+        finishStage("stamp")
+
+        for fileName, filterName in ((job.odt, ODT_FILTER), (job.pdf, PDF_FILTER)):
+            if not fileName:
+                continue
+            if direct and filterName == ODT_FILTER:
+                # Документ уже записан макросом построения.
+                if fillStamp or odtModified:
+                    doc.store()
+                continue
+            outputDir = os.path.dirname(os.path.abspath(fileName))
+            os.makedirs(outputDir, exist_ok=True)
+            doc.storeToURL(
+                uno.systemPathToFileUrl(os.path.abspath(fileName)),
+                makeProperties(FilterName=filterName, Overwrite=True)
+            )
+        finishStage("save")
+    except Exception as error:
+        result["status"] = "error"
+        result["error"] = str(error).strip() or type(error).__name__
+    finally:
+        if doc is not None:
+            try:
+                doc.close(True)
+            except Exception:
+                pass
+    result["total"] = round(time.perf_counter() - startTime, 3)
+    return result
+
+
+class Worker(threading.Thread):
+    """Обработчик заданий.
+
+    Обработчик выбирает задания из общей очереди и выполняет их
+    в собственном экземпляре LibreOffice. Если во время выполнения задания
+    соединение с LibreOffice потеряно, экземпляр перезапускается, а задание
+    выполняется ещё раз. Если LibreOffice не удаётся запустить, задание
+    возвращается в очередь для других обработчиков, а обработчик завершает
+    работу.
+
+    """
+
+    def __init__(self, number, office, jobQueue, report, fillStamp=True, timeout=60,
+                 direct=False):
+        threading.Thread.__init__(self)
+        self.name = "Worker{}".format(number)
+
+        self.number = number
+        self.office = office
+        self.jobQueue = jobQueue
+        # Функция для передачи результата: report(index, result).
+        self.report = report
+        self.fillStamp = fillStamp
+        self.timeout = timeout
+        self.direct = direct
+        # Текст ошибки, если обработчик завершил работу досрочно.
+        self.error = None
+
+    def run(self):
+        try:
+            self.office.connect()
+            while True:
+                try:
+                    index, job = self.jobQueue.get_nowait()
+                except queue.Empty:
+                    break
+                try:
+                    result = self.runJob(job)
+                except BatchError:
+                    self.jobQueue.put((index, job))
+                    raise
+                self.report(index, result)
+        except BatchError as error:
+            self.error = str(error)
+        finally:
+            self.office.close()
+
+    def runJob(self, job):
+        """Выполнить задание, перезапустив LibreOffice в случае сбоя."""
+        for attempt in range(2):
+            if not self.office.isAlive():
+                self.office.restart()
+            result = runJob(
+                self.office,
+                job,
+                self.fillStamp,
+                self.timeout,
+                self.direct
+            )
+            if result["status"] == "ok" or self.office.isAlive():
+                break
+        result["worker"] = self.number
+        return result
+
+
+def runJobs(jobs, workerCount=1, host="localhost", port=2002, soffice="soffice",
+            profileDir=None, timeout=60, fillStamp=True, report=None, direct=False):
+    """Выполнить задания с помощью нескольких обработчиков.
+
+    Аргументы:
+    jobs -- список объектов Job;
+    workerCount -- количество обработчиков (экземпляров LibreOffice);
+    host, port -- адрес и порт первого обработчика, остальные используют
+        следующие по порядку порты;
+    soffice -- исполняемый файл LibreOffice;
+    profileDir -- каталог профилей пользователя (для каждого обработчика
+        создаётся отдельный подкаталог) или None для временных профилей;
+    timeout -- время ожидания LibreOffice, с;
+    fillStamp -- заполнять ли основную надпись;
+    report -- функция report(index, result), вызываемая по завершении
+        каждого задания;
+    direct -- записывать ли таблицу сразу в файл ODT (см. runJob).
+
+    Возвращаемое значение -- список результатов (см. runJob) в порядке
+        следования заданий.
+
+    """
+    results = [None] * len(jobs)
+    lock = threading.Lock()
+
+    def reportResult(index, result):
+        with lock:
+            results[index] = result
+            if report is not None:
+                report(index, result)
+
+    jobQueue = queue.Queue()
+    for index, job in enumerate(jobs):
+        jobQueue.put((index, job))
+    workers = []
+    for number in range(workerCount):
+        workerProfileDir = None
+        if profileDir is not None:
+            workerProfileDir = os.path.join(profileDir, "worker{}".format(number))
+        office = Office(host, port + number, soffice, workerProfileDir, timeout)
+        worker = Worker(
+            number,
+            office,
+            jobQueue,
+            reportResult,
+            fillStamp,
+            timeout,
+            direct
+        )
+        worker.start()
+        workers.append(worker)
+    for worker in workers:
+        worker.join()
+    # Задания, оставшиеся в очереди, если все обработчики завершили
+    # работу досрочно.
+    errors = "; ".join(worker.error for worker in workers if worker.error)
+    while not jobQueue.empty():
+        index, job = jobQueue.get_nowait()
+        result = dict.fromkeys(REPORT_FIELDS, "")
+        result.update(
+            template=job.template,
+            source=job.source,
+            odt=job.odt,
+            pdf=job.pdf,
+            status="error",
+            error=errors
+        )
+        reportResult(index, result)
+    return results
+
+
+def formatResult(result):
+    """Сформировать строку отчёта о выполнении задания."""
+    stages = ", ".join(
+        "{} {} с".format(name, result[stage])
+        for stage, name in (
+            ("load", "загрузка"),
+            ("build", "построение"),
+            ("stamp", "надпись"),
+            ("save", "сохранение"),
+            ("total", "всего"),
+        )
+        if result[stage] != ""
+    )
+    line = "{} {} <- {}: {}".format(
+        result["status"],
+        os.path.basename(result["odt"] or result["pdf"]),
+        os.path.basename(result["source"]),
+        stages
+    )
+    if result["error"]:
+        line += "\n    " + result["error"].replace("\n", "\n    ")
+    return line
+
+
+def writeReport(fileName, results):
+    """Записать отчёт о выполнении заданий в файл CSV или JSON."""
+    with open(fileName, "w", encoding="utf-8", newline="") as reportFile:
+        if fileName.lower().endswith(".json"):
+            json.dump(results, reportFile, ensure_ascii=False, indent=2)
+        else:
+            writer = csv.DictWriter(reportFile, REPORT_FIELDS)
+            writer.writeheader()
+            writer.writerows(results)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Пакетное построение документов ЕСКД."
+    )
+    parser.add_argument("jobs", help="файл заданий (CSV или JSON)")
+    parser.add_argument("--report", help="файл отчёта (CSV или JSON)")
+    parser.add_argument("--host", default="localhost", help="адрес LibreOffice")
+    parser.add_argument("--port", type=int, default=2002, help="порт LibreOffice")
+    parser.add_argument("--soffice", default="soffice", help="исполняемый файл LibreOffice")
+    parser.add_argument("--profile", help="каталог профиля пользователя LibreOffice")
+    parser.add_argument("--timeout", type=int, default=60, help="время ожидания, с")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="количество экземпляров LibreOffice для параллельной работы"
+    )
+    parser.add_argument(
+        "--no-stamp",
+        action="store_true",
+        help="не заполнять основную надпись"
+    )
+    parser.add_argument(
+        "--direct",
+        action="store_true",
+        help="записывать таблицу сразу в файл ODT, не заполняя документ "
+             "(документ открывается дважды)"
+    )
+    args = parser.parse_args()
+    if args.workers < 1:
+        parser.error("количество экземпляров должно быть больше нуля")
+
+    try:
+        jobs = loadJobs(args.jobs)
+    except (OSError, ValueError, csv.Error, BatchError) as error:
+        print("Ошибка в файле заданий: {}".format(error), file=sys.stderr)
+        return 2
+
+    doneCount = 0
+
+    def printResult(index, result):
+        nonlocal doneCount
+        doneCount += 1
+        print("[{}/{}] {}".format(doneCount, len(jobs), formatResult(result)), flush=True)
+
+    startTime = time.perf_counter()
+    results = runJobs(
+        jobs,
+        min(args.workers, len(jobs)) or 1,
+        args.host,
+        args.port,
+        args.soffice,
+        args.profile,
+        args.timeout,
+        not args.no_stamp,
+        printResult,
+        args.direct
+    )
+    if args.report:
+        writeReport(args.report, results)
+    failed = sum(1 for result in results if result["status"] != "ok")
+    print("Выполнено заданий: {}, с ошибками: {}, время: {:.1f} с".format(
+        len(results),
+        failed,
+        time.perf_counter() - startTime
+    ))
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
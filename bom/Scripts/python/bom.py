@@ -9,7 +9,7 @@ from com.sun.star.awt import XActionListener
 
 common = sys.modules["common" + XSCRIPTCONTEXT.getDocument().RuntimeUID]
 config = sys.modules["config" + XSCRIPTCONTEXT.getDocument().RuntimeUID]
-textwidth = sys.modules["textwidth" + XSCRIPTCONTEXT.getDocument().RuntimeUID]
+tablelayout = sys.modules["tablelayout" + XSCRIPTCONTEXT.getDocument().RuntimeUID]
 
 
 class StopException(Exception):
@@ -132,6 +132,29 @@ class ProgressDialog:
             self.stopEvent.set()
 
 
+class SilentProgress:
+    """Прогресс построения без диалогового окна.
+
+    Используется вместо ProgressDialog при пакетном построении (см.
+    buildSync), когда диалоговые окна не показываются. Построение так же
+    может быть прервано установкой stopEvent.
+
+    """
+
+    def __init__(self, target):
+        self.stopEvent = threading.Event()
+        self.progress = 0
+        self.progressTotal = target
+
+    def stepUp(self):
+        if self.stopEvent.is_set():
+            raise StopException
+        self.progress += 1
+
+    def close(self):
+        pass
+
+
 class BomBuildingThread(threading.Thread):
     """Ведомость заполняется из отдельного вычислительного потока.
 
@@ -142,153 +165,82 @@ class BomBuildingThread(threading.Thread):
     текстового редактора.
 
     """
-    def __init__(self):
+    def __init__(self, fileName=None, interactive=True):
         threading.Thread.__init__(self)
         self.name = "BuildingThread"
 
         self.currentRow = 0
-        self.currentPosition = 0
+        # Если указано имя файла, построенная таблица сохраняется в новый
+        # документ на основе копии текущего документа (см.
+        # common.saveDocument), а сам текущий документ не изменяется.
+        self.fileName = fileName
+        # При пакетном построении диалоговые окна не показываются,
+        # а текст ошибки только сохраняется.
+        self.interactive = interactive
+        # Текст ошибки, если построение не выполнено (см. buildSync).
+        self.error = None
 
     def run(self):
-        # ----------------------------------------------------------------
-        # Методы для построения таблицы
-        # ----------------------------------------------------------------
-
-        def gotoNextRow(count=1):
-            table.Rows.insertByIndex(self.currentRow + 1, count)
-            self.currentRow += count
-
-        def getFontSize(col):
-            cell = table.getCellByPosition(col, self.currentRow)
-            cellCursor = cell.createTextCursor()
-            return cellCursor.CharHeight
-
-        def isRowEmpty(row):
-            lastCol = len(table.Rows[row].TableColumnSeparators)
-            rowCells = table.getCellRangeByPosition(
-                0, # left
-                row, # top
-                lastCol, # right
-                row # bottom
-            )
-            dataIsPresent = any(rowCells.DataArray[0])
-            return not dataIsPresent
-
-        def fillRow(values, isTitle=False, posIncrement=0):
-            colWidth = (6, 59, 44, 69, 54, 69, 15, 15, 15, 15, 23)
-            extraRow = [""] * len(values)
-            extremeWidthFactor = config.getint("doc", "extreme width factor")
-            doc.lockControllers()
-            for col in range(len(values)):
-                if values[col] == "" and not (col == 0 and posIncrement != 0):
-                    continue
-                if '\n' in values[col]:
-                    text = values[col]
-                    lfPos = text.find('\n')
-                    values[col] = text[:lfPos]
-                    extraRow[col] = text[(lfPos + 1):]
-                widthFactor = textwidth.getWidthFactor(
-                    values[col],
-                    getFontSize(col),
-                    colWidth[col]
-                )
-                if widthFactor < extremeWidthFactor:
-                    text = values[col]
-                    extremePos = int(len(text) * widthFactor / extremeWidthFactor)
-                    # Первая попытка: определить длину не превышающую
-                    # критическое сжатие шрифта.
-                    pos = text.rfind(" ", 0, extremePos)
-                    if pos == -1:
-                        # Вторая попытка: определить длину, которая хоть и
-                        # превышает критическое значение, но всё же меньше
-                        # максимального.
-                        pos = text.find(" ", extremePos)
-                    if pos != -1:
-                        values[col] = text[:pos]
-                        extraRow[col] = text[(pos + 1):] + '\n' + extraRow[col]
-                        widthFactor = textwidth.getWidthFactor(
-                            values[col],
-                            getFontSize(col),
-                            colWidth[col]
-                        )
-                cell = table.getCellByPosition(col, self.currentRow)
-                cellCursor = cell.createTextCursor()
-                if col == 1 and isTitle:
-                    cellCursor.ParaStyleName = "Наименование (заголовок)"
-                # Параметры символов необходимо устанавливать после
-                # параметров абзаца!
-                cellCursor.CharScaleWidth = widthFactor
-                if col == 0 and posIncrement \
-                    and config.getboolean("doc", "only components have position numbers"):
-                        if "com.sun.star.text.fieldmaster.SetExpression.Позиция" in doc.TextFieldMasters:
-                            posFieldMaster = doc.TextFieldMasters["com.sun.star.text.fieldmaster.SetExpression.Позиция"]
-                        else:
-                            posFieldMaster = doc.createInstance("com.sun.star.text.fieldmaster.SetExpression")
-                            posFieldMaster.SubType = 0
-                            posFieldMaster.Name = "Позиция"
-                        posField = doc.createInstance("com.sun.star.text.textfield.SetExpression")
-                        posField.Content = "Позиция+" + str(posIncrement)
-                        posField.attachTextFieldMaster(posFieldMaster)
-                        cell.Text.insertTextContent(cellCursor, posField, False)
-
-                        self.currentPosition += posIncrement
-                        widthFactor = textwidth.getWidthFactor(
-                            str(self.currentPosition),
-                            getFontSize(col),
-                            colWidth[col]
-                        )
-                        cellCursor.gotoStart(False)
-                        cellCursor.gotoEnd(True)
-                        cellCursor.CharScaleWidth = widthFactor
-                elif values[col]:
-                    cell.String = values[col]
-            doc.unlockControllers()
-
-            gotoNextRow()
-            if any(extraRow):
-                fillRow(extraRow, isTitle)
-
         # ----------------------------------------------------------------
         # Начало построения таблицы
         # ----------------------------------------------------------------
         doc = None
         try:
-            schematic = common.getSchematicData()
+            schematic = common.getSchematicData(self.interactive)
             if schematic is None:
+                self.error = "Не удалось получить данные о схеме."
                 return
+            settings = schematic.settings
+            # Ошибки в регулярных выражениях фильтров должны быть
+            # обнаружены до изменения документа.
+            schematic.compileFilters()
             doc = XSCRIPTCONTEXT.getDocument()
-            doc.UndoManager.lock()
-            clean(force=True)
+            if not self.fileName:
+                doc.UndoManager.lock()
+                clean(force=True)
             table = doc.TextTables["Ведомость_покупных_изделий"]
+            # Последняя строка пустой таблицы имеет ненарушенное
+            # форматирование. На её основе будут созданы новые строки.
             self.currentRow = table.Rows.Count - 1
+            if self.fileName:
+                # Таблица текущего документа не очищается, новые строки
+                # создаются на основе первой строки после заголовка.
+                self.currentRow = len(common.getTableFormat().headerRows)
             compGroups = schematic.getGroupedComponents()
             prevGroup = None
-            emptyRowsType = config.getint("doc", "empty rows between diff type")
+            emptyRowsType = settings.doc.emptyRowsBetweenDiffType
+            colWidth = (6, 59, 44, 69, 54, 69, 15, 15, 15, 15, 23)
+            layout = tablelayout.TableLayout(
+                colWidth,
+                tablelayout.getFontSizes(table, self.currentRow, len(colWidth)),
+                settings.doc.extremeWidthFactor,
+                positionColumn=0
+            )
+            titleStyles = {1: "Наименование (заголовок)"}
+            # Номера позиций компонентов размечаются вместе со строками.
+            # Если номера присваиваются всем строкам, они вставляются
+            # после окончательного размещения строк.
+            hasPositions = settings.doc.onlyComponentsHavePositionNumbers
 
             progressTotal = 6
             for group in compGroups:
                 progressTotal += len(group)
-            progressDialog = ProgressDialog(
-                "Выполняется построение ведомости\nпокупных изделий",
-                progressTotal
-            )
-
-            # В процессе заполнения ведомости, после текущей строки всегда
-            # должна оставаться пустая строка с ненарушенным форматированием.
-            # На её основе будут создаваться новые строки.
-            # По окончанию, эта строка будет удалена.
-            table.Rows.insertByIndex(self.currentRow, 1)
+            if self.interactive:
+                progressDialog = ProgressDialog(
+                    "Выполняется построение ведомости\nпокупных изделий",
+                    progressTotal
+                )
+            else:
+                progressDialog = SilentProgress(progressTotal)
 
             for group in compGroups:
                 increment = 1
                 if prevGroup is not None:
-                    doc.lockControllers()
-                    gotoNextRow(emptyRowsType)
-                    doc.unlockControllers()
-                    if config.getboolean("doc", "reserve position numbers"):
+                    layout.appendEmptyRows(emptyRowsType)
+                    if settings.doc.reservePositionNumbers:
                         increment += emptyRowsType
                 if len(group) == 1 \
-                    and not config.getboolean("doc", "every group has title"):
+                    and not settings.doc.everyGroupHasTitle:
                         compType = group[0].getBomValue("type", singular=True)
                         compName = group[0].getBomValue("name")
                         compCode = group[0].getBomValue("code")
@@ -299,21 +251,21 @@ class BomBuildingThread(threading.Thread):
                         name = (compType + ' ') if compType else ""
                         name += compName
                         compCount = str(len(group[0]))
-                        fillRow(
+                        layout.appendRow(
                             ["", name, compCode, compDoc, compDealer, compForWhat, compCount, "", "", compCount, compComment],
-                            posIncrement=increment
+                            posIncrement=increment if hasPositions else 0
                         )
                         progressDialog.stepUp()
                 else:
                     title = group[0].getBomValue("type", plural=True)
                     if title:
-                        fillRow(
+                        layout.appendRow(
                             ["", title],
-                            isTitle=True
+                            paraStyles=titleStyles
                         )
-                    if config.getboolean("doc", "empty row after group title"):
-                        gotoNextRow()
-                        if config.getboolean("doc", "reserve position numbers"):
+                    if settings.doc.emptyRowAfterGroupTitle:
+                        layout.appendEmptyRows()
+                        if settings.doc.reservePositionNumbers:
                             increment += 1
                     for compRange in group:
                         compName = compRange.getBomValue("name")
@@ -323,114 +275,60 @@ class BomBuildingThread(threading.Thread):
                         compForWhat = compRange.getBomValue("for what")
                         compComment = compRange.getBomValue("comment")
                         compCount = str(len(compRange))
-                        fillRow(
+                        layout.appendRow(
                             ["", compName, compCode, compDoc, compDealer, compForWhat, compCount, "", "", compCount, compComment],
-                            posIncrement=increment
+                            posIncrement=increment if hasPositions else 0
                         )
                         increment = 1
                         progressDialog.stepUp()
                 prevGroup = group
 
-            table.Rows.removeByIndex(self.currentRow, 2)
+            # Размещение строк по листам выполняется до записи в документ.
+            if settings.doc.prohibitTitlesAtBottom:
+                _, firstRowCount, otherRowCount = common.getFirstPageInfo()
+                layout.moveTitlesFromBottom(
+                    self.currentRow,
+                    firstRowCount,
+                    otherRowCount,
+                    1
+                )
 
             progressDialog.stepUp()
 
-            if config.getboolean("doc", "prohibit titles at bottom"):
+            if settings.doc.prohibitEmptyRowsAtTop:
                 _, firstRowCount, otherRowCount = common.getFirstPageInfo()
-                pos = firstRowCount
-                while pos < table.Rows.Count:
-                    offset = 0
-                    # Если внизу страницы пустая строка -
-                    # подняться вверх к строке с данными.
-                    while isRowEmpty(pos - offset) and pos > (offset + 1):
-                        offset += 1
-                    cell = table.getCellByPosition(1, pos - offset)
-                    cellCursor = cell.createTextCursor()
-                    if cellCursor.ParaStyleName == "Наименование (заголовок)" \
-                        and cell.String != "":
-                            offset += 1
-                            while pos > offset:
-                                cell = table.getCellByPosition(1, pos - offset)
-                                cellCursor = cell.createTextCursor()
-                                if not cellCursor.ParaStyleName == "Наименование (заголовок)" \
-                                    or cell.String == "":
-                                        doc.lockControllers()
-                                        table.Rows.insertByIndex(pos - offset, offset)
-                                        doc.unlockControllers()
-                                        break
-                                offset += 1
-                    pos += otherRowCount
+                layout.removeEmptyRowsFromTop(
+                    self.currentRow,
+                    firstRowCount,
+                    otherRowCount
+                )
 
             progressDialog.stepUp()
 
-            if config.getboolean("doc", "prohibit empty rows at top"):
-                _, firstRowCount, otherRowCount = common.getFirstPageInfo()
-                pos = firstRowCount + 1
-                while pos < table.Rows.Count:
-                    doc.lockControllers()
-                    while pos < table.Rows.Count and isRowEmpty(pos):
-                        table.Rows.removeByIndex(pos, 1)
-                    pos += otherRowCount
-                    doc.unlockControllers()
+            if not settings.doc.onlyComponentsHavePositionNumbers:
+                layout.numberAllRows()
 
             progressDialog.stepUp()
 
-            if not config.getboolean("doc", "only components have position numbers"):
-                doc.lockControllers()
-                if "com.sun.star.text.fieldmaster.SetExpression.Позиция" in doc.TextFieldMasters:
-                    posFieldMaster = doc.TextFieldMasters["com.sun.star.text.fieldmaster.SetExpression.Позиция"]
-                else:
-                    posFieldMaster = doc.createInstance("com.sun.star.text.fieldmaster.SetExpression")
-                    posFieldMaster.SubType = 0
-                    posFieldMaster.Name = "Позиция"
-                for self.currentRow in range(2, table.Rows.Count):
-                    posField = doc.createInstance("com.sun.star.text.textfield.SetExpression")
-                    posField.Content = "Позиция+1"
-                    posField.attachTextFieldMaster(posFieldMaster)
-                    cell = table.getCellByPosition(0, self.currentRow)
-                    cellCursor = cell.createTextCursor()
-                    cell.Text.insertTextContent(cellCursor, posField, False)
-
-                    widthFactor = textwidth.getWidthFactor(
-                        str(self.currentRow - 1),
-                        getFontSize(0),
-                        6
-                    )
-                    cellCursor = cell.createTextCursor()
-                    cellCursor.gotoEnd(True)
-                    cellCursor.CharScaleWidth = widthFactor
-                doc.unlockControllers()
+            if settings.doc.processRepeatedValues:
+                layout.replaceRepeatedValues((2, 3, 4, 5, 10))
 
             progressDialog.stepUp()
 
-            common.updateTableRowsHeight()
+            if self.fileName:
+                common.saveDocument(self.fileName, layout)
+                return
+            layout.write(doc, table, self.currentRow)
 
             progressDialog.stepUp()
 
-            if config.getboolean("doc", "process repeated values"):
-                doc.lockControllers()
-                colCount = 11
-                prevValues = [""] * colCount
-                repeatCount  = [0] * colCount
-                for rowIndex in range(2, table.Rows.Count):
-                    for colIndex in (2, 3, 4, 5, 10):
-                        cell = table.getCellByPosition(colIndex, rowIndex)
-                        if cell.String and cell.String == prevValues[colIndex]:
-                            repeatCount[colIndex] += 1
-                            if repeatCount[colIndex] == 1:
-                                cell.String = "То же"
-                            elif repeatCount[colIndex] > 1:
-                                cell.String = '»'
-                        else:
-                            prevValues[colIndex] = cell.String
-                            repeatCount[colIndex] = 0
-                doc.unlockControllers()
+            common.updateTableRowsHeight()
 
             progressDialog.stepUp()
 
-            if config.getboolean("doc", "append rev table"):
+            if settings.doc.appendRevTable:
                 pageCount = doc.CurrentController.PageCount
-                if pageCount > config.getint("doc", "pages rev table"):
+                if pageCount > settings.doc.pagesRevTable:
                     common.appendRevTable()
 
         except StopException:
@@ -438,18 +336,20 @@ class BomBuildingThread(threading.Thread):
             pass
         except:
             # Ошибка!
-            common.showMessage(
-                "При построении возникла ошибка:\n\n" \
-                + traceback.format_exc(),
-                "Ведомость покупных изделий"
-            )
+            self.error = traceback.format_exc()
+            if self.interactive:
+                common.showMessage(
+                    "При построении возникла ошибка:\n\n" \
+                    + self.error,
+                    "Ведомость покупных изделий"
+                )
         finally:
             if "progressDialog" in locals():
                 progressDialog.close()
             if doc is not None:
                 if doc.UndoManager.isLocked():
                     doc.UndoManager.unlock()
-                doc.UndoManager.clear()
+                    doc.UndoManager.clear()
                 if doc.hasControllersLocked():
                     doc.unlockControllers()
 
@@ -476,6 +376,59 @@ def build(*args):
     bomBuilder = BomBuildingThread()
     bomBuilder.start()
 
+def buildSync(sourceFileName="", fileName="", *args):
+    """Построить ведомость и дождаться завершения построения.
+
+    Используется для пакетного построения документов (см. batch.py):
+    построение выполняется тем же вычислительным потоком, что и в build(),
+    но управление возвращается только после его завершения. Диалоговые
+    окна не показываются: текст ошибки возвращается вызывающему.
+
+    Аргументы:
+    sourceFileName -- файл с данными о схеме; если указан, он сохраняется
+        в параметрах документа как источник данных;
+    fileName -- если указано, построенная таблица сохраняется в новый
+        документ (.odt) с этим именем, а текущий документ не изменяется.
+
+    Возвращаемое значение -- текст ошибки или пустая строка, если
+        построение выполнено успешно.
+
+    """
+    if common.isThreadWorking():
+        return "Построение уже выполняется."
+    if sourceFileName:
+        config.set("doc", "source", sourceFileName)
+        config.save()
+    bomBuilder = BomBuildingThread(
+        fileName=fileName or None,
+        interactive=False
+    )
+    bomBuilder.start()
+    bomBuilder.join()
+    return bomBuilder.error or ""
+
+def appendRevTableSync(*args):
+    """Добавить лист регистрации изменений в документ, построенный в файл.
+
+    При построении в отдельный файл (см. buildSync) таблица не заполняется
+    в текущем документе, поэтому лист регистрации изменений добавляется
+    уже после открытия построенного документа (см. batch.py), если это
+    предусмотрено параметрами и количество листов превышает заданное.
+
+    Возвращаемое значение -- True, если лист добавлен.
+
+    """
+    if not config.getboolean("doc", "append rev table"):
+        return False
+    doc = XSCRIPTCONTEXT.getDocument()
+    if "Лист_регистрации_изменений" in doc.TextTables:
+        return False
+    pageCount = doc.CurrentController.PageCount
+    if pageCount <= config.getint("doc", "pages rev table"):
+        return False
+    common.appendRevTable()
+    return True
+
 def toggleRevTable(*args):
     """Добавить/удалить таблицу регистрации изменений"""
     if common.isThreadWorking():
@@ -0,0 +1,556 @@
+"""Запись размеченной таблицы в документ OpenDocument.
+
+Размеченные строки основной таблицы (см. модуль tablelayout) записываются
+непосредственно в content.xml пакета шаблона, после чего пакет сохраняется
+как готовый документ. Таблица не заполняется построчно через
+uno-интерфейс, но пакет шаблона, параметры листов и высота строк берутся
+из открытого в LibreOffice документа (см. common.saveDocument).
+
+Шаблоном может служить как пакет .ott (или каталог, из которого он
+собирается), так и сохранённый документ: основной текст шаблона заменяется
+таблицей (сохраняются только врезки, привязанные к странице), а стили,
+основная надпись, макросы и настройки переносятся без изменений.
+
+Модуль не зависит от uno и может использоваться вне LibreOffice.
+
+"""
+
+import io
+import os
+import re
+import xml.etree.ElementTree
+import zipfile
+from xml.sax.saxutils import escape, quoteattr
+
+MIMETYPE = "application/vnd.oasis.opendocument.text"
+TEMPLATE_MIMETYPE = MIMETYPE + "-template"
+
+NS_STYLE = "urn:oasis:names:tc:opendocument:xmlns:style:1.0"
+
+# Начало имён автоматических стилей, которые добавляются в документ (не
+# должны совпадать с именами, которые назначает LibreOffice).
+STYLE_PREFIX = "eskd"
+# Имя поля-переменной с номером позиции.
+POSITION_VARIABLE = "Позиция"
+# Стиль абзаца заголовков граф таблицы.
+HEADER_PARA_STYLE = "Заголовок графы таблицы"
+# Стиль абзаца, предшествующего таблице.
+EMPTY_PARA_STYLE = "Пустой"
+
+BORDER_LINE = "0.5mm solid #000000"
+# Отступы от границ ячеек строк таблицы (сверху, снизу, слева, справа).
+ROW_CELL_PADDING = (0, 0, 50, 50)
+
+WHITESPACE_REGEXP = re.compile(r"^ | {2,}|\t")
+TAG_REGEXP = re.compile(r"<(/?)([\w.:-]+)[^>]*?(/?)>")
+# Элементы основного текста шаблона, которые переносятся в документ.
+# Остальное содержимое заменяется таблицей.
+KEPT_BODY_ELEMENTS = (
+    "office:forms",
+    "text:sequence-decls",
+    "text:user-field-decls",
+)
+
+
+class HeaderCell():
+    """Ячейка заголовка таблицы.
+
+    Размеры указываются в сотых долях миллиметра, как в uno-интерфейсе.
+
+    Атрибуты:
+    text (str) -- текст (строки разделяются символом перевода строки);
+    colSpan (int) -- количество объединённых граф;
+    rowSpan (int) -- количество объединённых строк;
+    rotated (bool) -- текст повёрнут на 90°;
+    widthFactor (int) -- масштаб шрифта по ширине в процентах или None;
+    fontSize (float) -- размер шрифта в пунктах или None;
+    lineSpacing (int) -- межстрочный интервал в процентах или None;
+    padding (tuple) -- отступы от границ (сверху, снизу, слева, справа).
+
+    """
+
+    def __init__(self, text, colSpan=1, rowSpan=1, rotated=False,
+                 widthFactor=None, fontSize=None, lineSpacing=None,
+                 padding=(50, 50, 50, 50)):
+        self.text = text
+        self.colSpan = colSpan
+        self.rowSpan = rowSpan
+        self.rotated = rotated
+        self.widthFactor = widthFactor
+        self.fontSize = fontSize
+        self.lineSpacing = lineSpacing
+        self.padding = padding
+
+
+class TableFormat():
+    """Описание основной таблицы документа.
+
+    Размеры указываются в сотых долях миллиметра, как в uno-интерфейсе.
+
+    Атрибуты:
+    name (str) -- имя таблицы;
+    width (int) -- ширина таблицы;
+    leftMargin (int) -- отступ слева;
+    colWidths (tuple) -- ширина граф;
+    headerRows (tuple) -- строки заголовка, каждая строка -- пара
+        (высота, кортеж ячеек HeaderCell); ячейки, перекрытые
+        объединёнными ячейками предыдущих граф и строк, не указываются;
+    rowStyles (tuple) -- стили абзацев граф строк таблицы.
+
+    """
+
+    def __init__(self, name, width, leftMargin, colWidths, headerRows, rowStyles):
+        self.name = name
+        self.width = width
+        self.leftMargin = leftMargin
+        self.colWidths = colWidths
+        self.headerRows = headerRows
+        self.rowStyles = rowStyles
+
+
+def _length(value):
+    """Длина в формате OpenDocument (value -- в сотых долях мм)."""
+    return "{:.2f}mm".format(value / 100)
+
+def _text(text):
+    """Текст абзаца с сохранением пробелов и табуляций."""
+    def replaceWhitespace(match):
+        value = match.group(0)
+        if value == '\t':
+            return "<text:tab/>"
+        if value == ' ':
+            return "<text:s/>"
+        return ' <text:s text:c="{}"/>'.format(len(value) - 1)
+    return WHITESPACE_REGEXP.sub(replaceWhitespace, escape(text))
+
+
+class _Package():
+    """Содержимое пакета шаблона."""
+
+    def __init__(self, fileName):
+        self.entries = {}
+        if os.path.isdir(fileName):
+            for dirPath, dirNames, fileNames in os.walk(fileName):
+                dirNames[:] = [name for name in dirNames if name != "__pycache__"]
+                for name in fileNames:
+                    # Исходный текст справки не входит в пакет (см. Makefile).
+                    if name.endswith(".adoc"):
+                        continue
+                    path = os.path.join(dirPath, name)
+                    entryName = os.path.relpath(path, fileName).replace(os.sep, '/')
+                    with open(path, "rb") as entryFile:
+                        self.entries[entryName] = entryFile.read()
+        else:
+            with zipfile.ZipFile(fileName) as zipFile:
+                for entryName in zipFile.namelist():
+                    self.entries[entryName] = zipFile.read(entryName)
+        if "content.xml" not in self.entries \
+            or "styles.xml" not in self.entries:
+                raise ValueError(
+                    "Файл \"{}\" не является документом OpenDocument.".format(fileName)
+                )
+
+    def getStyleNames(self):
+        """Соответствие отображаемых имён стилей их внутренним именам.
+
+        Возвращаемое значение -- кортеж из двух словарей
+            (стили абзацев, стили страниц).
+
+        """
+        paraStyles = {}
+        pageStyles = {}
+        attrName = "{%s}name" % NS_STYLE
+        attrDisplayName = "{%s}display-name" % NS_STYLE
+        attrFamily = "{%s}family" % NS_STYLE
+        for _, element in xml.etree.ElementTree.iterparse(
+            io.BytesIO(self.entries["styles.xml"])
+        ):
+            if element.tag == "{%s}style" % NS_STYLE:
+                if element.get(attrFamily) == "paragraph":
+                    name = element.get(attrName)
+                    paraStyles[element.get(attrDisplayName, name)] = name
+            elif element.tag == "{%s}master-page" % NS_STYLE:
+                name = element.get(attrName)
+                pageStyles[element.get(attrDisplayName, name)] = name
+            element.clear()
+        return paraStyles, pageStyles
+
+
+class _ContentWriter():
+    """Формирование content.xml."""
+
+    def __init__(self, package, tableFormat, rows, rowHeights, firstPageStyleName):
+        self.package = package
+        self.tableFormat = tableFormat
+        self.rows = rows
+        self.rowHeights = rowHeights
+        self.paraStyleNames, self.pageStyleNames = package.getStyleNames()
+        self.firstPageStyleName = firstPageStyleName
+        self.autoParaStyles = {}
+        self.cellStyles = {}
+        self.rowStyles = {}
+        self.headerXml = ""
+
+    def getStyleName(self, displayName):
+        if displayName in self.paraStyleNames:
+            return self.paraStyleNames[displayName]
+        return displayName
+
+    def getParaStyle(self, parent, widthFactor=None, fontSize=None, rotated=False, lineSpacing=None):
+        """Имя стиля абзаца с указанными параметрами символов."""
+        if widthFactor is None and fontSize is None \
+            and not rotated and lineSpacing is None:
+                return self.getStyleName(parent)
+        key = (parent, widthFactor, fontSize, rotated, lineSpacing)
+        if key not in self.autoParaStyles:
+            self.autoParaStyles[key] = "{}P{}".format(
+                STYLE_PREFIX,
+                len(self.autoParaStyles) + 1
+            )
+        return self.autoParaStyles[key]
+
+    def getCellStyle(self, col, padding):
+        """Имя стиля ячейки."""
+        key = (col > 0, padding)
+        if key not in self.cellStyles:
+            self.cellStyles[key] = "{}Cell{}".format(
+                STYLE_PREFIX,
+                len(self.cellStyles) + 1
+            )
+        return self.cellStyles[key]
+
+    def getRowStyle(self, height):
+        """Имя стиля строки указанной высоты."""
+        if height not in self.rowStyles:
+            self.rowStyles[height] = "{}Row{}".format(
+                STYLE_PREFIX,
+                len(self.rowStyles) + 1
+            )
+        return self.rowStyles[height]
+
+    def prepareStyles(self):
+        """Определить автоматические стили до записи основного текста.
+
+        Заголовок таблицы формируется заранее, так как стили его ячеек
+        зависят от расположения объединённых ячеек.
+
+        """
+        tableFormat = self.tableFormat
+        header = io.StringIO()
+        self.writeHeader(header)
+        self.headerXml = header.getvalue()
+        for col in range(len(tableFormat.colWidths)):
+            self.getCellStyle(col, ROW_CELL_PADDING)
+        headerRowCount = len(tableFormat.headerRows)
+        for index, row in enumerate(self.rows):
+            self.getRowStyle(self.rowHeights(headerRowCount + index))
+            for col, cell in enumerate(row):
+                self.getParaStyle(
+                    cell.paraStyle or tableFormat.rowStyles[col],
+                    cell.widthFactor
+                )
+
+    def writeAutomaticStyles(self, output, wrap=True):
+        tableFormat = self.tableFormat
+        if wrap:
+            output.write("<office:automatic-styles>")
+        output.write(
+            '<style:style style:name={} style:family="paragraph" '
+            'style:parent-style-name={} style:master-page-name={}/>'.format(
+                quoteattr(STYLE_PREFIX + "P0"),
+                quoteattr(self.getStyleName(EMPTY_PARA_STYLE)),
+                quoteattr(self.pageStyleNames.get(
+                    self.firstPageStyleName,
+                    self.firstPageStyleName
+                ))
+            )
+        )
+        output.write(
+            '<style:style style:name={} style:family="table">'
+            '<style:table-properties style:width="{}" fo:margin-left="{}" '
+            'table:align="left"/></style:style>'.format(
+                quoteattr(STYLE_PREFIX + "Table"),
+                _length(tableFormat.width),
+                _length(tableFormat.leftMargin)
+            )
+        )
+        for col, width in enumerate(tableFormat.colWidths):
+            output.write(
+                '<style:style style:name={} style:family="table-column">'
+                '<style:table-column-properties style:column-width="{}"/>'
+                '</style:style>'.format(
+                    quoteattr("{}Column{}".format(STYLE_PREFIX, col + 1)),
+                    _length(width)
+                )
+            )
+        for height, name in self.rowStyles.items():
+            output.write(
+                '<style:style style:name={} style:family="table-row">'
+                '<style:table-row-properties style:row-height="{}"/>'
+                '</style:style>'.format(quoteattr(name), _length(height))
+            )
+        for (hasLeftBorder, padding), name in self.cellStyles.items():
+            output.write(
+                '<style:style style:name={} style:family="table-cell">'
+                '<style:table-cell-properties style:vertical-align="middle" '
+                'fo:padding-top="{}" fo:padding-bottom="{}" '
+                'fo:padding-left="{}" fo:padding-right="{}" '
+                'fo:border-top="none" fo:border-right="none" '
+                'fo:border-left="{}" fo:border-bottom="{}"/>'
+                '</style:style>'.format(
+                    quoteattr(name),
+                    *(_length(value) for value in padding),
+                    BORDER_LINE if hasLeftBorder else "none",
+                    BORDER_LINE
+                )
+            )
+        for key, name in self.autoParaStyles.items():
+            parent, widthFactor, fontSize, rotated, lineSpacing = key
+            output.write(
+                '<style:style style:name={} style:family="paragraph" '
+                'style:parent-style-name={}>'.format(
+                    quoteattr(name),
+                    quoteattr(self.getStyleName(parent))
+                )
+            )
+            if lineSpacing is not None:
+                output.write(
+                    '<style:paragraph-properties fo:line-height="{}%"/>'.format(lineSpacing)
+                )
+            textProperties = []
+            if widthFactor is not None:
+                textProperties.append('style:text-scale="{}%"'.format(widthFactor))
+            if fontSize is not None:
+                textProperties.append('fo:font-size="{}pt"'.format(fontSize))
+            if rotated:
+                textProperties.append('style:text-rotation-angle="90"')
+            if textProperties:
+                output.write(
+                    "<style:text-properties {}/>".format(" ".join(textProperties))
+                )
+            output.write("</style:style>")
+        if wrap:
+            output.write("</office:automatic-styles>")
+
+    def writeHeader(self, output):
+        tableFormat = self.tableFormat
+        colCount = len(tableFormat.colWidths)
+        covered = set()
+        output.write("<table:table-header-rows>")
+        for rowIndex, (height, cells) in enumerate(tableFormat.headerRows):
+            output.write(
+                "<table:table-row table:style-name={}>".format(
+                    quoteattr(self.getRowStyle(height))
+                )
+            )
+            cells = iter(cells)
+            for col in range(colCount):
+                if (rowIndex, col) in covered:
+                    output.write("<table:covered-table-cell/>")
+                    continue
+                cell = next(cells)
+                for spanRow in range(rowIndex, rowIndex + cell.rowSpan):
+                    for spanCol in range(col, col + cell.colSpan):
+                        covered.add((spanRow, spanCol))
+                output.write(
+                    '<table:table-cell table:style-name={} office:value-type="string"'.format(
+                        quoteattr(self.getCellStyle(col, cell.padding))
+                    )
+                )
+                if cell.colSpan > 1:
+                    output.write(' table:number-columns-spanned="{}"'.format(cell.colSpan))
+                if cell.rowSpan > 1:
+                    output.write(' table:number-rows-spanned="{}"'.format(cell.rowSpan))
+                output.write(">")
+                paraStyle = quoteattr(self.getParaStyle(
+                    HEADER_PARA_STYLE,
+                    cell.widthFactor,
+                    cell.fontSize,
+                    cell.rotated,
+                    cell.lineSpacing
+                ))
+                for line in cell.text.split('\n'):
+                    output.write("<text:p text:style-name={}>{}</text:p>".format(
+                        paraStyle,
+                        _text(line)
+                    ))
+                output.write("</table:table-cell>")
+            output.write("</table:table-row>")
+        output.write("</table:table-header-rows>")
+
+    def writeRows(self, output):
+        tableFormat = self.tableFormat
+        headerRowCount = len(tableFormat.headerRows)
+        cellStyles = [
+            quoteattr(self.getCellStyle(col, ROW_CELL_PADDING))
+            for col in range(len(tableFormat.colWidths))
+        ]
+        position = 0
+        for index, row in enumerate(self.rows):
+            parts = ["<table:table-row table:style-name={}>".format(
+                quoteattr(self.getRowStyle(self.rowHeights(headerRowCount + index)))
+            )]
+            for col, cell in enumerate(row):
+                paraStyle = quoteattr(self.getParaStyle(
+                    cell.paraStyle or tableFormat.rowStyles[col],
+                    cell.widthFactor
+                ))
+                parts.append(
+                    '<table:table-cell table:style-name={} office:value-type="string">'
+                    '<text:p text:style-name={}>'.format(cellStyles[col], paraStyle)
+                )
+                if cell.posIncrement:
+                    position += cell.posIncrement
+                    parts.append(
+                        '<text:variable-set text:name={name} '
+                        'text:formula="ooow:{formula}" office:value-type="float" '
+                        'office:value="{value}">{value}</text:variable-set>'.format(
+                            name=quoteattr(POSITION_VARIABLE),
+                            formula=escape("{}+{}".format(POSITION_VARIABLE, cell.posIncrement)),
+                            value=position
+                        )
+                    )
+                parts.append(_text(cell.text))
+                parts.append("</text:p></table:table-cell>")
+            parts.append("</table:table-row>")
+            output.write("".join(parts))
+
+    def write(self, output):
+        content = self.package.entries["content.xml"].decode("utf-8")
+        bodyStart = re.search(r"<office:text(?:\s[^>]*)?>", content)
+        bodyEnd = content.rfind("</office:text>")
+        if bodyStart is None or bodyEnd == -1:
+            raise ValueError("В шаблоне отсутствует основной текст документа.")
+        head = content[:bodyStart.end()]
+        self.prepareStyles()
+        # Автоматические стили шаблона сохраняются, так как они могут
+        # использоваться перенесёнными врезками.
+        stylesPos = head.find("<office:automatic-styles/>")
+        if stylesPos != -1:
+            output.write(head[:stylesPos])
+            self.writeAutomaticStyles(output)
+            output.write(head[(stylesPos + len("<office:automatic-styles/>")):])
+        else:
+            stylesPos = head.find("</office:automatic-styles>")
+            if stylesPos != -1:
+                output.write(head[:stylesPos])
+                self.writeAutomaticStyles(output, wrap=False)
+                output.write(head[stylesPos:])
+            else:
+                stylesPos = head.index("<office:body>")
+                output.write(head[:stylesPos])
+                self.writeAutomaticStyles(output)
+                output.write(head[stylesPos:])
+        keptElements = dict.fromkeys(KEPT_BODY_ELEMENTS, "")
+        frames = []
+        for tagName, element in _getTopLevelElements(content[bodyStart.end():bodyEnd]):
+            if tagName in keptElements:
+                keptElements[tagName] = element
+            elif tagName.startswith("draw:") \
+                and 'text:anchor-type="page"' in element[:element.find(">")]:
+                    # Врезки, привязанные к странице (например, таблицы
+                    # изменений), не зависят от содержимого таблицы.
+                    frames.append(element)
+        output.write(keptElements["office:forms"])
+        output.write(
+            '<text:variable-decls><text:variable-decl office:value-type="float" '
+            'text:name={}/></text:variable-decls>'.format(quoteattr(POSITION_VARIABLE))
+        )
+        output.write(keptElements["text:sequence-decls"])
+        output.write(keptElements["text:user-field-decls"])
+        for frame in frames:
+            output.write(frame)
+        output.write(
+            "<text:p text:style-name={}/>".format(quoteattr(STYLE_PREFIX + "P0"))
+        )
+        output.write(
+            "<table:table table:name={} table:style-name={}>".format(
+                quoteattr(self.tableFormat.name),
+                quoteattr(STYLE_PREFIX + "Table")
+            )
+        )
+        for col in range(len(self.tableFormat.colWidths)):
+            output.write("<table:table-column table:style-name={}/>".format(
+                quoteattr("{}Column{}".format(STYLE_PREFIX, col + 1))
+            ))
+        output.write(self.headerXml)
+        self.writeRows(output)
+        output.write("</table:table>")
+        output.write(content[bodyEnd:])
+
+
+def _getTopLevelElements(text):
+    """Перечислить элементы верхнего уровня фрагмента XML.
+
+    Возвращаемое значение -- генератор пар (имя элемента, текст элемента).
+
+    """
+    depth = 0
+    start = 0
+    tagName = ""
+    for match in TAG_REGEXP.finditer(text):
+        isClosing = match.group(1) == "/"
+        isEmpty = match.group(3) == "/"
+        if depth == 0:
+            start = match.start()
+            tagName = match.group(2)
+        if isClosing:
+            depth -= 1
+        elif not isEmpty:
+            depth += 1
+        if depth == 0:
+            yield tagName, text[start:match.end()]
+
+
+def writeDocument(templateFileName, fileName, tableFormat, layout, rowHeights,
+                  firstPageStyleName="Первый лист 1"):
+    """Сформировать документ с основной таблицей.
+
+    Аргументы:
+    templateFileName (str) -- пакет шаблона (.ott, .odt или каталог с
+        содержимым пакета);
+    fileName (str) -- имя создаваемого документа (.odt);
+    tableFormat (TableFormat) -- описание основной таблицы;
+    layout (tablelayout.TableLayout) -- размеченные строки таблицы;
+    rowHeights -- функция, возвращающая высоту строки таблицы (в сотых
+        долях мм) по её номеру (с учётом строк заголовка);
+    firstPageStyleName (str) -- стиль первой страницы.
+
+    """
+    package = _Package(templateFileName)
+    writer = _ContentWriter(
+        package,
+        tableFormat,
+        layout.rows,
+        rowHeights,
+        firstPageStyleName
+    )
+    tempFileName = fileName + ".tmp"
+    try:
+        with zipfile.ZipFile(tempFileName, "w", zipfile.ZIP_DEFLATED) as zipFile:
+            # Тип документа должен быть первым и несжатым.
+            zipFile.writestr(
+                zipfile.ZipInfo("mimetype"),
+                MIMETYPE,
+                compress_type=zipfile.ZIP_STORED
+            )
+            with zipFile.open("content.xml", "w") as contentFile:
+                output = io.TextIOWrapper(contentFile, encoding="utf-8")
+                writer.write(output)
+                output.flush()
+                output.detach()
+            for entryName, data in package.entries.items():
+                if entryName in ("mimetype", "content.xml"):
+                    continue
+                if entryName == "META-INF/manifest.xml":
+                    data = data.replace(
+                        TEMPLATE_MIMETYPE.encode("utf-8"),
+                        MIMETYPE.encode("utf-8")
+                    )
+                zipFile.writestr(entryName, data)
+        os.replace(tempFileName, fileName)
+    except BaseException:
+        # Недописанный документ не должен оставаться на диске.
+        if os.path.exists(tempFileName):
+            os.remove(tempFileName)
+        raise
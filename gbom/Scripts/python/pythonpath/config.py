@@ -5,7 +5,10 @@
 
 """
 
+import collections
+import functools
 import os
+import re
 import sys
 from configparser import ConfigParser
 import tempfile
@@ -19,7 +22,91 @@ def init(scriptcontext):
     global XSCRIPTCONTEXT
     XSCRIPTCONTEXT = scriptcontext
 
+# Значения параметров по умолчанию.
+DEFAULTS = {
+    "doc": {
+        "source": "",
+        "add units": "yes",
+        "space before units": "no",
+        "separate group for each doc": "no",
+        "every group has title": "no",
+        "only components have position numbers": "no",
+        "reserve position numbers": "no",
+        "empty row after group title": "no",
+        "empty rows between diff type": 1,
+        "prohibit titles at bottom": "no",
+        "prohibit empty rows at top": "no",
+        "extreme width factor": 80,
+        "append rev table": "no",
+        "pages rev table": 3,
+        "process repeated values": "yes",
+        "footprint only": "yes",
+        "split row by \\n": "no",
+    },
+    "fields": {
+        "type": "Тип",
+        "name": "Наименование",
+        "code": "",
+        "doc": "Документ",
+        "dealer": "",
+        "comment": "Примечание",
+        "excluded": "",
+        "excluded regex": ".*",
+    },
+    "group sort fields": {
+        "1": "Обозначение",
+        "2": "Тип",
+        "3": "",
+    },
+    "group sort order": {
+        "1": "По возрастанию",
+        "2": "По возрастанию",
+        "3": "По возрастанию",
+    },
+    "group sort data": {
+        "1": "Текст+Число",
+        "2": "Текст",
+        "3": "Текст",
+    },
+    "comp sort fields": {
+        "1": "Значение!",
+        "2": "",
+        "3": "",
+    },
+    "comp sort order": {
+        "1": "По возрастанию",
+        "2": "По возрастанию",
+        "3": "По возрастанию",
+    },
+    "comp sort data": {
+        "1": "Число",
+        "2": "Текст",
+        "3": "Текст",
+    },
+    "stamp": {
+        "convert doc title": "yes",
+        "convert doc id": "yes",
+        "fill first usage": "yes",
+        "place doc id to table title": "yes",
+        "doc type is file name": "yes",
+    },
+    "settings": {
+        "pos x": "100",
+        "pos y": "100",
+        "set view options": "yes",
+        "compatibility mode": "no",
+    }
+}
+
 SETTINGS = ConfigParser()
+# Номер редакции параметров. Увеличивается при каждом изменении параметров,
+# что позволяет определить, устарели ли значения, вычисленные на их основе.
+REVISION = 0
+
+def _changed():
+    """Отметить изменение параметров."""
+    global REVISION
+    REVISION += 1
 
 def load():
     """Загрузить настройки.
@@ -27,82 +114,8 @@ def load():
     Считать параметры работы из файла.
 
     """
-    SETTINGS.read_dict(
-        {
-            "doc": {
-                "source": "",
-                "add units": "yes",
-                "space before units": "no",
-                "separate group for each doc": "no",
-                "every group has title": "no",
-                "only components have position numbers": "no",
-                "reserve position numbers": "no",
-                "empty row after group title": "no",
-                "empty rows between diff type": 1,
-                "prohibit titles at bottom": "no",
-                "prohibit empty rows at top": "no",
-                "extreme width factor": 80,
-                "append rev table": "no",
-                "pages rev table": 3,
-                "process repeated values": "yes",
-                "footprint only": "yes",
-                "split row by \\n": "no",
-            },
-            "fields": {
-                "type": "Тип",
-                "name": "Наименование",
-                "code": "",
-                "doc": "Документ",
-                "dealer": "",
-                "comment": "Примечание",
-                "excluded": "",
-                "excluded regex": ".*",
-            },
-            "group sort fields": {
-                "1": "Обозначение",
-                "2": "Тип",
-                "3": "",
-            },
-            "group sort order": {
-                "1": "По возрастанию",
-                "2": "По возрастанию",
-                "3": "По возрастанию",
-            },
-            "group sort data": {
-                "1": "Текст+Число",
-                "2": "Текст",
-                "3": "Текст",
-            },
-            "comp sort fields": {
-                "1": "Значение!",
-                "2": "",
-                "3": "",
-            },
-            "comp sort order": {
-                "1": "По возрастанию",
-                "2": "По возрастанию",
-                "3": "По возрастанию",
-            },
-            "comp sort data": {
-                "1": "Число",
-                "2": "Текст",
-                "3": "Текст",
-            },
-            "stamp": {
-                "convert doc title": "yes",
-                "convert doc id": "yes",
-                "fill first usage": "yes",
-                "place doc id to table title": "yes",
-                "doc type is file name": "yes",
-            },
-            "settings": {
-                "pos x": "100",
-                "pos y": "100",
-                "set view options": "yes",
-                "compatibility mode": "no",
-            }
-        }
-    )
+    _changed()
+    SETTINGS.read_dict(DEFAULTS)
 
     doc = XSCRIPTCONTEXT.getDocument()
     ctx = XSCRIPTCONTEXT.getComponentContext()
@@ -161,13 +174,83 @@ def getint(section, option):
 
 def set(section, option, value):
     """Установить значение "value" параметру "option" из раздела "section"."""
+    _changed()
     return SETTINGS.set(section, option, value)
 
 def setboolean(section, option, value):
     """Установить булево значение "value" параметру "option" из раздела "section"."""
     yesno = "yes" if bool(value) else "no"
+    _changed()
     return SETTINGS.set(section, option, yesno)
 
+@functools.lru_cache(maxsize=None)
+def getAttributeName(name):
+    """Вернуть имя атрибута снимка для раздела или параметра.
+
+    Имя составляется из слов названия: "add units" -> "addUnits",
+    "split row by \\n" -> "splitRowByN".
+
+    """
+    words = re.findall(r"[0-9A-Za-z]+", name)
+    return words[0] + "".join(word[0].upper() + word[1:] for word in words[1:])
+
+def _isNumbered(options):
+    """Проверить, являются ли параметры раздела пронумерованными."""
+    return all(option.isdigit() for option in options)
+
+# Типы снимков разделов параметров. Тип значения каждого параметра
+# определяется по его значению по умолчанию: "yes"/"no" -- bool, int -- int,
+# остальные -- str. Разделы с пронумерованными параметрами ("1", "2", ...)
+# представляются кортежами значений в порядке номеров.
+_SNAPSHOT_SECTIONS = {
+    section: tuple if _isNumbered(options) else collections.namedtuple(
+        getAttributeName(section) + "Snapshot",
+        [getAttributeName(option) for option in options]
+    )
+    for section, options in DEFAULTS.items()
+}
+ConfigSnapshot = collections.namedtuple(
+    "ConfigSnapshot",
+    [getAttributeName(section) for section in DEFAULTS]
+)
+_snapshot = None
+_snapshotRevision = None
+
+def snapshot():
+    """Получить снимок параметров.
+
+    Снимок -- неизменяемый объект, в котором значения всех параметров уже
+    преобразованы к нужному типу и доступны как атрибуты разделов,
+    например: snapshot().doc.addUnits, snapshot().fields.name.
+    Снимок создаётся один раз перед построением документа и используется
+    вместо многократного обращения к ConfigParser в циклах.
+    Пока параметры не изменяются, возвращается один и тот же снимок.
+
+    """
+    global _snapshot
+    global _snapshotRevision
+    if _snapshot is None or _snapshotRevision != REVISION:
+        sections = []
+        for section, options in DEFAULTS.items():
+            values = []
+            if _isNumbered(options):
+                options = dict(sorted(options.items(), key=lambda item: int(item[0])))
+            for option, default in options.items():
+                if type(default) is int:
+                    values.append(SETTINGS.getint(section, option))
+                elif default in ("yes", "no"):
+                    values.append(SETTINGS.getboolean(section, option))
+                else:
+                    values.append(SETTINGS.get(section, option))
+            sectionType = _SNAPSHOT_SECTIONS[section]
+            if sectionType is tuple:
+                sections.append(tuple(values))
+            else:
+                sections.append(sectionType(*values))
+        _snapshot = ConfigSnapshot(*sections)
+        _snapshotRevision = REVISION
+    return _snapshot
+
 def loadFromKicadbom2spec():
     """Загрузить настройки kicadbom2spec.
 
@@ -235,5 +318,6 @@ def importFromDoc(docName):
                 if param in SETTINGS[section]:
                     SETTINGS[section][param] = iSettings[section][param]
                     pCount += 1
+    _changed()
     save()
     return pCount
@@ -0,0 +1,368 @@
+"""Построение основной таблицы документа в два этапа.
+
+Каждое обращение к документу через uno-интерфейс требует обмена данными
+между процессами, поэтому заполнение таблицы по одной ячейке занимает
+значительное время. Таблица строится в два этапа:
+
+1) разметка -- строки таблицы полностью формируются в памяти: тексты
+граф, стили абзацев, масштаб шрифта, перенос длинных значений на
+следующие строки, размещение заголовков и пустых строк на границах
+листов;
+
+2) запись -- подготовленные строки переносятся в документ минимальным
+количеством обращений: все строки вставляются одним вызовом, тексты
+записываются через DataArray, а форматирование устанавливается только
+для тех ячеек, в которых оно отличается от строки-образца.
+
+"""
+
+import sys
+
+# Стили абзацев заголовков (разделов, групп) начинаются одинаково.
+TITLE_STYLE_PREFIX = "Наименование (заголовок"
+
+textwidth = None
+
+def init(scriptcontext):
+    global textwidth
+    textwidth = sys.modules["textwidth" + scriptcontext.getDocument().RuntimeUID]
+
+
+class Cell():
+    """Ячейка размеченной таблицы.
+
+    Атрибуты:
+    text (str) -- текст ячейки;
+    paraStyle (str) -- стиль абзаца или None, если используется стиль
+        строки-образца;
+    widthFactor (int) -- масштаб шрифта по ширине в процентах или None,
+        если используется масштаб строки-образца;
+    posIncrement (int) -- приращение номера позиции; если не равно нулю,
+        вместо текста в ячейку вставляется поле "Позиция+N".
+
+    """
+
+    __slots__ = ("text", "paraStyle", "widthFactor", "posIncrement")
+
+    def __init__(self):
+        self.text = ""
+        self.paraStyle = None
+        self.widthFactor = None
+        self.posIncrement = 0
+
+
+class TableLayout():
+    """Разметка строк основной таблицы.
+
+    Атрибуты:
+    colWidths (tuple) -- ширина граф в мм;
+    fontSizes (tuple) -- размер шрифта граф строки-образца в пунктах;
+    extremeWidthFactor (int) -- масштаб шрифта, при котором значение
+        переносится на следующую строку;
+    positionColumn (int) -- номер графы с номером позиции или None;
+    position (int) -- номер последней размеченной позиции;
+    rows (list) -- строки таблицы, каждая строка -- список ячеек (Cell).
+
+    """
+
+    def __init__(self, colWidths, fontSizes, extremeWidthFactor, positionColumn=None):
+        self.colWidths = colWidths
+        self.fontSizes = fontSizes
+        self.extremeWidthFactor = extremeWidthFactor
+        self.positionColumn = positionColumn
+        self.position = 0
+        self.rows = []
+
+    def _newRow(self):
+        return [Cell() for _ in self.colWidths]
+
+    def appendEmptyRows(self, count=1):
+        """Добавить пустые строки."""
+        for _ in range(count):
+            self.rows.append(self._newRow())
+
+    def appendTitle(self, col, text, paraStyle):
+        """Добавить строку с заголовком в указанной графе.
+
+        Заголовок записывается без подбора масштаба шрифта и переноса.
+
+        """
+        row = self._newRow()
+        row[col].text = text
+        row[col].paraStyle = paraStyle
+        self.rows.append(row)
+
+    def appendRow(self, values, paraStyles=None, posIncrement=0):
+        """Добавить строку с указанными значениями граф.
+
+        Часть значения после символа перевода строки, а также значение,
+        которое не помещается в графе без чрезмерного сжатия шрифта,
+        переносится на следующую строку.
+
+        Аргументы:
+        values (list) -- значения граф (количество может быть меньше
+            количества граф таблицы);
+        paraStyles (dict) -- стили абзацев непустых граф строки и её
+            продолжений: {номер графы: стиль};
+        posIncrement (int) -- приращение номера позиции; если не равно
+            нулю, в графу позиции вставляется поле "Позиция+N".
+
+        """
+        values = list(values)
+        while True:
+            row = self._newRow()
+            extraRow = [""] * len(values)
+            for col in range(len(values)):
+                isPosition = col == self.positionColumn and posIncrement != 0
+                if values[col] == "" and not isPosition:
+                    continue
+                if '\n' in values[col]:
+                    text = values[col]
+                    lfPos = text.find('\n')
+                    values[col] = text[:lfPos]
+                    extraRow[col] = text[(lfPos + 1):]
+                widthFactor = textwidth.getWidthFactor(
+                    values[col],
+                    self.fontSizes[col],
+                    self.colWidths[col]
+                )
+                if widthFactor < self.extremeWidthFactor:
+                    text = values[col]
+                    extremePos = int(len(text) * widthFactor / self.extremeWidthFactor)
+                    # Первая попытка: определить длину не превышающую
+                    # критическое сжатие шрифта.
+                    pos = text.rfind(" ", 0, extremePos)
+                    if pos == -1:
+                        # Вторая попытка: определить длину, которая хоть и
+                        # превышает критическое значение, но всё же меньше
+                        # максимального.
+                        pos = text.find(" ", extremePos)
+                    if pos != -1:
+                        values[col] = text[:pos]
+                        extraRow[col] = text[(pos + 1):] + '\n' + extraRow[col]
+                        widthFactor = textwidth.getWidthFactor(
+                            values[col],
+                            self.fontSizes[col],
+                            self.colWidths[col]
+                        )
+                cell = row[col]
+                if paraStyles and col in paraStyles:
+                    cell.paraStyle = paraStyles[col]
+                if isPosition:
+                    self.position += posIncrement
+                    cell.posIncrement = posIncrement
+                    widthFactor = textwidth.getWidthFactor(
+                        str(self.position),
+                        self.fontSizes[col],
+                        self.colWidths[col]
+                    )
+                else:
+                    cell.text = values[col]
+                cell.widthFactor = widthFactor
+            self.rows.append(row)
+            if not any(extraRow):
+                break
+            values = extraRow
+            posIncrement = 0
+
+    def _isRowEmpty(self, index):
+        """Проверить, является ли строка пустой.
+
+        Строки таблицы, предшествующие разметке, считаются заполненными.
+
+        """
+        if index < 0:
+            return False
+        for cell in self.rows[index]:
+            if cell.text or cell.posIncrement:
+                return False
+        return True
+
+    def _isTitleRow(self, index, titleColumn):
+        """Проверить, является ли строка заголовком."""
+        if index < 0:
+            return False
+        cell = self.rows[index][titleColumn]
+        return cell.paraStyle is not None \
+            and cell.paraStyle.startswith(TITLE_STYLE_PREFIX) \
+            and cell.text != ""
+
+    def moveTitlesFromBottom(self, firstRow, firstRowCount, otherRowCount, titleColumn):
+        """Не допускать размещения заголовков внизу листа.
+
+        Если последней заполненной строкой листа является заголовок, перед
+        ним добавляются пустые строки, чтобы заголовок (вместе с
+        предшествующими ему заголовками) перешёл на следующий лист.
+
+        Аргументы:
+        firstRow (int) -- номер строки таблицы, с которой будут записаны
+            размеченные строки;
+        firstRowCount (int) -- количество строк на первом листе;
+        otherRowCount (int) -- количество строк на последующих листах;
+        titleColumn (int) -- номер графы с заголовками.
+
+        """
+        if otherRowCount <= 0:
+            return
+        pos = firstRowCount
+        while pos < firstRow + len(self.rows):
+            offset = 0
+            # Если внизу страницы пустая строка -
+            # подняться вверх к строке с данными.
+            while self._isRowEmpty(pos - offset - firstRow) and pos > (offset + 1):
+                offset += 1
+            if self._isTitleRow(pos - offset - firstRow, titleColumn):
+                offset += 1
+                while pos > offset:
+                    if not self._isTitleRow(pos - offset - firstRow, titleColumn):
+                        # Строки перед разметкой не изменяются.
+                        index = max(pos - offset - firstRow, 0)
+                        self.rows[index:index] = [
+                            self._newRow() for _ in range(offset)
+                        ]
+                        break
+                    offset += 1
+            pos += otherRowCount
+
+    def removeEmptyRowsFromTop(self, firstRow, firstRowCount, otherRowCount):
+        """Удалить пустые строки в начале листов (кроме первого).
+
+        Аргументы:
+        firstRow (int) -- номер строки таблицы, с которой будут записаны
+            размеченные строки;
+        firstRowCount (int) -- количество строк на первом листе;
+        otherRowCount (int) -- количество строк на последующих листах.
+
+        """
+        if otherRowCount <= 0:
+            return
+        pos = firstRowCount + 1
+        while pos < firstRow + len(self.rows):
+            if pos >= firstRow:
+                while pos < firstRow + len(self.rows) \
+                    and self._isRowEmpty(pos - firstRow):
+                        del self.rows[pos - firstRow]
+            pos += otherRowCount
+
+    def numberAllRows(self):
+        """Присвоить номера позиций всем строкам (включая пустые)."""
+        col = self.positionColumn
+        for row in self.rows:
+            self.position += 1
+            cell = row[col]
+            cell.posIncrement = 1
+            cell.widthFactor = textwidth.getWidthFactor(
+                str(self.position),
+                self.fontSizes[col],
+                self.colWidths[col]
+            )
+
+    def replaceRepeatedValues(self, columns):
+        """Заменить повторяющиеся значения.
+
+        Значение, совпадающее со значением в предыдущей строке, заменяется
+        на "То же", а последующие повторы -- на кавычки.
+
+        Аргументы:
+        columns (tuple) -- номера граф, в которых заменяются значения.
+
+        """
+        prevValues = {col: "" for col in columns}
+        repeatCount = {col: 0 for col in columns}
+        for row in self.rows:
+            for col in columns:
+                cell = row[col]
+                if cell.text and cell.text == prevValues[col]:
+                    repeatCount[col] += 1
+                    if repeatCount[col] == 1:
+                        cell.text = "То же"
+                    else:
+                        cell.text = '»'
+                else:
+                    prevValues[col] = cell.text
+                    repeatCount[col] = 0
+
+    def write(self, doc, table, rowIndex):
+        """Записать размеченные строки в таблицу документа.
+
+        Строки вставляются перед строкой-образцом, после чего сама
+        строка-образец удаляется.
+
+        Аргументы:
+        doc -- документ;
+        table -- таблица документа;
+        rowIndex (int) -- номер строки-образца.
+
+        """
+        rowCount = len(self.rows)
+        colCount = len(self.colWidths)
+        templateStyles = []
+        templateWidthFactors = []
+        for col in range(colCount):
+            cellCursor = table.getCellByPosition(col, rowIndex).createTextCursor()
+            templateStyles.append(cellCursor.ParaStyleName)
+            templateWidthFactors.append(cellCursor.CharScaleWidth)
+        doc.lockControllers()
+        try:
+            if rowCount:
+                # Новые строки наследуют форматирование строки-образца.
+                table.Rows.insertByIndex(rowIndex, rowCount)
+                cellRange = table.getCellRangeByPosition(
+                    0, # left
+                    rowIndex, # top
+                    colCount - 1, # right
+                    rowIndex + rowCount - 1 # bottom
+                )
+                cellRange.DataArray = tuple(
+                    tuple(cell.text for cell in row) for row in self.rows
+                )
+                posFieldMaster = None
+                for rowOffset, row in enumerate(self.rows):
+                    for col, cell in enumerate(row):
+                        setStyle = cell.paraStyle is not None \
+                            and cell.paraStyle != templateStyles[col]
+                        setWidthFactor = cell.widthFactor is not None \
+                            and cell.widthFactor != templateWidthFactors[col]
+                        if not (setStyle or setWidthFactor or cell.posIncrement):
+                            continue
+                        tableCell = table.getCellByPosition(col, rowIndex + rowOffset)
+                        cellCursor = tableCell.createTextCursor()
+                        if setStyle:
+                            cellCursor.ParaStyleName = cell.paraStyle
+                        if cell.posIncrement:
+                            if posFieldMaster is None:
+                                posFieldMaster = getPositionFieldMaster(doc)
+                            posField = doc.createInstance("com.sun.star.text.textfield.SetExpression")
+                            posField.Content = "Позиция+" + str(cell.posIncrement)
+                            posField.attachTextFieldMaster(posFieldMaster)
+                            tableCell.Text.insertTextContent(cellCursor, posField, False)
+                            cellCursor.gotoStart(False)
+                        # Параметры символов необходимо устанавливать после
+                        # параметров абзаца!
+                        if setWidthFactor:
+                            cellCursor.gotoEnd(True)
+                            cellCursor.CharScaleWidth = cell.widthFactor
+            table.Rows.removeByIndex(rowIndex + rowCount, 1)
+        finally:
+            doc.unlockControllers()
+
+
+def getFontSizes(table, rowIndex, colCount):
+    """Получить размер шрифта граф указанной строки таблицы.
+
+    Возвращаемое значение (tuple) -- размер шрифта каждой графы в пунктах.
+
+    """
+    return tuple(
+        table.getCellByPosition(col, rowIndex).createTextCursor().CharHeight
+        for col in range(colCount)
+    )
+
+def getPositionFieldMaster(doc):
+    """Получить (при необходимости создать) поле-переменную "Позиция"."""
+    if "com.sun.star.text.fieldmaster.SetExpression.Позиция" in doc.TextFieldMasters:
+        return doc.TextFieldMasters["com.sun.star.text.fieldmaster.SetExpression.Позиция"]
+    posFieldMaster = doc.createInstance("com.sun.star.text.fieldmaster.SetExpression")
+    posFieldMaster.SubType = 0
+    posFieldMaster.Name = "Позиция"
+    return posFieldMaster
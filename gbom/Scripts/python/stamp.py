@@ -1,5 +1,6 @@
 import re
 import sys
+import traceback
 from os import path
 import uno
 
@@ -100,6 +101,32 @@ def fill(*args):
     schematic = common.getSchematicData()
     if schematic is None:
         return
+    fillFromSchematic(schematic)
+
+def fillSync(*args):
+    """Заполнить основную надпись без диалоговых окон.
+
+    Используется для пакетного построения документов (см. batch.py):
+    файл с данными о схеме не выбирается пользователем, а текст ошибки
+    возвращается вызывающему.
+
+    Возвращаемое значение -- текст ошибки или пустая строка, если
+        основная надпись заполнена.
+
+    """
+    if common.isThreadWorking():
+        return "Построение уже выполняется."
+    try:
+        schematic = common.getSchematicData(interactive=False)
+        if schematic is None:
+            return "Не удалось получить данные о схеме."
+        fillFromSchematic(schematic)
+    except:
+        return traceback.format_exc()
+    return ""
+
+def fillFromSchematic(schematic):
+    """Заполнить основную надпись данными о схеме."""
     doc = XSCRIPTCONTEXT.getDocument()
     doc.lockControllers()
     # Наименование документа
@@ -8,6 +8,7 @@
 import os
 import re
 import sys
+import tempfile
 import traceback
 import threading
 import uno
@@ -17,6 +18,7 @@ schematic = None
 kicadnet = None
 config = None
 textwidth = None
+odtwriter = None
 
 def init(scriptcontext):
     global XSCRIPTCONTEXT
@@ -24,11 +26,13 @@ def init(scriptcontext):
     global kicadnet
     global config
     global textwidth
+    global odtwriter
     XSCRIPTCONTEXT = scriptcontext
     schematic = sys.modules["schematic" + scriptcontext.getDocument().RuntimeUID]
     kicadnet = sys.modules["kicadnet" + scriptcontext.getDocument().RuntimeUID]
     config = sys.modules["config" + scriptcontext.getDocument().RuntimeUID]
     textwidth = sys.modules["textwidth" + XSCRIPTCONTEXT.getDocument().RuntimeUID]
+    odtwriter = sys.modules["odtwriter" + XSCRIPTCONTEXT.getDocument().RuntimeUID]
 
 STAMP_COMMON_FIELDS = (
     "2 Обозначение документа",
@@ -185,13 +189,18 @@ def showFilePicker(filePath="", title="Выбор файла с данными 
         return sourcePath
     return None
 
-def getSourceFileName():
+def getSourceFileName(interactive=True):
     """Получить имя файла с данными о схеме.
 
     Попытаться найти файл с данными о схеме в текущем каталоге.
     В случае неудачи, показать диалоговое окно выбора файла.
 
-    Для KiCad источником данных о схеме является список цепей.
+    Для KiCad источником данных о схеме является список цепей. Если список
+    цепей отсутствует, данные берутся непосредственно из файла схемы.
+
+    Аргументы:
+    interactive -- если файл не найден, предложить пользователю
+        выбрать его.
 
     Возвращаемое значение -- полное имя файла или None, если файл
         не найден или не выбран.
@@ -210,14 +219,24 @@ def getSourceFileName():
             if fileName.endswith(".kicad_pro"):
                 sourceName = fileName.replace(".kicad_pro", ".net")
         if sourceName:
-            sourcePath = os.path.join(sourceDir, sourceName)
-            if os.path.exists(sourcePath):
-                config.set("doc", "source", sourcePath)
-                config.save()
-                return sourcePath
+            for sourceExt in (".net", ".kicad_sch"):
+                sourcePath = os.path.join(
+                    sourceDir,
+                    os.path.splitext(sourceName)[0] + sourceExt
+                )
+                if os.path.exists(sourcePath):
+                    config.set("doc", "source", sourcePath)
+                    config.save()
+                    return sourcePath
+    if not interactive:
+        return None
     sourcePath = showFilePicker(
         os.path.join(sourceDir, sourceName),
-        **{"Список цепей KiCad": "*.net", "Все файлы": "*.*"}
+        **{
+            "Список цепей KiCad": "*.net;*.xml",
+            "Схема KiCad": "*.kicad_sch",
+            "Все файлы": "*.*"
+        }
     )
     if sourcePath is not None:
         config.set("doc", "source", sourcePath)
@@ -225,17 +244,22 @@ def getSourceFileName():
         return sourcePath
     return None
 
-def getSchematicData():
+def getSchematicData(interactive=True):
     """Подготовить необходимые данные о схеме.
 
     Выбрать из файла данные о компонентах и данные для заполнения
     основной надписи.
 
+    Аргументы:
+    interactive -- показывать ли диалоговые окна; если False, файл
+        не выбирается пользователем, а ошибки при получении данных
+        передаются вызывающему в виде исключений.
+
     Возвращаемое значение -- объект класса Schematic или None, если
         файл не найден или данные в файле отсутствуют.
 
     """
-    sourceFileName = getSourceFileName()
+    sourceFileName = getSourceFileName(interactive)
     if sourceFileName is None:
         # Отменено пользователем
         #showMessage(
@@ -243,6 +267,8 @@ def getSchematicData():
         #    "Спецификация"
         #)
         return None
+    if not interactive:
+        return schematic.Schematic(sourceFileName)
     try:
         return schematic.Schematic(sourceFileName)
     except kicadnet.ParseException as error:
@@ -341,7 +367,7 @@ def getFirstPageInfo():
         return (firstPageVariant, firstRowCount, otherRowCount, varTableIsPresent)
     return ("?", 0, 0, varTableIsPresent)
 
-def getTableRowHeight(rowIndex):
+def getTableRowHeight(rowIndex, firstPageInfo=None):
     """Вычислить высоту строки основной таблицы.
 
     Высота строк подбирается так, чтобы нижнее обрамление последней строки
@@ -349,13 +375,17 @@ def getTableRowHeight(rowIndex):
 
     Аргументы:
 
-    rowIndex -- номер строки.
+    rowIndex -- номер строки;
+    firstPageInfo -- информация о первом листе (см. getFirstPageInfo),
+        если не указана -- определяется по документу.
 
     Возвращаемое значение -- высота строки таблицы.
 
     """
     height = 800
-    firstPageVariant, firstRowCount, otherRowCount, varTableIsPresent = getFirstPageInfo()
+    if firstPageInfo is None:
+        firstPageInfo = getFirstPageInfo()
+    firstPageVariant, firstRowCount, otherRowCount, varTableIsPresent = firstPageInfo
     if firstPageVariant == "?":
         return height
     if rowIndex <= firstRowCount:
@@ -391,9 +421,10 @@ def updateTableRowsHeight():
     if "Спецификация" not in doc.TextTables:
         return
     table = doc.TextTables["Спецификация"]
+    firstPageInfo = getFirstPageInfo()
     doc.lockControllers()
     for rowIndex in range(2, table.Rows.Count):
-        table.Rows[rowIndex].Height = getTableRowHeight(rowIndex)
+        table.Rows[rowIndex].Height = getTableRowHeight(rowIndex, firstPageInfo)
     doc.unlockControllers()
 
 def rebuildTable():
@@ -570,6 +601,97 @@ def rebuildTable():
     SKIP_MODIFY_EVENTS = False
     updateVarTablePosition()
 
+def getTableFormat():
+    """Описание основной таблицы для формирования документа без LibreOffice.
+
+    Описание соответствует таблице, которую строит rebuildTable().
+
+    Возвращаемое значение -- объект odtwriter.TableFormat.
+
+    """
+    doc = XSCRIPTCONTEXT.getDocument()
+    if "Спецификация" in doc.TextTables:
+        amountTitle = doc.TextTables["Спецификация"].getCellByName("F1").String
+    else:
+        amountTitle = "Кол. на исполнение"
+    return odtwriter.TableFormat(
+        name="Спецификация",
+        width=28700,
+        leftMargin=500,
+        colWidths=(600, 600, 800, 7000, 6300) + (1000,) * 10 + (3400,),
+        headerRows=(
+            (700, (
+                odtwriter.HeaderCell(
+                    "Формат",
+                    rowSpan=2,
+                    rotated=True,
+                    widthFactor=85,
+                    padding=(50, 50, 0, 100)
+                ),
+                odtwriter.HeaderCell(
+                    "Зона",
+                    rowSpan=2,
+                    rotated=True,
+                    padding=(50, 50, 0, 100)
+                ),
+                odtwriter.HeaderCell("Поз.", rowSpan=2, rotated=True),
+                odtwriter.HeaderCell("Обозначение", rowSpan=2),
+                odtwriter.HeaderCell("Наименование", rowSpan=2),
+                odtwriter.HeaderCell(amountTitle, colSpan=10),
+                odtwriter.HeaderCell("Приме-\nчание", rowSpan=2)
+            )),
+            (800, tuple(
+                odtwriter.HeaderCell(name) for name in (
+                    "―", "01", "02", "03", "04", "05", "06", "07", "08", "09"
+                )
+            ))
+        ),
+        rowStyles=(
+            "Формат",
+            "Зона",
+            "Поз.",
+            "Обозначение",
+            "Наименование"
+        ) + ("Кол.",) * 10 + (
+            "Примечание",
+        )
+    )
+
+def saveDocument(fileName, layout):
+    """Сохранить документ с основной таблицей из разметки.
+
+    Документ формируется модулем odtwriter без заполнения таблицы через
+    uno-интерфейс. Пакетом шаблона служит копия текущего документа,
+    поэтому основная надпись, стиль первого листа и параметры переносятся
+    из него; сам текущий документ не изменяется. Высота строк вычисляется
+    так же, как для таблицы текущего документа.
+
+    Аргументы:
+    fileName (str) -- имя создаваемого документа (.odt);
+    layout (tablelayout.TableLayout) -- размеченные строки таблицы.
+
+    """
+    doc = XSCRIPTCONTEXT.getDocument()
+    firstPageStyleName = doc.Text.createTextCursor().PageDescName
+    firstPageInfo = getFirstPageInfo()
+    filterName = uno.createUnoStruct("com.sun.star.beans.PropertyValue")
+    filterName.Name = "FilterName"
+    filterName.Value = "writer8"
+    tempFile = tempfile.NamedTemporaryFile(suffix=".odt", delete=False)
+    tempFile.close()
+    try:
+        doc.storeToURL(uno.systemPathToFileUrl(tempFile.name), (filterName,))
+        odtwriter.writeDocument(
+            tempFile.name,
+            fileName,
+            getTableFormat(),
+            layout,
+            lambda rowIndex: getTableRowHeight(rowIndex, firstPageInfo),
+            firstPageStyleName
+        )
+    finally:
+        os.remove(tempFile.name)
+
 def appendRevTable():
     """Добавить таблицу регистрации изменений."""
     doc = XSCRIPTCONTEXT.getDocument()
@@ -158,9 +158,9 @@ def setup(*args):
     labelModel00.Label = "Файл с данными о схеме:"
     labelModel00.HelpText = """\
 Источником данных о схеме является
-файл списка цепей KiCad.
+файл списка цепей или схемы KiCad.
 Поддерживаются файлы с расширением
-*.net (Pcbnew)."""
+*.net (Pcbnew), *.xml (BOM) и *.kicad_sch."""
     pageModel0.insertByName("Label00", labelModel00)
 
     buttonModel00 = pageModel0.createInstance(
@@ -1879,7 +1879,11 @@ class Button00ActionListener(unohelper.Base, XActionListener):
         editControl = self.dialog.getControl("Tabs").getControl("Page0").getControl("EditControl00")
         source = common.showFilePicker(
             editControl.Text,
-            **{"Список цепей KiCad": "*.net", "Все файлы": "*.*"}
+            **{
+                "Список цепей KiCad": "*.net;*.xml",
+                "Схема KiCad": "*.kicad_sch",
+                "Все файлы": "*.*"
+            }
         )
         if source is not None:
             editControl.Text = source
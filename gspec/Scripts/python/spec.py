@@ -9,7 +9,7 @@ from com.sun.star.awt import XActionListener
 
 common = sys.modules["common" + XSCRIPTCONTEXT.getDocument().RuntimeUID]
 config = sys.modules["config" + XSCRIPTCONTEXT.getDocument().RuntimeUID]
-textwidth = sys.modules["textwidth" + XSCRIPTCONTEXT.getDocument().RuntimeUID]
+tablelayout = sys.modules["tablelayout" + XSCRIPTCONTEXT.getDocument().RuntimeUID]
 
 
 class StopException(Exception):
@@ -132,6 +132,29 @@ class ProgressDialog:
             self.stopEvent.set()
 
 
+class SilentProgress:
+    """Прогресс построения без диалогового окна.
+
+    Используется вместо ProgressDialog при пакетном построении (см.
+    buildSync), когда диалоговые окна не показываются. Построение так же
+    может быть прервано установкой stopEvent.
+
+    """
+
+    def __init__(self, target):
+        self.stopEvent = threading.Event()
+        self.progress = 0
+        self.progressTotal = target
+
+    def stepUp(self):
+        if self.stopEvent.is_set():
+            raise StopException
+        self.progress += 1
+
+    def close(self):
+        pass
+
+
 class SpecBuildingThread(threading.Thread):
     """Спецификация заполняется из отдельного вычислительного потока.
 
@@ -142,28 +165,28 @@ class SpecBuildingThread(threading.Thread):
     текстового редактора.
 
     """
-    def __init__(self, update=False):
+    def __init__(self, update=False, fileName=None, interactive=True):
         threading.Thread.__init__(self)
         self.name = "BuildingThread"
 
         self.currentRow = 0
         self.currentPosition = 0
         self.update = update
+        # Если указано имя файла, построенная таблица сохраняется в новый
+        # документ на основе копии текущего документа (см.
+        # common.saveDocument), а сам текущий документ не изменяется.
+        self.fileName = fileName
+        # При пакетном построении диалоговые окна не показываются,
+        # а текст ошибки только сохраняется.
+        self.interactive = interactive
+        # Текст ошибки, если построение не выполнено (см. buildSync).
+        self.error = None
 
     def run(self):
         # --------------------------------------------------------------------
         # Методы для построения таблицы
         # --------------------------------------------------------------------
 
-        def gotoNextRow(count=1):
-            table.Rows.insertByIndex(self.currentRow + 1, count)
-            self.currentRow += count
-
-        def getFontSize(col):
-            cell = table.getCellByPosition(col, self.currentRow)
-            cellCursor = cell.createTextCursor()
-            return cellCursor.CharHeight
-
         def isRowEmpty(row):
             lastCol = len(table.Rows[row].TableColumnSeparators)
             rowCells = table.getCellRangeByPosition(
@@ -175,98 +198,71 @@ class SpecBuildingThread(threading.Thread):
             dataIsPresent = any(rowCells.DataArray[0])
             return not dataIsPresent
 
-        def fillSectionTitle(section):
-            doc.lockControllers()
-            cell = table.getCellByPosition(4, self.currentRow)
+        def isTitleRow(row):
+            cell = table.getCellByPosition(4, row)
             cellCursor = cell.createTextCursor()
-            cellCursor.ParaStyleName = "Наименование (заголовок раздела)"
-            cell.String = section
-            gotoNextRow()
-            doc.unlockControllers()
-
-        def fillRow(values, isTitle=False, posIncrement=0):
-            colWidth = (5, 5, 7, 69, 62, 9, 9, 9, 9, 9, 9, 9, 9, 9, 9, 32)
-            extraRow = [""] * len(values)
-            extremeWidthFactor = config.getint("doc", "extreme width factor")
-            doc.lockControllers()
-            for col in range(len(values)):
-                if values[col] == "" and not (col == 2 and posIncrement != 0):
+            return cellCursor.ParaStyleName.startswith(tablelayout.TITLE_STYLE_PREFIX) \
+                and cell.String != ""
+
+        def moveTitlesFromBottom(firstRow, firstRowCount, otherRowCount):
+            # Аналог TableLayout.moveTitlesFromBottom для строк таблицы,
+            # начиная с firstRow.
+            pos = firstRowCount
+            while pos < table.Rows.Count:
+                if pos < firstRow:
+                    pos += otherRowCount
                     continue
-                if '\n' in values[col]:
-                    text = values[col]
-                    lfPos = text.find('\n')
-                    values[col] = text[:lfPos]
-                    extraRow[col] = text[(lfPos + 1):]
-                widthFactor = textwidth.getWidthFactor(
-                    values[col],
-                    getFontSize(col),
-                    colWidth[col]
-                )
-                if widthFactor < extremeWidthFactor:
-                    text = values[col]
-                    extremePos = int(len(text) * widthFactor / extremeWidthFactor)
-                    # Первая попытка: определить длину не превышающую
-                    # критическое сжатие шрифта.
-                    pos = text.rfind(" ", 0, extremePos)
-                    if pos == -1:
-                        # Вторая попытка: определить длину, которая хоть и
-                        # превышает критическое значение, но всё же меньше
-                        # максимального.
-                        pos = text.find(" ", extremePos)
-                    if pos != -1:
-                        values[col] = text[:pos]
-                        extraRow[col] = text[(pos + 1):] + '\n' + extraRow[col]
-                        widthFactor = textwidth.getWidthFactor(
-                            values[col],
-                            getFontSize(col),
-                            colWidth[col]
-                        )
-                cell = table.getCellByPosition(col, self.currentRow)
-                cellCursor = cell.createTextCursor()
-                if col == 4 and isTitle:
-                    cellCursor.ParaStyleName = "Наименование (заголовок группы)"
-                # Параметры символов необходимо устанавливать после
-                # параметров абзаца!
-                cellCursor.CharScaleWidth = widthFactor
-                if col == 2 and posIncrement:
-                    if "com.sun.star.text.fieldmaster.SetExpression.Позиция" in doc.TextFieldMasters:
-                        posFieldMaster = doc.TextFieldMasters["com.sun.star.text.fieldmaster.SetExpression.Позиция"]
-                    else:
-                        posFieldMaster = doc.createInstance("com.sun.star.text.fieldmaster.SetExpression")
-                        posFieldMaster.SubType = 0
-                        posFieldMaster.Name = "Позиция"
-                    posField = doc.createInstance("com.sun.star.text.textfield.SetExpression")
-                    posField.Content = "Позиция+" + str(posIncrement)
-                    posField.attachTextFieldMaster(posFieldMaster)
-                    cell.Text.insertTextContent(cellCursor, posField, False)
-
-                    self.currentPosition += posIncrement
-                    widthFactor = textwidth.getWidthFactor(
-                        str(self.currentPosition),
-                        getFontSize(col),
-                        colWidth[col]
-                    )
-                    cellCursor.gotoStart(False)
-                    cellCursor.gotoEnd(True)
-                    cellCursor.CharScaleWidth = widthFactor
-                elif values[col]:
-                    cell.String = values[col]
-            doc.unlockControllers()
+                offset = 0
+                # Если внизу страницы пустая строка -
+                # подняться вверх к строке с данными.
+                while isRowEmpty(pos - offset) and pos > (offset + 1):
+                    offset += 1
+                if isTitleRow(pos - offset):
+                    offset += 1
+                    while pos > offset:
+                        if not isTitleRow(pos - offset):
+                            doc.lockControllers()
+                            table.Rows.insertByIndex(pos - offset, offset)
+                            doc.unlockControllers()
+                            break
+                        offset += 1
+                pos += otherRowCount
+
+        def removeEmptyRowsFromTop(firstRow, firstRowCount, otherRowCount):
+            # Аналог TableLayout.removeEmptyRowsFromTop для строк таблицы,
+            # начиная с firstRow.
+            pos = firstRowCount + 1
+            while pos < table.Rows.Count:
+                if pos >= firstRow:
+                    doc.lockControllers()
+                    while pos < table.Rows.Count and isRowEmpty(pos):
+                        table.Rows.removeByIndex(pos, 1)
+                    doc.unlockControllers()
+                pos += otherRowCount
 
-            gotoNextRow()
-            if any(extraRow):
-                fillRow(extraRow, isTitle)
+        def fillSectionTitle(section):
+            layout.appendTitle(
+                4,
+                section,
+                "Наименование (заголовок раздела)"
+            )
 
         # --------------------------------------------------------------------
         # Начало построения таблицы
         # --------------------------------------------------------------------
         doc = None
         try:
-            schematic = common.getSchematicData()
+            schematic = common.getSchematicData(self.interactive)
             if schematic is None:
+                self.error = "Не удалось получить данные о схеме."
                 return
+            settings = schematic.settings
+            # Ошибки в регулярных выражениях фильтров должны быть
+            # обнаружены до изменения документа.
+            schematic.compileFilters()
             doc = XSCRIPTCONTEXT.getDocument()
-            doc.UndoManager.lock()
+            if not self.fileName:
+                doc.UndoManager.lock()
             if self.update:
                 if "Спецификация" not in doc.TextTables:
                     common.showMessage(
@@ -274,11 +270,15 @@ class SpecBuildingThread(threading.Thread):
                         "Ошибка"
                     )
                     return
-            else:
+            elif not self.fileName:
                 clean(force=True)
             table = doc.TextTables["Спецификация"]
             tableRowCount = table.Rows.Count
             self.currentRow = tableRowCount - 1
+            if self.fileName:
+                # Таблица текущего документа не очищается, новые строки
+                # создаются на основе первой строки после заголовка.
+                self.currentRow = len(common.getTableFormat().headerRows)
             if self.update:
                 otherPartsFirstRow = 0
                 otherPartsLastRow = 0
@@ -307,19 +307,22 @@ class SpecBuildingThread(threading.Thread):
                     return
             compGroups = schematic.getGroupedComponents()
             prevGroup = None
-            emptyRowsType = config.getint("doc", "empty rows between diff type")
+            emptyRowsType = settings.doc.emptyRowsBetweenDiffType
 
             progressTotal = 5 if self.update else 8
-            if config.getboolean("sections", "other parts"):
+            if settings.sections.otherParts:
                 for group in compGroups:
                     progressTotal += len(group)
             progressMessage = "Выполняется построение спецификации"
             if self.update:
                 progressMessage = "Выполняется обновление раздела \"Прочие изделия\""
-            progressDialog = ProgressDialog(
-                progressMessage,
-                progressTotal
-            )
+            if self.interactive:
+                progressDialog = ProgressDialog(
+                    progressMessage,
+                    progressTotal
+                )
+            else:
+                progressDialog = SilentProgress(progressTotal)
 
             if self.update:
                 # Удалить содержимое раздела
@@ -353,24 +356,30 @@ class SpecBuildingThread(threading.Thread):
 
                 progressDialog.stepUp()
 
-            # В процессе заполнения специф., после текущей строки всегда должна
-            # оставаться пустая строка с ненарушенным форматированием.
-            # На её основе будут создаваться новые строки.
-            # По окончанию, эта строка будет удалена.
-            table.Rows.insertByIndex(self.currentRow, 1)
+            # Текущая строка имеет ненарушенное форматирование.
+            # На её основе будут созданы новые строки.
+            colWidth = (5, 5, 7, 69, 62, 9, 9, 9, 9, 9, 9, 9, 9, 9, 9, 32)
+            layout = tablelayout.TableLayout(
+                colWidth,
+                tablelayout.getFontSizes(table, self.currentRow, len(colWidth)),
+                settings.doc.extremeWidthFactor,
+                positionColumn=2
+            )
+            layout.position = self.currentPosition
+            titleStyles = {4: "Наименование (заголовок группы)"}
 
             if not self.update:
-                if config.getboolean("sections", "documentation"):
-                    if not config.getboolean("doc", "prohibit empty rows at top"):
-                        gotoNextRow()
+                if settings.sections.documentation:
+                    if not settings.doc.prohibitEmptyRowsAtTop:
+                        layout.appendEmptyRows()
                     fillSectionTitle("Документация")
 
-                    if config.getboolean("sections", "assembly drawing") \
-                        or config.getboolean("sections", "schematic") \
-                        or config.getboolean("sections", "index"):
-                            gotoNextRow()
+                    if settings.sections.assemblyDrawing \
+                        or settings.sections.schematic \
+                        or settings.sections.index:
+                            layout.appendEmptyRows()
 
-                    if config.getboolean("sections", "assembly drawing"):
+                    if settings.sections.assemblyDrawing:
                         size, ref = common.getPcbInfo()
                         if not ref:
                             _, ref = common.getSchematicInfo()
@@ -383,18 +392,18 @@ class SpecBuildingThread(threading.Thread):
                             if ref:
                                 ref += "СБ"
                         name = "Сборочный чертёж"
-                        fillRow(
+                        layout.appendRow(
                             [size, "", "", ref, name, "X"]
                         )
 
-                    if config.getboolean("sections", "schematic"):
+                    if settings.sections.schematic:
                         size, ref = common.getSchematicInfo()
                         name = "Схема электрическая принципиальная"
-                        fillRow(
+                        layout.appendRow(
                             [size, "", "", ref, name, "X"]
                         )
 
-                    if config.getboolean("sections", "index"):
+                    if settings.sections.index:
                         size, ref = common.getSchematicInfo()
                         size = "A4"
                         refParts = re.match(
@@ -404,11 +413,11 @@ class SpecBuildingThread(threading.Thread):
                         if refParts is not None:
                             ref = 'П'.join(refParts.groups())
                         name = "Перечень элементов"
-                        fillRow(
+                        layout.appendRow(
                             [size, "", "", ref, name, "X"]
                         )
 
-                    if config.getboolean("sections", "bom"):
+                    if settings.sections.bom:
                         size, ref = common.getSchematicInfo()
                         size = "A3"
                         refParts = re.match(
@@ -417,65 +426,63 @@ class SpecBuildingThread(threading.Thread):
                         )
                         if refParts is not None:
                             ref = refParts[1] + 'ВП'
-                        name = config.get("sections", "bom name")
+                        name = settings.sections.bomName
                         if not name:
                             name = "Ведомость покупных изделий"
-                        fillRow(
+                        layout.appendRow(
                             [size, "", "", ref, name, "X"]
                         )
 
                 progressDialog.stepUp()
 
-                if config.getboolean("sections", "assembly units"):
-                    gotoNextRow()
+                if settings.sections.assemblyUnits:
+                    layout.appendEmptyRows()
                     fillSectionTitle("Сборочные единицы")
 
-                    if config.getboolean("sections", "assembly pcb"):
-                        gotoNextRow()
+                    if settings.sections.assemblyPcb:
+                        layout.appendEmptyRows()
                         name = "Плата печатная"
-                        fillRow(
+                        layout.appendRow(
                             ["", "", "", "", name, "1"],
                             posIncrement=1
                         )
 
                 progressDialog.stepUp()
 
-                if config.getboolean("sections", "details"):
-                    gotoNextRow()
+                if settings.sections.details:
+                    layout.appendEmptyRows()
                     fillSectionTitle("Детали")
 
-                    if config.getboolean("sections", "pcb"):
-                        gotoNextRow()
+                    if settings.sections.pcb:
+                        layout.appendEmptyRows()
                         name = "Плата печатная"
-                        fillRow(
+                        layout.appendRow(
                             ["", "", "", "", name, "1"],
                             posIncrement=1
                         )
 
                 progressDialog.stepUp()
 
-                if config.getboolean("sections", "standard parts"):
-                    gotoNextRow()
+                if settings.sections.standardParts:
+                    layout.appendEmptyRows()
                     fillSectionTitle("Стандартные изделия")
 
                 progressDialog.stepUp()
 
-            if config.getboolean("sections", "other parts"):
+            if settings.sections.otherParts:
                 if not self.update:
-                    gotoNextRow()
+                    layout.appendEmptyRows()
                 fillSectionTitle("Прочие изделия")
 
-                gotoNextRow()
+                layout.appendEmptyRows()
                 for group in compGroups:
                     increment = 1
                     if prevGroup is not None:
-                        doc.lockControllers()
-                        gotoNextRow(emptyRowsType)
-                        doc.unlockControllers()
-                        if config.getboolean("doc", "reserve position numbers"):
+                        layout.appendEmptyRows(emptyRowsType)
+                        if settings.doc.reservePositionNumbers:
                             increment += emptyRowsType
                     if len(group) == 1 \
-                        and not config.getboolean("doc", "every group has title"):
+                        and not settings.doc.everyGroupHasTitle:
                             compType = group[0].getSpecValue("type", singular=True)
                             compName = group[0].getSpecValue("name")
                             compDoc = group[0].getSpecValue("doc")
@@ -491,7 +498,7 @@ class SpecBuildingThread(threading.Thread):
                                     comment = comment + '\n' + compComment
                             else:
                                 comment = compComment
-                            fillRow(
+                            layout.appendRow(
                                 ["", "", "", "", name, str(len(group[0])), "", "", "", "", "", "", "", "", "", comment],
                                 posIncrement=increment
                             )
@@ -500,13 +507,13 @@ class SpecBuildingThread(threading.Thread):
                         titleLines = group.getTitle()
                         for title in titleLines:
                             if title:
-                                fillRow(
+                                layout.appendRow(
                                     ["", "", "", "", title],
-                                    isTitle=True
+                                    paraStyles=titleStyles
                                 )
-                        if config.getboolean("doc", "empty row after group title"):
-                            gotoNextRow()
-                            if config.getboolean("doc", "reserve position numbers"):
+                        if settings.doc.emptyRowAfterGroupTitle:
+                            layout.appendEmptyRows()
+                            if settings.doc.reservePositionNumbers:
                                 increment += 1
                         for compRange in group:
                             compName = compRange.getSpecValue("name")
@@ -526,7 +533,7 @@ class SpecBuildingThread(threading.Thread):
                                     comment = comment + '\n' + compComment
                             else:
                                 comment = compComment
-                            fillRow(
+                            layout.appendRow(
                                 ["", "", "", "", name, str(len(compRange)), "", "", "", "", "", "", "", "", "", comment],
                                 posIncrement=increment
                             )
@@ -535,54 +542,59 @@ class SpecBuildingThread(threading.Thread):
                     prevGroup = group
 
             if not self.update:
-                if config.getboolean("sections", "materials"):
-                    gotoNextRow()
+                if settings.sections.materials:
+                    layout.appendEmptyRows()
                     fillSectionTitle("Материалы")
-                    gotoNextRow()
+                    layout.appendEmptyRows()
 
                 progressDialog.stepUp()
 
-            table.Rows.removeByIndex(self.currentRow, 2)
+            # Размещение строк по листам выполняется до записи в документ.
+            if settings.doc.prohibitTitlesAtBottom:
+                _, firstRowCount, otherRowCount = common.getFirstPageInfo()
+                layout.moveTitlesFromBottom(
+                    self.currentRow,
+                    firstRowCount,
+                    otherRowCount,
+                    4
+                )
 
             progressDialog.stepUp()
 
-            if config.getboolean("doc", "prohibit titles at bottom"):
-                _, firstRowCount, otherRowCount, _ = common.getFirstPageInfo()
-                pos = firstRowCount
-                while pos < table.Rows.Count:
-                    offset = 0
-                    # Если внизу страницы пустая строка -
-                    # подняться вверх к строке с данными.
-                    while isRowEmpty(pos - offset) and pos > (offset + 1):
-                        offset += 1
-                    cell = table.getCellByPosition(4, pos - offset)
-                    cellCursor = cell.createTextCursor()
-                    if cellCursor.ParaStyleName.startswith("Наименование (заголовок") \
-                        and cell.String != "":
-                            offset += 1
-                            while pos > offset:
-                                cell = table.getCellByPosition(4, pos - offset)
-                                cellCursor = cell.createTextCursor()
-                                if not cellCursor.ParaStyleName.startswith("Наименование (заголовок") \
-                                    or cell.String == "":
-                                        doc.lockControllers()
-                                        table.Rows.insertByIndex(pos - offset, offset)
-                                        doc.unlockControllers()
-                                        break
-                                offset += 1
-                    pos += otherRowCount
+            if settings.doc.prohibitEmptyRowsAtTop:
+                _, firstRowCount, otherRowCount = common.getFirstPageInfo()
+                layout.removeEmptyRowsFromTop(
+                    self.currentRow,
+                    firstRowCount,
+                    otherRowCount
+                )
 
             progressDialog.stepUp()
 
-            if config.getboolean("doc", "prohibit empty rows at top"):
-                _, firstRowCount, otherRowCount, _ = common.getFirstPageInfo()
-                pos = firstRowCount + 1
-                while pos < table.Rows.Count:
-                    doc.lockControllers()
-                    while pos < table.Rows.Count and isRowEmpty(pos):
-                        table.Rows.removeByIndex(pos, 1)
-                    pos += otherRowCount
-                    doc.unlockControllers()
+            if self.fileName:
+                common.saveDocument(self.fileName, layout)
+                return
+            layout.write(doc, table, self.currentRow)
+
+            # При обновлении за разметкой могут следовать другие разделы.
+            # Их строки смещаются, поэтому они заново размещаются по листам
+            # уже в таблице документа.
+            trailingRow = self.currentRow + len(layout.rows)
+            if self.update and trailingRow < table.Rows.Count:
+                _, firstRowCount, otherRowCount = common.getFirstPageInfo()
+                if otherRowCount > 0:
+                    if settings.doc.prohibitTitlesAtBottom:
+                        moveTitlesFromBottom(
+                            trailingRow,
+                            firstRowCount,
+                            otherRowCount
+                        )
+                    if settings.doc.prohibitEmptyRowsAtTop:
+                        removeEmptyRowsFromTop(
+                            trailingRow,
+                            firstRowCount,
+                            otherRowCount
+                        )
 
             progressDialog.stepUp()
 
@@ -591,9 +603,9 @@ class SpecBuildingThread(threading.Thread):
 
             progressDialog.stepUp()
 
-            if config.getboolean("doc", "append rev table"):
+            if settings.doc.appendRevTable:
                 pageCount = doc.CurrentController.PageCount
-                if pageCount > config.getint("doc", "pages rev table"):
+                if pageCount > settings.doc.pagesRevTable:
                     common.appendRevTable()
 
         except StopException:
@@ -601,18 +613,20 @@ class SpecBuildingThread(threading.Thread):
             pass
         except:
             # Ошибка!
-            common.showMessage(
-                "При построении возникла ошибка:\n\n" \
-                + traceback.format_exc(),
-                "Спецификация"
-            )
+            self.error = traceback.format_exc()
+            if self.interactive:
+                common.showMessage(
+                    "При построении возникла ошибка:\n\n" \
+                    + self.error,
+                    "Спецификация"
+                )
         finally:
             if "progressDialog" in locals():
                 progressDialog.close()
             if doc is not None:
                 if doc.UndoManager.isLocked():
                     doc.UndoManager.unlock()
-                doc.UndoManager.clear()
+                    doc.UndoManager.clear()
                 if doc.hasControllersLocked():
                     doc.unlockControllers()
 
@@ -639,6 +653,59 @@ def build(*args):
     specBuilder = SpecBuildingThread()
     specBuilder.start()
 
+def buildSync(sourceFileName="", fileName="", *args):
+    """Построить спецификацию и дождаться завершения построения.
+
+    Используется для пакетного построения документов (см. batch.py):
+    построение выполняется тем же вычислительным потоком, что и в build(),
+    но управление возвращается только после его завершения. Диалоговые
+    окна не показываются: текст ошибки возвращается вызывающему.
+
+    Аргументы:
+    sourceFileName -- файл с данными о схеме; если указан, он сохраняется
+        в параметрах документа как источник данных;
+    fileName -- если указано, построенная таблица сохраняется в новый
+        документ (.odt) с этим именем, а текущий документ не изменяется.
+
+    Возвращаемое значение -- текст ошибки или пустая строка, если
+        построение выполнено успешно.
+
+    """
+    if common.isThreadWorking():
+        return "Построение уже выполняется."
+    if sourceFileName:
+        config.set("doc", "source", sourceFileName)
+        config.save()
+    specBuilder = SpecBuildingThread(
+        fileName=fileName or None,
+        interactive=False
+    )
+    specBuilder.start()
+    specBuilder.join()
+    return specBuilder.error or ""
+
+def appendRevTableSync(*args):
+    """Добавить лист регистрации изменений в документ, построенный в файл.
+
+    При построении в отдельный файл (см. buildSync) таблица не заполняется
+    в текущем документе, поэтому лист регистрации изменений добавляется
+    уже после открытия построенного документа (см. batch.py), если это
+    предусмотрено параметрами и количество листов превышает заданное.
+
+    Возвращаемое значение -- True, если лист добавлен.
+
+    """
+    if not config.getboolean("doc", "append rev table"):
+        return False
+    doc = XSCRIPTCONTEXT.getDocument()
+    if "Лист_регистрации_изменений" in doc.TextTables:
+        return False
+    pageCount = doc.CurrentController.PageCount
+    if pageCount <= config.getint("doc", "pages rev table"):
+        return False
+    common.appendRevTable()
+    return True
+
 def update(*args):
     """Обновить "Прочие изделия".
 
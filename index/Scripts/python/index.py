@@ -8,7 +8,7 @@ from com.sun.star.awt import XActionListener
 
 common = sys.modules["common" + XSCRIPTCONTEXT.getDocument().RuntimeUID]
 config = sys.modules["config" + XSCRIPTCONTEXT.getDocument().RuntimeUID]
-textwidth = sys.modules["textwidth" + XSCRIPTCONTEXT.getDocument().RuntimeUID]
+tablelayout = sys.modules["tablelayout" + XSCRIPTCONTEXT.getDocument().RuntimeUID]
 
 
 class StopException(Exception):
@@ -131,6 +131,29 @@ class ProgressDialog:
             self.stopEvent.set()
 
 
+class SilentProgress:
+    """Прогресс построения без диалогового окна.
+
+    Используется вместо ProgressDialog при пакетном построении (см.
+    buildSync), когда диалоговые окна не показываются. Построение так же
+    может быть прервано установкой stopEvent.
+
+    """
+
+    def __init__(self, target):
+        self.stopEvent = threading.Event()
+        self.progress = 0
+        self.progressTotal = target
+
+    def stepUp(self):
+        if self.stopEvent.is_set():
+            raise StopException
+        self.progress += 1
+
+    def close(self):
+        pass
+
+
 class IndexBuildingThread(threading.Thread):
     """Перечень заполняется из отдельного вычислительного потока.
 
@@ -141,118 +164,69 @@ class IndexBuildingThread(threading.Thread):
     текстового редактора.
 
     """
-    def __init__(self):
+    def __init__(self, fileName=None, interactive=True):
         threading.Thread.__init__(self)
         self.name = "BuildingThread"
 
         self.currentRow = 0
+        # Если указано имя файла, построенная таблица сохраняется в новый
+        # документ на основе копии текущего документа (см.
+        # common.saveDocument), а сам текущий документ не изменяется.
+        self.fileName = fileName
+        # При пакетном построении диалоговые окна не показываются,
+        # а текст ошибки только сохраняется.
+        self.interactive = interactive
+        # Текст ошибки, если построение не выполнено (см. buildSync).
+        self.error = None
 
     def run(self):
-        # --------------------------------------------------------------------
-        # Методы для построения таблицы
-        # --------------------------------------------------------------------
-
-        def gotoNextRow(count=1):
-            table.Rows.insertByIndex(self.currentRow + 1, count)
-            self.currentRow += count
-
-        def getFontSize(col):
-            cell = table.getCellByPosition(col, self.currentRow)
-            cellCursor = cell.createTextCursor()
-            return cellCursor.CharHeight
-
-        def isRowEmpty(row):
-            lastCol = len(table.Rows[row].TableColumnSeparators)
-            rowCells = table.getCellRangeByPosition(
-                0, # left
-                row, # top
-                lastCol, # right
-                row # bottom
-            )
-            dataIsPresent = any(rowCells.DataArray[0])
-            return not dataIsPresent
-
-        def fillRow(values, isTitle=False):
-            colWidth = (19, 109, 9, 44)
-            extraRow = [""] * len(values)
-            extremeWidthFactor = config.getint("doc", "extreme width factor")
-            doc.lockControllers()
-            for col in range(len(values)):
-                if values[col] == "":
-                    continue
-                if '\n' in values[col]:
-                    text = values[col]
-                    lfPos = text.find('\n')
-                    values[col] = text[:lfPos]
-                    extraRow[col] = text[(lfPos + 1):]
-                widthFactor = textwidth.getWidthFactor(
-                    values[col],
-                    getFontSize(col),
-                    colWidth[col]
-                )
-                if widthFactor < extremeWidthFactor:
-                    text = values[col]
-                    extremePos = int(len(text) * widthFactor / extremeWidthFactor)
-                    # Первая попытка: определить длину не превышающую
-                    # критическое сжатие шрифта.
-                    pos = text.rfind(" ", 0, extremePos)
-                    if pos == -1:
-                        # Вторая попытка: определить длину, которая хоть и
-                        # превышает критическое значение, но всё же меньше
-                        # максимального.
-                        pos = text.find(" ", extremePos)
-                    if pos != -1:
-                        values[col] = text[:pos]
-                        extraRow[col] = text[(pos + 1):] + '\n' + extraRow[col]
-                        widthFactor = textwidth.getWidthFactor(
-                            values[col],
-                            getFontSize(col),
-                            colWidth[col]
-                        )
-                cell = table.getCellByPosition(col, self.currentRow)
-                cellCursor = cell.createTextCursor()
-                if col == 1 and isTitle:
-                    cellCursor.ParaStyleName = "Наименование (заголовок)"
-                # Параметры символов необходимо устанавливать после
-                # параметров абзаца!
-                cellCursor.CharScaleWidth = widthFactor
-                cell.String = values[col]
-            doc.unlockControllers()
-
-            gotoNextRow()
-            if any(extraRow):
-                fillRow(extraRow, isTitle)
-
         # --------------------------------------------------------------------
         # Начало построения таблицы
         # --------------------------------------------------------------------
         doc = None
         try:
-            schematic = common.getSchematicData()
+            schematic = common.getSchematicData(self.interactive)
             if schematic is None:
+                self.error = "Не удалось получить данные о схеме."
                 return
+            settings = schematic.settings
+            # Ошибки в регулярных выражениях фильтров должны быть
+            # обнаружены до изменения документа.
+            schematic.compileFilters()
             doc = XSCRIPTCONTEXT.getDocument()
-            doc.UndoManager.lock()
-            clean(force=True)
+            if not self.fileName:
+                doc.UndoManager.lock()
+                clean(force=True)
             table = doc.TextTables["Перечень_элементов"]
             compGroups = schematic.getGroupedComponents()
             prevGroup = None
-            emptyRowsRef = config.getint("doc", "empty rows between diff ref")
-            emptyRowsType = config.getint("doc", "empty rows between diff type")
+            emptyRowsRef = settings.doc.emptyRowsBetweenDiffRef
+            emptyRowsType = settings.doc.emptyRowsBetweenDiffType
+            # Последняя строка пустой таблицы имеет ненарушенное
+            # форматирование. На её основе будут созданы новые строки.
             self.currentRow = table.Rows.Count - 1
-            # В процессе заполнения перечня, в конце таблицы всегда должна
-            # оставаться пустая строка с ненарушенным форматированием.
-            # На её основе будут создаваться новые строки.
-            # По окончанию, последняя строка будет удалена.
-            table.Rows.insertByIndex(self.currentRow, 1)
+            if self.fileName:
+                # Таблица текущего документа не очищается, новые строки
+                # создаются на основе первой строки после заголовка.
+                self.currentRow = len(common.getTableFormat().headerRows)
+            colWidth = (19, 109, 9, 44)
+            layout = tablelayout.TableLayout(
+                colWidth,
+                tablelayout.getFontSizes(table, self.currentRow, len(colWidth)),
+                settings.doc.extremeWidthFactor
+            )
+            titleStyles = {1: "Наименование (заголовок)"}
 
             progressTotal = 3
             for group in compGroups:
                 progressTotal += len(group)
-            progressDialog = ProgressDialog(
-                "Выполняется построение перечня элементов",
-                progressTotal
-            )
+            if self.interactive:
+                progressDialog = ProgressDialog(
+                    "Выполняется построение перечня элементов",
+                    progressTotal
+                )
+            else:
+                progressDialog = SilentProgress(progressTotal)
 
             for group in compGroups:
                 if prevGroup is not None:
@@ -261,11 +235,9 @@ class IndexBuildingThread(threading.Thread):
                         emptyRows = emptyRowsRef
                     else:
                         emptyRows = emptyRowsType
-                    doc.lockControllers()
-                    gotoNextRow(emptyRows)
-                    doc.unlockControllers()
+                    layout.appendEmptyRows(emptyRows)
                 if len(group) == 1 \
-                    and not config.getboolean("doc", "every group has title"):
+                    and not settings.doc.everyGroupHasTitle:
                         compRef = group[0].getRefRangeString()
                         compType = group[0].getIndexValue("type", singular=True)
                         compName = group[0].getIndexValue("name")
@@ -275,7 +247,7 @@ class IndexBuildingThread(threading.Thread):
                         if compDoc:
                             name += ' ' + compDoc
                         compComment = group[0].getIndexValue("comment")
-                        fillRow(
+                        layout.appendRow(
                             [compRef, name, str(len(group[0])), compComment]
                         )
                         progressDialog.stepUp()
@@ -283,12 +255,12 @@ class IndexBuildingThread(threading.Thread):
                     titleLines = group.getTitle()
                     for title in titleLines:
                         if title:
-                            fillRow(
+                            layout.appendRow(
                                 ["", title],
-                                isTitle=True
+                                paraStyles=titleStyles
                             )
-                    if config.getboolean("doc", "empty row after group title"):
-                        gotoNextRow()
+                    if settings.doc.emptyRowAfterGroupTitle:
+                        layout.appendEmptyRows()
                     for compRange in group:
                         compRef = compRange.getRefRangeString()
                         compName = compRange.getIndexValue("name")
@@ -301,53 +273,38 @@ class IndexBuildingThread(threading.Thread):
                             else:
                                 name += ' ' + compDoc
                         compComment = compRange.getIndexValue("comment")
-                        fillRow(
+                        layout.appendRow(
                             [compRef, name, str(len(compRange)), compComment]
                         )
                         progressDialog.stepUp()
                 prevGroup = group
 
-            table.Rows.removeByIndex(self.currentRow, 2)
+            # Размещение строк по листам выполняется до записи в документ.
+            if settings.doc.prohibitTitlesAtBottom:
+                _, firstRowCount, otherRowCount = common.getFirstPageInfo()
+                layout.moveTitlesFromBottom(
+                    self.currentRow,
+                    firstRowCount,
+                    otherRowCount,
+                    1
+                )
 
             progressDialog.stepUp()
 
-            if config.getboolean("doc", "prohibit titles at bottom"):
+            if settings.doc.prohibitEmptyRowsAtTop:
                 _, firstRowCount, otherRowCount = common.getFirstPageInfo()
-                pos = firstRowCount
-                while pos < table.Rows.Count:
-                    offset = 0
-                    # Если внизу страницы пустая строка -
-                    # подняться вверх к строке с данными.
-                    while isRowEmpty(pos - offset) and pos > (offset + 1):
-                        offset += 1
-                    cell = table.getCellByPosition(1, pos - offset)
-                    cellCursor = cell.createTextCursor()
-                    if cellCursor.ParaStyleName == "Наименование (заголовок)" \
-                        and cell.String != "":
-                            offset += 1
-                            while pos > offset:
-                                cell = table.getCellByPosition(1, pos - offset)
-                                cellCursor = cell.createTextCursor()
-                                if cellCursor.ParaStyleName != "Наименование (заголовок)" \
-                                    or cell.String == "":
-                                        doc.lockControllers()
-                                        table.Rows.insertByIndex(pos - offset, offset)
-                                        doc.unlockControllers()
-                                        break
-                                offset += 1
-                    pos += otherRowCount
+                layout.removeEmptyRowsFromTop(
+                    self.currentRow,
+                    firstRowCount,
+                    otherRowCount
+                )
 
             progressDialog.stepUp()
 
-            if config.getboolean("doc", "prohibit empty rows at top"):
-                _, firstRowCount, otherRowCount = common.getFirstPageInfo()
-                pos = firstRowCount + 1
-                while pos < table.Rows.Count:
-                    doc.lockControllers()
-                    while pos < table.Rows.Count and isRowEmpty(pos):
-                        table.Rows.removeByIndex(pos, 1)
-                    pos += otherRowCount
-                    doc.unlockControllers()
+            if self.fileName:
+                common.saveDocument(self.fileName, layout)
+                return
+            layout.write(doc, table, self.currentRow)
 
             progressDialog.stepUp()
 
@@ -355,9 +312,9 @@ class IndexBuildingThread(threading.Thread):
 
             progressDialog.stepUp()
 
-            if config.getboolean("doc", "append rev table"):
+            if settings.doc.appendRevTable:
                 pageCount = doc.CurrentController.PageCount
-                if pageCount > config.getint("doc", "pages rev table"):
+                if pageCount > settings.doc.pagesRevTable:
                     common.appendRevTable()
 
         except StopException:
@@ -365,18 +322,20 @@ class IndexBuildingThread(threading.Thread):
             pass
         except:
             # Ошибка!
-            common.showMessage(
-                "При построении возникла ошибка:\n\n" \
-                + traceback.format_exc(),
-                "Перечень элементов"
-            )
+            self.error = traceback.format_exc()
+            if self.interactive:
+                common.showMessage(
+                    "При построении возникла ошибка:\n\n" \
+                    + self.error,
+                    "Перечень элементов"
+                )
         finally:
             if "progressDialog" in locals():
                 progressDialog.close()
             if doc is not None:
                 if doc.UndoManager.isLocked():
                     doc.UndoManager.unlock()
-                doc.UndoManager.clear()
+                    doc.UndoManager.clear()
                 if doc.hasControllersLocked():
                     doc.unlockControllers()
 
@@ -403,6 +362,59 @@ def build(*args):
     indexBuilder = IndexBuildingThread()
     indexBuilder.start()
 
+def buildSync(sourceFileName="", fileName="", *args):
+    """Построить перечень элементов и дождаться завершения построения.
+
+    Используется для пакетного построения документов (см. batch.py):
+    построение выполняется тем же вычислительным потоком, что и в build(),
+    но управление возвращается только после его завершения. Диалоговые
+    окна не показываются: текст ошибки возвращается вызывающему.
+
+    Аргументы:
+    sourceFileName -- файл с данными о схеме; если указан, он сохраняется
+        в параметрах документа как источник данных;
+    fileName -- если указано, построенная таблица сохраняется в новый
+        документ (.odt) с этим именем, а текущий документ не изменяется.
+
+    Возвращаемое значение -- текст ошибки или пустая строка, если
+        построение выполнено успешно.
+
+    """
+    if common.isThreadWorking():
+        return "Построение уже выполняется."
+    if sourceFileName:
+        config.set("doc", "source", sourceFileName)
+        config.save()
+    indexBuilder = IndexBuildingThread(
+        fileName=fileName or None,
+        interactive=False
+    )
+    indexBuilder.start()
+    indexBuilder.join()
+    return indexBuilder.error or ""
+
+def appendRevTableSync(*args):
+    """Добавить лист регистрации изменений в документ, построенный в файл.
+
+    При построении в отдельный файл (см. buildSync) таблица не заполняется
+    в текущем документе, поэтому лист регистрации изменений добавляется
+    уже после открытия построенного документа (см. batch.py), если это
+    предусмотрено параметрами и количество листов превышает заданное.
+
+    Возвращаемое значение -- True, если лист добавлен.
+
+    """
+    if not config.getboolean("doc", "append rev table"):
+        return False
+    doc = XSCRIPTCONTEXT.getDocument()
+    if "Лист_регистрации_изменений" in doc.TextTables:
+        return False
+    pageCount = doc.CurrentController.PageCount
+    if pageCount <= config.getint("doc", "pages rev table"):
+        return False
+    common.appendRevTable()
+    return True
+
 def toggleRevTable(*args):
     """Добавить/удалить таблицу регистрации изменений"""
     if common.isThreadWorking():
@@ -7,6 +7,7 @@
 
 import os
 import sys
+import tempfile
 import traceback
 import threading
 import uno
@@ -16,6 +17,7 @@ schematic = None
 kicadnet = None
 config = None
 textwidth = None
+odtwriter = None
 
 def init(scriptcontext):
     global XSCRIPTCONTEXT
@@ -23,11 +25,13 @@ def init(scriptcontext):
     global kicadnet
     global config
     global textwidth
+    global odtwriter
     XSCRIPTCONTEXT = scriptcontext
     schematic = sys.modules["schematic" + scriptcontext.getDocument().RuntimeUID]
     kicadnet = sys.modules["kicadnet" + scriptcontext.getDocument().RuntimeUID]
     config = sys.modules["config" + scriptcontext.getDocument().RuntimeUID]
     textwidth = sys.modules["textwidth" + XSCRIPTCONTEXT.getDocument().RuntimeUID]
+    odtwriter = sys.modules["odtwriter" + XSCRIPTCONTEXT.getDocument().RuntimeUID]
 
 STAMP_COMMON_FIELDS = (
     "2 Обозначение документа",
@@ -167,13 +171,18 @@ def showFilePicker(filePath="", title="Выбор файла с данными 
         return sourcePath
     return None
 
-def getSourceFileName():
+def getSourceFileName(interactive=True):
     """Получить имя файла с данными о схеме.
 
     Попытаться найти файл с данными о схеме в текущем каталоге.
     В случае неудачи, показать диалоговое окно выбора файла.
 
-    Для KiCad источником данных о схеме является список цепей.
+    Для KiCad источником данных о схеме является список цепей. Если список
+    цепей отсутствует, данные берутся непосредственно из файла схемы.
+
+    Аргументы:
+    interactive -- если файл не найден, предложить пользователю
+        выбрать его.
 
     Возвращаемое значение -- полное имя файла или None, если файл
         не найден или не выбран.
@@ -192,14 +201,24 @@ def getSourceFileName():
             if fileName.endswith(".kicad_pro"):
                 sourceName = fileName.replace(".kicad_pro", ".net")
         if sourceName:
-            sourcePath = os.path.join(sourceDir, sourceName)
-            if os.path.exists(sourcePath):
-                config.set("doc", "source", sourcePath)
-                config.save()
-                return sourcePath
+            for sourceExt in (".net", ".kicad_sch"):
+                sourcePath = os.path.join(
+                    sourceDir,
+                    os.path.splitext(sourceName)[0] + sourceExt
+                )
+                if os.path.exists(sourcePath):
+                    config.set("doc", "source", sourcePath)
+                    config.save()
+                    return sourcePath
+    if not interactive:
+        return None
     sourcePath = showFilePicker(
         os.path.join(sourceDir, sourceName),
-        **{"Список цепей KiCad": "*.net", "Все файлы": "*.*"}
+        **{
+            "Список цепей KiCad": "*.net;*.xml",
+            "Схема KiCad": "*.kicad_sch",
+            "Все файлы": "*.*"
+        }
     )
     if sourcePath is not None:
         config.set("doc", "source", sourcePath)
@@ -207,17 +226,22 @@ def getSourceFileName():
         return sourcePath
     return None
 
-def getSchematicData():
+def getSchematicData(interactive=True):
     """Подготовить необходимые данные о схеме.
 
     Выбрать из файла данные о компонентах и данные для заполнения
     основной надписи.
 
+    Аргументы:
+    interactive -- показывать ли диалоговые окна; если False, файл
+        не выбирается пользователем, а ошибки при получении данных
+        передаются вызывающему в виде исключений.
+
     Возвращаемое значение -- объект класса Schematic или None, если
         файл не найден или данные в файле отсутствуют.
 
     """
-    sourceFileName = getSourceFileName()
+    sourceFileName = getSourceFileName(interactive)
     if sourceFileName is None:
         # Отменено пользователем
         #showMessage(
@@ -225,6 +249,8 @@ def getSchematicData():
         #    "Перечень элементов"
         #)
         return None
+    if not interactive:
+        return schematic.Schematic(sourceFileName)
     try:
         return schematic.Schematic(sourceFileName)
     except kicadnet.ParseException as error:
@@ -260,7 +286,7 @@ def getFirstPageInfo():
         return (firstPageVariant, firstRowCount, otherRowCount)
     return ("?", 0, 0)
 
-def getTableRowHeight(rowIndex):
+def getTableRowHeight(rowIndex, firstPageInfo=None):
     """Вычислить высоту строки основной таблицы.
 
     Высота строк подбирается так, чтобы нижнее обрамление последней строки
@@ -268,13 +294,17 @@ def getTableRowHeight(rowIndex):
 
     Аргументы:
 
-    rowIndex -- номер строки.
+    rowIndex -- номер строки;
+    firstPageInfo -- информация о первом листе (см. getFirstPageInfo),
+        если не указана -- определяется по документу.
 
     Возвращаемое значение -- высота строки таблицы.
 
     """
     height = 800
-    firstPageVariant, firstRowCount, otherRowCount = getFirstPageInfo()
+    if firstPageInfo is None:
+        firstPageInfo = getFirstPageInfo()
+    firstPageVariant, firstRowCount, otherRowCount = firstPageInfo
     if firstPageVariant == "?":
         return height
     if rowIndex <= firstRowCount:
@@ -304,9 +334,10 @@ def updateTableRowsHeight():
     if "Перечень_элементов" not in doc.TextTables:
         return
     table = doc.TextTables["Перечень_элементов"]
+    firstPageInfo = getFirstPageInfo()
     doc.lockControllers()
     for rowIndex in range(1, table.Rows.Count):
-        table.Rows[rowIndex].Height = getTableRowHeight(rowIndex)
+        table.Rows[rowIndex].Height = getTableRowHeight(rowIndex, firstPageInfo)
     doc.unlockControllers()
 
 def rebuildTable():
@@ -416,6 +447,74 @@ def rebuildTable():
     doc.unlockControllers()
     SKIP_MODIFY_EVENTS = False
 
+def getTableFormat():
+    """Описание основной таблицы для формирования документа без LibreOffice.
+
+    Описание соответствует таблице, которую строит rebuildTable().
+
+    Возвращаемое значение -- объект odtwriter.TableFormat.
+
+    """
+    return odtwriter.TableFormat(
+        name="Перечень_элементов",
+        width=18500,
+        leftMargin=2000,
+        colWidths=(2000, 11000, 1000, 4500),
+        headerRows=(
+            (1500, (
+                odtwriter.HeaderCell(
+                    "Поз.\nобозна-\nчение",
+                    lineSpacing=80,
+                    padding=(50, 0, 50, 50)
+                ),
+                odtwriter.HeaderCell("Наименование"),
+                odtwriter.HeaderCell("Кол."),
+                odtwriter.HeaderCell("Примечание")
+            )),
+        ),
+        rowStyles=(
+            "Поз. обозначение",
+            "Наименование",
+            "Кол.",
+            "Примечание"
+        )
+    )
+
+def saveDocument(fileName, layout):
+    """Сохранить документ с основной таблицей из разметки.
+
+    Документ формируется модулем odtwriter без заполнения таблицы через
+    uno-интерфейс. Пакетом шаблона служит копия текущего документа,
+    поэтому основная надпись, стиль первого листа и параметры переносятся
+    из него; сам текущий документ не изменяется. Высота строк вычисляется
+    так же, как для таблицы текущего документа.
+
+    Аргументы:
+    fileName (str) -- имя создаваемого документа (.odt);
+    layout (tablelayout.TableLayout) -- размеченные строки таблицы.
+
+    """
+    doc = XSCRIPTCONTEXT.getDocument()
+    firstPageStyleName = doc.Text.createTextCursor().PageDescName
+    firstPageInfo = getFirstPageInfo()
+    filterName = uno.createUnoStruct("com.sun.star.beans.PropertyValue")
+    filterName.Name = "FilterName"
+    filterName.Value = "writer8"
+    tempFile = tempfile.NamedTemporaryFile(suffix=".odt", delete=False)
+    tempFile.close()
+    try:
+        doc.storeToURL(uno.systemPathToFileUrl(tempFile.name), (filterName,))
+        odtwriter.writeDocument(
+            tempFile.name,
+            fileName,
+            getTableFormat(),
+            layout,
+            lambda rowIndex: getTableRowHeight(rowIndex, firstPageInfo),
+            firstPageStyleName
+        )
+    finally:
+        os.remove(tempFile.name)
+
 def appendRevTable():
     """Добавить таблицу регистрации изменений."""
     doc = XSCRIPTCONTEXT.getDocument()
@@ -1,18 +1,324 @@
 """Объектное представление схемы."""
 
+import functools
+import os
 import re
 import sys
 
 kicadnet = None
+netcache = None
 config = None
 
 def init(scriptcontext):
     global kicadnet
+    global netcache
     global config
     kicadnet = sys.modules["kicadnet" + scriptcontext.getDocument().RuntimeUID]
+    netcache = sys.modules["netcache" + scriptcontext.getDocument().RuntimeUID]
     config = sys.modules["config" + scriptcontext.getDocument().RuntimeUID]
 
 REF_REGEXP = re.compile(r"([^0-9?]+)([0-9]+)")
+# Количество разобранных обозначений, которые хранятся для повторного
+# использования.
+REF_CACHE_SIZE = 8192
+# Количество разобранных шаблонов, которые хранятся для повторного
+# использования (значения полей тоже обрабатываются как шаблоны).
+PATTERN_CACHE_SIZE = 4096
+# Количество приведённых к стандартному виду значений, которые хранятся для
+# повторного использования (различных значений обычно значительно меньше,
+# чем компонентов).
+VALUE_CACHE_SIZE = 1024
+# Значение поля в форме "единственное число {множественное число}".
+SINGULAR_PLURAL_REGEXP = re.compile(r"^(.+)\s\{(.+)\}$")
+# Множители и их обозначения на русском языке.
+MULTIPLIERS = {
+    'G': 'Г',
+    'M': 'М',
+    'k': 'к',
+    'm': 'м',
+    'μ': 'мк',
+    'u': 'мк',
+    'U': 'мк',
+    'n': 'н',
+    'p': 'п'
+}
+VALUE_MULTIPLIERS_PATTERN = '|'.join(
+    sorted(set(MULTIPLIERS) | set(MULTIPLIERS.values()), key=len, reverse=True)
+)
+# 2u7, 2н7, 4m7, 5k1 ...
+VALUE_REGEXP1 = re.compile(
+    r"^(\d+)({})(\d+)$".format(VALUE_MULTIPLIERS_PATTERN)
+)
+# 2.7 u, 2700p, 4.7 m, 470u, 5.1 k, 510 ...
+VALUE_REGEXP2 = re.compile(
+    r"^(\d+(?:[\.,]\d+)?)\s*({})?$".format(VALUE_MULTIPLIERS_PATTERN)
+)
+VALUE_INTEGER_REGEXP = re.compile(r"^\d+$")
+VALUE_DECIMAL_REGEXP = re.compile(r"^\d+[\.,]\d+$")
+VALUE_OPTIONAL_DECIMAL_REGEXP = re.compile(r"^\d+(?:[\.,]\d+)?$")
+# R47, 4R7
+VALUE_R_REGEXP1 = re.compile(r"R\d+")
+VALUE_R_REGEXP2 = re.compile(r"\d+R\d+")
+
+
+@functools.lru_cache(maxsize=REF_CACHE_SIZE)
+def parseReference(reference):
+    """Разобрать обозначение компонента.
+
+    Аргументы:
+    reference (str) -- обозначение компонента.
+
+    Возвращаемое значение (tuple) -- буквенная часть (str), номер (int)
+        и оставшаяся часть обозначения (str); если обозначение имеет
+        неверный формат, буквенная часть и номер равны None.
+
+    """
+    match = REF_REGEXP.match(reference)
+    if match is None:
+        return (None, None, reference)
+    return (match.group(1), int(match.group(2)), reference[match.end():])
+
+
+class CompiledPattern():
+    """Разобранный шаблон (см. Component.formatPattern).
+
+    Атрибуты:
+    parts (tuple) -- элементы шаблона: строки текста, которые выводятся без
+        изменений, и подстановки в виде кортежей (префикс, наименование поля,
+        суффикс);
+    hasSubstitutions (boolean) -- шаблон содержит хотя бы одну конструкцию ${}.
+
+    """
+
+    __slots__ = ("parts", "hasSubstitutions")
+
+    def __init__(self, parts):
+        self.parts = parts
+        self.hasSubstitutions = any(type(part) is tuple for part in parts)
+
+
+@functools.lru_cache(maxsize=PATTERN_CACHE_SIZE)
+def compilePattern(pattern):
+    """Разобрать шаблон.
+
+    Разбор выполняется один раз для каждой строки шаблона, а результат
+    используется для всех компонентов.
+
+    Аргументы:
+    pattern (str) -- строка текста, которую следует обработать как шаблон.
+
+    Возвращаемое значение (CompiledPattern) -- разобранный шаблон.
+
+    """
+    parts = []
+    out = ""
+    prefix = ""
+    fieldName = ""
+    suffix = ""
+    temp = ""
+
+    # Флаг, указывающий на то, что спец.символ нужно обработать как обычный
+    ignore = False
+    # Флаг, указывающий на обрабатываемую часть подстановки.
+    substitution = ""
+
+    def resetSubstitution():
+        nonlocal out, temp, substitution, prefix, fieldName, suffix
+        out += temp
+        substitution = temp = ""
+        prefix = fieldName = suffix = ""
+
+    if '$' not in pattern:
+        # Подстановок нет -- весь шаблон является текстом.
+        return CompiledPattern((pattern,) if pattern else ())
+
+    for char in pattern:
+        if char == '\\' and substitution and not ignore:
+                ignore = True
+                temp += char
+                continue
+        elif substitution:
+            temp += char
+            if substitution == "beginning":
+                if char == '{' and not ignore:
+                    substitution = "prefix"
+                else:
+                    out += temp
+                    substitution = temp = ""
+            elif char == '{' and not ignore:
+                # Конструкция ${} имеет неверный формат:
+                # ${...{
+                #      ^
+                # открывающаяся фигурная скобка внутри подстановки.
+                resetSubstitution()
+            elif char == '|' and substitution == "prefix" and not ignore:
+                substitution = "fieldName"
+            elif char == '|' and substitution == "fieldName" and not ignore:
+                substitution = "suffix"
+            elif char == '|' and substitution == "suffix" and not ignore:
+                # Конструкция ${} имеет неверный формат:
+                # ${prefix|fieldName|suffix|
+                #                          ^
+                # третья вертикальная черта внутри подстановки.
+                resetSubstitution()
+            elif char == "}" and not ignore:
+                if substitution == "fieldName":
+                    # Конструкция ${} имеет неверный формат:
+                    # ${prefix|fieldName}
+                    #                   ^
+                    # одна вертикальная черта в подстановке. Должно быть
+                    # либо две (для пефикса/суффикса), либо не быть вовсе.
+                    resetSubstitution()
+                else:
+                    if substitution == "prefix":
+                        # Если по завершении конструкции ${} имеется только
+                        # префикс, значит найдена сокращённая конструкция
+                        # (без префикса/суффикса).
+                        fieldName = prefix
+                        prefix = ""
+                    if out:
+                        parts.append(out)
+                        out = ""
+                    parts.append((prefix, fieldName, suffix))
+                substitution = temp = prefix = fieldName = suffix = ""
+            elif substitution == "prefix":
+                prefix += char
+            elif substitution == "fieldName":
+                fieldName += char
+            elif substitution == "suffix":
+                suffix += char
+        elif char == '$':
+            substitution = "beginning"
+            temp += char
+        else:
+            out += char
+        ignore = False
+    if substitution:
+        # Конструкция ${} неожиданно закончилась.
+        resetSubstitution()
+    if out:
+        parts.append(out)
+    return CompiledPattern(tuple(parts))
+
+
+def _splitMultiplier(value):
+    """Разделить значение на число и множитель.
+
+    Возвращаемое значение (tuple) -- число (str) и множитель (str или None,
+        если множитель не указан) либо None, если значение не является
+        числом с множителем.
+
+    """
+    match = VALUE_REGEXP1.match(value)
+    if match:
+        return "{},{}".format(match.group(1), match.group(3)), match.group(2)
+    match = VALUE_REGEXP2.match(value)
+    if match:
+        return match.group(1), match.group(2)
+    return None
+
+
+@functools.lru_cache(maxsize=VALUE_CACHE_SIZE)
+def normalizeValue(refType, value, separator=""):
+    """Преобразовать значение к стандартному виду.
+
+    Результат зависит только от аргументов, поэтому каждое значение
+    преобразуется однократно.
+
+    Аргументы:
+    refType (str) -- буквенная часть обозначения компонента;
+    value (str) -- значение компонента;
+    separator (str) -- разделитель между числом и единицами измерения.
+
+    Возвращаемое значение -- значение, приведённое к стандартному виду,
+        например:
+        2u7 -> 2,7 мкФ
+
+    """
+    numValue = ""
+    multiplier = ""
+    units = ""
+    if refType.startswith('C') \
+        and not value.endswith('Ф'):
+            units = 'Ф'
+            if VALUE_INTEGER_REGEXP.match(value):
+                numValue = value
+                multiplier = 'п'
+            elif VALUE_DECIMAL_REGEXP.match(value):
+                numValue = value
+                multiplier = "мк"
+            else:
+                parts = _splitMultiplier(value.rstrip('F').strip())
+                if parts is not None:
+                    numValue, multiplier = parts
+    elif refType.startswith('L') \
+        and not value.endswith("Гн"):
+            units = "Гн"
+            parts = _splitMultiplier(value.rstrip('H').strip())
+            if parts is not None:
+                numValue, multiplier = parts
+                if multiplier is None:
+                    multiplier = "мк"
+    elif refType.startswith('R') \
+        and not value.endswith("Ом"):
+            units = "Ом"
+            numValue = value.rstrip('Ω')
+            if numValue.endswith("Ohm") or numValue.endswith("ohm"):
+                numValue = numValue[:-3]
+            numValue = numValue.strip()
+            if VALUE_R_REGEXP1.match(numValue):
+                numValue = numValue.replace('R', "0,")
+            elif VALUE_R_REGEXP2.match(numValue):
+                numValue = numValue.replace('R', ',')
+            else:
+                parts = _splitMultiplier(numValue)
+                if parts is not None:
+                    numValue, multiplier = parts
+                else:
+                    numValue = ""
+    if numValue:
+        # Перевести множитель на русский
+        if multiplier in MULTIPLIERS:
+            multiplier = MULTIPLIERS[multiplier]
+        elif multiplier is None:
+            multiplier = ''
+        numValue = numValue.replace('.', ',')
+        return numValue + separator + multiplier + units
+    return value
+
+@functools.lru_cache(maxsize=VALUE_CACHE_SIZE)
+def splitSingularPlural(value):
+    """Разделить значение вида "значение 1 {значение 2}".
+
+    Возвращаемое значение (tuple) -- значение в единственном и во
+        множественном числе или None, если значение имеет другой вид.
+
+    """
+    match = SINGULAR_PLURAL_REGEXP.match(value)
+    if match is None:
+        return None
+    return match.groups()
+
+def compileFieldRegex(fieldName, regex):
+    """Скомпилировать регулярное выражение для значений поля.
+
+    Аргументы:
+    fieldName (str) -- имя поля (указывается в сообщении об ошибке);
+    regex (str) -- регулярное выражение.
+
+    Возвращаемое значение -- скомпилированное регулярное выражение.
+    Если выражение имеет неверный формат, возбуждается исключение.
+
+    """
+    try:
+        return re.compile(regex)
+    except re.error as error:
+        errorMessage = 'Регулярное выражение "{}" для поля "{}" имеет неверный формат:\n{}'.format(
+            regex,
+            fieldName,
+            str(error)
+        )
+        raise Exception(errorMessage) from error
 
 
 class Component():
@@ -26,6 +332,29 @@ class Component():
         self.datasheet = ""
         self.description = ""
         self.fields = {}
+        self.tstamps = ""
+        # Преобразованные значения полей: {(имя, ед.ч., мн.ч.): значение}
+        self._values = {}
+        self._valuesSettings = None
+        # Разобранное обозначение и обозначение, из которого оно получено.
+        self._refKey = None
+        self._refKeySource = None
+
+    def getData(self):
+        """Вернуть данные компонента, полученные из списка цепей.
+
+        Используется для сравнения компонентов разных версий схемы
+        (метки времени не учитываются).
+
+        """
+        return (
+            self.reference,
+            self.value,
+            self.footprint,
+            self.datasheet,
+            self.description,
+            self.fields
+        )
 
     def getRawFieldValue(self, name):
         """Вернуть значение поля с указанным именем без обрабатки шаблов."""
@@ -33,12 +362,12 @@ class Component():
         if name == "Обозначение":
             value = self.reference
         elif name == "Значение":
-            if config.getboolean("doc", "add units"):
+            if self.schematic.settings.doc.addUnits:
                 value = self.getValueWithUnits()
             else:
                 value = self.value
         elif name == "Посад.место":
-            if config.getboolean("doc", "footprint only"):
+            if self.schematic.settings.doc.footprintOnly:
                 value = self.getRawFieldValue("Посад.место!")
             else:
                 value = self.footprint
@@ -55,6 +384,22 @@ class Component():
             value = self.fields[name]
         return value
 
+    def _getValuesCache(self):
+        """Вернуть кэш преобразованных значений полей.
+
+        Преобразованные значения зависят от параметров, поэтому при их
+        изменении кэш очищается.
+
+        """
+        if self._valuesSettings is not self.schematic.settings:
+            self._values = {}
+            self._valuesSettings = self.schematic.settings
+        return self._values
+
+    def _resetValuesCache(self):
+        """Очистить кэш преобразованных значений полей."""
+        self._valuesSettings = None
+
     def getFieldValue(self, name):
         """Вернуть значение поля с указанным именем."""
         value = self.getRawFieldValue(name)
@@ -62,23 +407,30 @@ class Component():
             value = self.formatPattern(value)
         return value
 
+    def getRefKey(self):
+        """Вернуть разобранное обозначение компонента.
+
+        Обозначение разбирается повторно только после его изменения.
+
+        Возвращаемое значение (tuple) -- см. parseReference.
+
+        """
+        if self._refKeySource is not self.reference:
+            self._refKey = parseReference(self.reference)
+            self._refKeySource = self.reference
+        return self._refKey
+
     def getRefType(self, ref=None):
         """Вернуть буквенную часть обозначения."""
         if ref is None:
-            ref = self.reference
-        if not re.match(REF_REGEXP, ref):
-            return None
-        refType = re.search(REF_REGEXP, ref).group(1)
-        return refType
+            return self.getRefKey()[0]
+        return parseReference(ref)[0]
 
     def getRefNumber(self, ref=None):
         """Вернуть цифровую часть обозначения."""
         if ref is None:
-            ref = self.reference
-        if not re.match(REF_REGEXP, ref):
-            return None
-        refNumber = re.search(REF_REGEXP, ref).group(2)
-        return int(refNumber)
+            return self.getRefKey()[1]
+        return parseReference(ref)[1]
 
     def _convertSingularPlural(self, value, singular, plural):
         """Привести переданное значение к единственному либо множественному числу.
@@ -105,19 +457,14 @@ class Component():
         """
 
         if value and (singular or plural):
-            valueSingularAndPlural = re.match(r"^(.+)\s\{(.+)\}$", value)
-            if valueSingularAndPlural:
+            forms = splitSingularPlural(value)
+            if forms is None:
+                forms = self.schematic.typeNames.get(value)
+            if forms is not None:
                 if singular:
-                    value = valueSingularAndPlural.group(1)
+                    value = forms[0]
                 elif plural:
-                    value = valueSingularAndPlural.group(2)
-            elif self.schematic.typeNamesDict:
-                for item in iter(self.schematic.typeNamesDict.items()):
-                    if value in item:
-                        if singular:
-                            value = item[0]
-                        elif plural:
-                            value = item[1]
+                    value = forms[1]
         return value
 
     def getValueWithUnits(self):
@@ -128,103 +475,10 @@ class Component():
             2u7 -> 2,7 мкФ
 
         """
-        multipliersDict = {
-            'G': 'Г',
-            'M': 'М',
-            'k': 'к',
-            'm': 'м',
-            'μ': 'мк',
-            'u': 'мк',
-            'U': 'мк',
-            'n': 'н',
-            'p': 'п'
-        }
-        numValue = ""
         separator = ""
-        if config.getboolean("doc", "space before units"):
+        if self.schematic.settings.doc.spaceBeforeUnits:
             separator = ' '
-        multiplier = ""
-        units = ""
-        multipliers = set(list(multipliersDict.keys()) + list(multipliersDict.values()))
-        # 2u7, 2н7, 4m7, 5k1 ...
-        regexpr1 = re.compile(
-            r"^(\d+)({})(\d+)$".format('|'.join(multipliers))
-        )
-        # 2.7 u, 2700p, 4.7 m, 470u, 5.1 k, 510 ...
-        regexpr2 = re.compile(
-            r"^(\d+(?:[\.,]\d+)?)\s*({})?$".format('|'.join(multipliers))
-        )
-        if self.getRefType().startswith('C') \
-            and not self.value.endswith('Ф'):
-                units = 'Ф'
-                if re.match(r"^\d+$", self.value):
-                    numValue = self.value
-                    multiplier = 'п'
-                elif re.match(r"^\d+[\.,]\d+$", self.value):
-                    numValue = self.value
-                    multiplier = "мк"
-                else:
-                    numValue = self.value.rstrip('F')
-                    numValue = numValue.strip()
-                    if re.match(regexpr1, numValue):
-                        searchRes = re.search(regexpr1, numValue).groups()
-                        numValue = "{},{}".format(searchRes[0], searchRes[2])
-                        multiplier = searchRes[1]
-                    elif re.match(regexpr2, numValue):
-                        searchRes = re.search(regexpr2, numValue).groups()
-                        numValue = searchRes[0]
-                        multiplier = searchRes[1]
-                    else:
-                        numValue = ""
-        elif self.getRefType().startswith('L') \
-            and not self.value.endswith("Гн"):
-                units = "Гн"
-                numValue = self.value.rstrip('H')
-                numValue = numValue.strip()
-                if re.match(regexpr1, numValue):
-                    searchRes = re.search(regexpr1, numValue).groups()
-                    numValue = "{},{}".format(searchRes[0], searchRes[2])
-                    multiplier = searchRes[1]
-                elif re.match(regexpr2, numValue):
-                    searchRes = re.search(regexpr2, numValue).groups()
-                    numValue = searchRes[0]
-                    if searchRes[1] is None:
-                        multiplier = "мк"
-                    else:
-                        multiplier = searchRes[1]
-                else:
-                    numValue = ""
-        elif self.getRefType().startswith('R') \
-            and not self.value.endswith("Ом"):
-                units = "Ом"
-                numValue = self.value.rstrip('Ω')
-                if numValue.endswith("Ohm") or numValue.endswith("ohm"):
-                    numValue = numValue[:-3]
-                numValue = numValue.strip()
-                if re.match(r"R\d+", numValue):
-                    numValue = numValue.replace('R', "0,")
-                elif re.match(r"\d+R\d+", numValue):
-                    numValue = numValue.replace('R', ',')
-                elif re.match(regexpr1, numValue):
-                    searchRes = re.search(regexpr1, numValue).groups()
-                    numValue = "{},{}".format(searchRes[0], searchRes[2])
-                    multiplier = searchRes[1]
-                elif re.match(regexpr2, numValue):
-                    searchRes = re.search(regexpr2, numValue).groups()
-                    numValue = searchRes[0]
-                    if searchRes[1] is not None:
-                        multiplier = searchRes[1]
-                else:
-                    numValue = ""
-        if numValue:
-            # Перевести множитель на русский
-            if multiplier in multipliersDict:
-                multiplier = multipliersDict[multiplier]
-            elif multiplier is None:
-                multiplier = ''
-            numValue = numValue.replace('.', ',')
-            return numValue + separator + multiplier + units
-        return self.value
+        return normalizeValue(self.getRefType(), self.value, separator)
 
     def formatPattern(self, pattern, check=False, singular=False, plural=False):
         """Преобразовать шаблон.
@@ -259,6 +513,9 @@ class Component():
         обнаружении конструкции ${} будет возвращено значение True, при
         отсутствии такой конструкции - False.
 
+        Шаблон разбирается однократно (см. compilePattern), поэтому повторное
+        применение того же шаблона к другим компонентам выполняется быстро.
+
         Аргументы:
         pattern (str) -- строка текста, которую следует обработать как шаблон;
         check (boolean) -- проверить шаблон без преобразования;
@@ -268,92 +525,20 @@ class Component():
         Возвращаемое значение (str) -- преобразованное значение.
 
         """
-        out = ""
-        prefix = ""
-        fieldName = ""
-        suffix = ""
-        temp = ""
-
-        # Флаг, указывающий на то, что спец.символ нужно обработать как обычный
-        ignore = False
-        # Флаг, указывающий на обрабатываемую часть подстановки.
-        substitution = ""
-
-        def resetSubstitution():
-            nonlocal out, temp, substitution, prefix, fieldName, suffix
-            out += temp
-            substitution = temp = ""
-            prefix = fieldName = suffix = ""
-
-        for char in pattern:
-            if char == '\\' and substitution and not ignore:
-                    ignore = True
-                    temp += char
-                    continue
-            elif substitution:
-                temp += char
-                if substitution == "beginning":
-                    if char == '{' and not ignore:
-                        substitution = "prefix"
-                    else:
-                        out += temp
-                        substitution = temp = ""
-                elif char == '{' and not ignore:
-                    # Конструкция ${} имеет неверный формат:
-                    # ${...{
-                    #      ^
-                    # открывающаяся фигурная скобка внутри подстановки.
-                    resetSubstitution()
-                elif char == '|' and substitution == "prefix" and not ignore:
-                    substitution = "fieldName"
-                elif char == '|' and substitution == "fieldName" and not ignore:
-                    substitution = "suffix"
-                elif char == '|' and substitution == "suffix" and not ignore:
-                    # Конструкция ${} имеет неверный формат:
-                    # ${prefix|fieldName|suffix|
-                    #                          ^
-                    # третья вертикальная черта внутри подстановки.
-                    resetSubstitution()
-                elif char == "}" and not ignore:
-                    if substitution == "fieldName":
-                        # Конструкция ${} имеет неверный формат:
-                        # ${prefix|fieldName}
-                        #                   ^
-                        # одна вертикальная черта в подстановке. Должно быть
-                        # либо две (для пефикса/суффикса), либо не быть вовсе.
-                        resetSubstitution()
-                    else:
-                        if substitution == "prefix":
-                            # Если по завершении конструкции ${} имеется только
-                            # префикс, значит найдена сокращённая конструкция
-                            # (без префикса/суффикса).
-                            fieldName = prefix
-                            prefix = ""
-                        if check:
-                            return True
-                        fieldValue = self.getFieldValue(fieldName)
-                        if fieldValue:
-                            fieldValue = self._convertSingularPlural(fieldValue, singular, plural)
-                            out += prefix + fieldValue + suffix
-                    substitution = temp = prefix = fieldName = suffix = ""
-                elif substitution == "prefix":
-                    prefix += char
-                elif substitution == "fieldName":
-                    fieldName += char
-                elif substitution == "suffix":
-                    suffix += char
-            elif char == '$':
-                substitution = "beginning"
-                temp += char
-            else:
-                out += char
-            ignore = False
-        if substitution:
-            # Конструкция ${} неожиданно закончилась.
-            resetSubstitution()
+        compiledPattern = compilePattern(pattern)
         if check:
-            return False
-        return out
+            return compiledPattern.hasSubstitutions
+        out = []
+        for part in compiledPattern.parts:
+            if type(part) is str:
+                out.append(part)
+                continue
+            prefix, fieldName, suffix = part
+            fieldValue = self.getFieldValue(fieldName)
+            if fieldValue:
+                fieldValue = self._convertSingularPlural(fieldValue, singular, plural)
+                out.append(prefix + fieldValue + suffix)
+        return "".join(out)
 
     def getIndexValue(self, name, singular=False, plural=False):
         """Вернуть преобразованное значение для перечня.
@@ -372,7 +557,14 @@ class Component():
         """
         if name not in ("type", "name", "doc", "comment"):
             return ""
-        fieldName = config.get("fields", name)
+        values = self._getValuesCache()
+        key = (name, singular, plural)
+        if key in values:
+            return values[key]
+        fieldName = getattr(
+            self.schematic.settings.fields,
+            config.getAttributeName(name)
+        )
         value = ""
         if self.formatPattern(fieldName, check=True):
             value = self.formatPattern(fieldName, singular=singular, plural=plural)
@@ -383,8 +575,9 @@ class Component():
             value = self.getFieldValue("Значение")
         if value is None:
             value = ""
-        elif config.getboolean("doc", "split row by \\n"):
+        elif self.schematic.settings.doc.splitRowByN:
             value = value.replace("\\n", "\n")
+        values[key] = value
         return value
 
 
@@ -448,27 +641,34 @@ class CompRange(Component):
                 if self.getRefNumber() > comp.getRefNumber():
                     # Указывать на обозначение с наименьшим номером
                     self.reference = comp.reference
+                    self._resetValuesCache()
                 return True
         return False
 
+    def getGroupingKey(self):
+        """Вернуть ключ множества компонентов.
+
+        Множества, имеющие одинаковые ключи, могут быть объединены
+        (см. append).
+
+        """
+        return (
+            self.getRefType(),
+            self.getIndexValue("type"),
+            self.getIndexValue("name"),
+            self.getIndexValue("doc"),
+            self.getIndexValue("comment")
+        )
+
     def getRefRangeString(self):
         """Вернуть перечень обозначений множества одинаковых компонентов."""
         refStr = ""
         adjustable = False
-        adjustableFieldName = config.get("fields", "adjustable")
+        adjustableFieldName, adjustableRegex = \
+            self.schematic.compileFilters()["adjustable"]
         adjustableFieldValue = self.getRawFieldValue(adjustableFieldName)
-        if adjustableFieldValue is not None:
-            adjustableFieldRegex = config.get("fields", "adjustable regex")
-            try:
-                re.compile(adjustableFieldRegex)
-            except re.error as error:
-                errorMessage = 'Регулярное выражение "{}" для поля "{}" имеет неверный формат:\n{}'.format(
-                    adjustableFieldRegex,
-                    adjustableFieldName,
-                    str(error)
-                )
-                raise Exception(errorMessage) from error
-            if re.match(adjustableFieldRegex, adjustableFieldValue):
+        if adjustableFieldValue is not None \
+            and adjustableRegex.match(adjustableFieldValue):
                 adjustable = True
         if len(self.refRange) > 1:
             # "VD1, VD2", "C8-C11", "R7, R9-R14", "C8*-C11*" ...
@@ -487,7 +687,7 @@ class CompRange(Component):
                         prevNumber = currentNumber
                         counter += 1
                         if counter > 1:
-                            separator = config.get("doc", "ref separator")
+                            separator = self.schematic.settings.doc.refSeparator
                         continue
                 else:
                     if counter > 0:
@@ -558,7 +758,7 @@ class CompGroup():
         if not self._compRanges:
             self._compRanges.append(compRange)
             return True
-        skipRefType = config.getboolean("doc", "concatenate same name groups")
+        skipRefType = self.schematic.settings.doc.concatenateSameNameGroups
         lastCompRange = self._compRanges[-1]
         if (lastCompRange.getRefType() == compRange.getRefType() or skipRefType) \
             and lastCompRange.getIndexValue("type") == compRange.getIndexValue("type"):
@@ -606,7 +806,7 @@ class CompGroup():
 
         currentType = self._compRanges[0].getIndexValue("type", plural=True)
 
-        if not config.getboolean("doc", "title with doc"):
+        if not self.schematic.settings.doc.titleWithDoc:
             return [currentType]
 
         # Список уникальных пар Наименование-Документ
@@ -676,7 +876,16 @@ class CompGroup():
 class Schematic():
     """Данные о схеме и компонентах."""
 
-    def __init__(self, netlistName):
+    def __init__(self, netlistName, data=None):
+        """Получить данные о схеме и компонентах.
+
+        Аргументы:
+        netlistName (str) -- полное имя файла списка цепей;
+        data (dict) -- ранее извлечённые из списка цепей данные; если не
+            указаны -- данные берутся из кэша или из списка цепей.
+
+        """
+        self.netlistName = netlistName
         self.title = ""
         self.number = ""
         self.company = ""
@@ -685,9 +894,13 @@ class Schematic():
         self.inspector = ""
         self.approver = ""
         self.components = []
+        # Параметры, действующие при построении документа.
+        self.settings = config.snapshot()
+        # Фильтры компонентов (см. compileFilters).
+        self._filters = None
 
         self.typeNamesDict = {}
-        if config.getboolean("settings", "compatibility mode"):
+        if self.settings.settings.compatibilityMode:
             # KB2S - kicadbom2spec
             settingsKB2S = config.loadFromKicadbom2spec()
             if settingsKB2S is not None:
@@ -697,81 +910,260 @@ class Schematic():
                             singular = settingsKB2S.get('group names singular', index)
                             plural = settingsKB2S.get('group names plural', index)
                             self.typeNamesDict[singular] = plural
+        # Обратный индекс наименований групп:
+        # {наименование в любом числе: (ед. число, мн. число)}.
+        self.typeNames = {}
+        for names in self.typeNamesDict.items():
+            for name in names:
+                self.typeNames.setdefault(name, names)
+
+        if data is None:
+            data = netcache.load(netlistName)
+        if data is None:
+            fileStates = netcache.getFileStates(netlistName)
+            data = self._readNetlist(netlistName)
+            netcache.save(netlistName, data, fileStates, data["dependencies"])
+        self._setData(data)
+
+    @staticmethod
+    def _readNetlist(netlistName):
+        """Извлечь данные о схеме и компонентах из списка цепей.
+
+        Данные сохраняются в кэше, поэтому представлены только встроенными
+        типами: словарь с данными основной надписи и списком словарей
+        с данными компонентов.
+        Если данные получены непосредственно из файлов схемы KiCad, в словарь
+        также добавляется список файлов вложенных листов, изменение которых
+        должно приводить к повторному чтению схемы.
 
-        netlist = kicadnet.Netlist(netlistName)
-        for sheet in netlist.items("sheet"):
-            if sheet.getText("name") == "/":
-                title_block = netlist.find("title_block", sheet)
+        """
+        data = {
+            "title": "",
+            "number": "",
+            "company": "",
+            "developer": "",
+            "verifier": "",
+            "inspector": "",
+            "approver": "",
+            "components": [],
+            "dependencies": [],
+        }
+        isSchematic = netlistName.endswith(".kicad_sch")
+        # Список цепей разбирается последовательно: обработанные элементы
+        # сразу же отсоединяются, а чтение прекращается как только получены
+        # все необходимые данные. Разделы библиотек и цепей не нужны,
+        # поэтому, где бы они ни находились, они пропускаются без разбора.
+        titleBlockFound = False
+        netItems = kicadnet.iterparse(
+            netlistName,
+            tags={"sheet", "comp", "components"},
+            skip={"libparts", "libraries", "nets"}
+        )
+        for _, netItem in netItems:
+            netItem.detach()
+            if netItem.name == "sheet":
+                sheet = netItem
+                for title_block in sheet.items:
+                    if title_block.name == "title_block":
+                        break
+                else:
+                    continue
+                if sheet.getText("name") != "/":
+                    if isSchematic:
+                        source = os.path.join(
+                            os.path.dirname(netlistName),
+                            title_block.getText("source")
+                        )
+                        if source not in data["dependencies"]:
+                            data["dependencies"].append(source)
+                    continue
+                if titleBlockFound:
+                    continue
+                titleBlockFound = True
                 for item in title_block.items:
                     if item.name == "title":
-                        self.title = item.text if item.text is not None else ""
+                        data["title"] = item.text if item.text is not None else ""
                     elif item.name == "company":
-                        self.company = item.text if item.text is not None else ""
+                        data["company"] = item.text if item.text is not None else ""
                     elif item.name == "comment":
                         if item.getText("number") == "1":
-                            self.number = item.getText("value")
+                            data["number"] = item.getText("value")
                         elif item.getText("number") == "2":
-                            self.developer = item.getText("value")
+                            data["developer"] = item.getText("value")
                         elif item.getText("number") == "3":
-                            self.verifier = item.getText("value")
+                            data["verifier"] = item.getText("value")
                         elif item.getText("number") == "4":
-                            self.approver = item.getText("value")
+                            data["approver"] = item.getText("value")
                         elif item.getText("number") == "6":
-                            self.inspector = item.getText("value")
+                            data["inspector"] = item.getText("value")
+            elif netItem.name == "comp":
+                comp = netItem
+                compData = {
+                    "reference": comp.getText("ref"),
+                    "value": "",
+                    "footprint": "",
+                    "datasheet": "",
+                    "description": "",
+                    "fields": {},
+                    "tstamps": "",
+                }
+                skip = False
+                for item in comp.items:
+                    if item.name == "value":
+                        compData["value"] = item.text if item.text is not None and item.text != "~" else ""
+                    elif item.name == "footprint":
+                        compData["footprint"] = item.text if item.text is not None and item.text != "~" else ""
+                    elif item.name == "datasheet":
+                        compData["datasheet"] = item.text if item.text is not None and item.text != "~" else ""
+                    elif item.name == "libsource":
+                        compData["description"] = item.getText("description")
+                    elif item.name in ("tstamps", "tstamp"):
+                        compData["tstamps"] = comp.getText(item.name)
+                    elif item.name == "fields":
+                        for field in item.items:
+                            fieldName = field.getText("name")
+                            compData["fields"][fieldName] = field.text if field.text is not None and field.text != "~" else ""
+                    elif item.name == "property":
+                        if item.getText("name") == "exclude_from_bom":
+                            skip = True
+                            break
+                if not skip:
+                    data["components"].append(compData)
+            else:
+                # Все компоненты получены.
                 break
-        for comp in netlist.items("comp"):
+        return data
+
+    def _setData(self, data):
+        """Заполнить данные о схеме и компонентах."""
+        self.title = data["title"]
+        self.number = data["number"]
+        self.company = data["company"]
+        self.developer = data["developer"]
+        self.verifier = data["verifier"]
+        self.inspector = data["inspector"]
+        self.approver = data["approver"]
+        for compData in data["components"]:
             component = Component(self)
-            component.reference = comp.getText("ref")
-            skip = False
-            for item in comp.items:
-                if item.name == "value":
-                    component.value = item.text if item.text is not None and item.text != "~" else ""
-                elif item.name == "footprint":
-                    component.footprint = item.text if item.text is not None and item.text != "~" else ""
-                elif item.name == "datasheet":
-                    component.datasheet = item.text if item.text is not None and item.text != "~" else ""
-                elif item.name == "libsource":
-                    component.description = item.getText("description")
-                elif item.name == "fields":
-                    for field in item.items:
-                        fieldName = field.getText("name")
-                        component.fields[fieldName] = field.text if field.text is not None and field.text != "~" else ""
-                elif item.name == "property":
-                    if item.getText("name") == "exclude_from_bom":
-                        skip = True
-                        break
-            if not skip:
-                self.components.append(component)
+            component.reference = compData["reference"]
+            component.value = compData["value"]
+            component.footprint = compData["footprint"]
+            component.datasheet = compData["datasheet"]
+            component.description = compData["description"]
+            component.fields = dict(compData["fields"])
+            component.tstamps = compData["tstamps"]
+            self.components.append(component)
+
+    def getPrevious(self):
+        """Вернуть данные о схеме до последнего изменения списка цепей.
+
+        Возвращаемое значение -- объект класса Schematic или None, если
+            данные о предыдущей версии списка цепей отсутствуют.
+
+        """
+        data = netcache.loadPrevious(self.netlistName)
+        if data is None:
+            return None
+        return Schematic(self.netlistName, data)
+
+    def diff(self, previous):
+        """Сравнить компоненты схемы с компонентами предыдущей версии.
+
+        Компоненты сопоставляются по меткам времени (tstamps), что позволяет
+        обнаружить изменение обозначения. Компоненты без пары по меткам
+        времени сопоставляются по обозначению.
+
+        Аргументы:
+        previous (Schematic) -- предыдущая версия схемы (см. getPrevious);
+            если не указана -- все компоненты считаются добавленными.
+
+        Возвращаемое значение -- объект класса SchematicDiff.
+
+        """
+        changes = SchematicDiff()
+        prevComponents = [] if previous is None else previous.components
+        prevByTstamps = {}
+        prevByRef = {}
+        for prevComp in prevComponents:
+            if prevComp.tstamps:
+                prevByTstamps.setdefault(prevComp.tstamps, prevComp)
+            prevByRef.setdefault(prevComp.reference, prevComp)
+        matched = set()
+        unmatched = []
+        for comp in self.components:
+            prevComp = prevByTstamps.get(comp.tstamps) if comp.tstamps else None
+            if prevComp is None or id(prevComp) in matched:
+                unmatched.append(comp)
+                continue
+            matched.add(id(prevComp))
+            if comp.getData() != prevComp.getData():
+                changes.changed.append((prevComp, comp))
+        for comp in unmatched:
+            prevComp = prevByRef.get(comp.reference)
+            if prevComp is None or id(prevComp) in matched:
+                changes.added.append(comp)
+                continue
+            matched.add(id(prevComp))
+            if comp.getData() != prevComp.getData():
+                changes.changed.append((prevComp, comp))
+        for prevComp in prevComponents:
+            if id(prevComp) not in matched:
+                changes.removed.append(prevComp)
+        return changes
+
+    def compileFilters(self):
+        """Проверить и скомпилировать фильтры компонентов.
+
+        Регулярные выражения фильтров компилируются один раз для схемы.
+        Построитель вызывает этот метод до начала изменения документа,
+        чтобы ошибка в выражении была обнаружена раньше, чем будет
+        очищена таблица.
+
+        Возвращаемое значение (dict) -- {назначение фильтра: (имя поля,
+            скомпилированное регулярное выражение)}.
+
+        """
+        if self._filters is None:
+            fields = self.settings.fields
+            self._filters = {
+                "excluded": (
+                    fields.excluded,
+                    compileFieldRegex(fields.excluded, fields.excludedRegex)
+                ),
+                "adjustable": (
+                    fields.adjustable,
+                    compileFieldRegex(fields.adjustable, fields.adjustableRegex)
+                ),
+            }
+        return self._filters
+
+    def getIncludedComponents(self):
+        """Вернуть компоненты, не исключённые из документа.
+
+        Компонент исключается, если значение поля исключения соответствует
+        регулярному выражению. Все компоненты проверяются за один проход.
+
+        """
+        fieldName, regex = self.compileFilters()["excluded"]
+        match = regex.match
+        includedComponents = []
+        for comp in self.components:
+            value = comp.getRawFieldValue(fieldName)
+            if value is None or not match(value):
+                includedComponents.append(comp)
+        return includedComponents
 
     def getGroupedComponents(self):
         """Вернуть компоненты, сгруппированные по обозначению и типу."""
+        # По буквенной части обозначения, затем по номеру.
         sortedComponents = sorted(
-            self.components,
-            key=lambda comp: comp.getRefNumber()
-        )
-        sortedComponents = sorted(
-            sortedComponents,
-            key=lambda comp: comp.getRefType()
+            self.getIncludedComponents(),
+            key=lambda comp: comp.getRefKey()[:2]
         )
         groups = []
         compGroup = CompGroup(self)
         compRange = CompRange(self)
-        excludedFieldName = config.get("fields", "excluded")
         for comp in sortedComponents:
-            excludedFieldValue = comp.getRawFieldValue(excludedFieldName)
-            if excludedFieldValue is not None:
-                excludedFieldRegex = config.get("fields", "excluded regex")
-                try:
-                    re.compile(excludedFieldRegex)
-                except re.error as error:
-                    errorMessage = 'Регулярное выражение "{}" для поля "{}" имеет неверный формат:\n{}'.format(
-                        excludedFieldRegex,
-                        excludedFieldName,
-                        str(error)
-                    )
-                    raise Exception(errorMessage) from error
-                if re.match(excludedFieldRegex, excludedFieldValue):
-                    continue
             if not compRange.append(comp):
                 if not compGroup.append(compRange):
                     groups.append(compGroup)
@@ -783,16 +1175,43 @@ class Schematic():
                 compGroup = CompGroup(self, compRange)
         if len(compGroup) > 0:
             groups.append(compGroup)
-        if config.getboolean("doc", "gather same name components"):
+        if self.settings.doc.gatherSameNameComponents:
             combinedGroups = []
             for compGroup in groups:
                 combinedCompGroup = CompGroup(self)
+                # Множества с одинаковыми ключами присоединяются к первому
+                # из них, поэтому порядок множеств в группе сохраняется.
+                combinedCompRanges = {}
                 for compRange in compGroup:
-                    for combinedCompRange in combinedCompGroup:
-                        if combinedCompRange.append(compRange):
-                            break
-                    else:
-                        combinedCompGroup.append(compRange)
+                    key = compRange.getGroupingKey()
+                    combinedCompRange = combinedCompRanges.get(key)
+                    if combinedCompRange is not None \
+                        and combinedCompRange.append(compRange):
+                            continue
+                    combinedCompRanges[key] = compRange
+                    combinedCompGroup.append(compRange)
                 combinedGroups.append(combinedCompGroup)
             groups = combinedGroups
         return groups
+
+
+class SchematicDiff():
+    """Изменения в составе и данных компонентов схемы.
+
+    Атрибуты:
+    added (list of Component) -- добавленные компоненты;
+    removed (list of Component) -- удалённые компоненты (из предыдущей
+        версии схемы);
+    changed (list of tuple) -- изменённые компоненты в виде пар
+        (компонент предыдущей версии, компонент текущей версии).
+
+    """
+
+    def __init__(self):
+        self.added = []
+        self.removed = []
+        self.changed = []
+
+    def isEmpty(self):
+        """Проверить отсутствие изменений."""
+        return not (self.added or self.removed or self.changed)
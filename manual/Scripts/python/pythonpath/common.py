@@ -161,7 +161,8 @@ def getSourceFileName():
     Попытаться найти файл с данными о схеме в текущем каталоге.
     В случае неудачи, показать диалоговое окно выбора файла.
 
-    Для KiCad источником данных о схеме является список цепей.
+    Для KiCad источником данных о схеме является список цепей. Если список
+    цепей отсутствует, данные берутся непосредственно из файла схемы.
 
     Возвращаемое значение -- полное имя файла или None, если файл
         не найден или не выбран.
@@ -180,14 +181,22 @@ def getSourceFileName():
             if fileName.endswith(".kicad_pro"):
                 sourceName = fileName.replace(".kicad_pro", ".net")
         if sourceName:
-            sourcePath = os.path.join(sourceDir, sourceName)
-            if os.path.exists(sourcePath):
-                config.set("doc", "source", sourcePath)
-                config.save()
-                return sourcePath
+            for sourceExt in (".net", ".kicad_sch"):
+                sourcePath = os.path.join(
+                    sourceDir,
+                    os.path.splitext(sourceName)[0] + sourceExt
+                )
+                if os.path.exists(sourcePath):
+                    config.set("doc", "source", sourcePath)
+                    config.save()
+                    return sourcePath
     sourcePath = showFilePicker(
         os.path.join(sourceDir, sourceName),
-        **{"Список цепей KiCad": "*.net", "Все файлы": "*.*"}
+        **{
+            "Список цепей KiCad": "*.net;*.xml",
+            "Схема KiCad": "*.kicad_sch",
+            "Все файлы": "*.*"
+        }
     )
     if sourcePath is not None:
         config.set("doc", "source", sourcePath)
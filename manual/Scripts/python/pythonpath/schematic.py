@@ -21,27 +21,36 @@ class Schematic():
         self.inspector = ""
         self.approver = ""
 
-        netlist = kicadnet.Netlist(netlistName)
-        for sheet in netlist.items("sheet"):
-            if sheet.getText("name") == "/":
-                title_block = netlist.find("title_block", sheet)
-                for item in title_block.items:
-                    if item.name == "title":
-                        self.title = item.text if item.text is not None else ""
-                    elif item.name == "company":
-                        self.company = item.text if item.text is not None else ""
-                    elif item.name == "comment":
-                        if item.getText("number") == "1":
-                            self.number = item.getText("value")
-                        elif item.getText("number") == "2":
-                            self.developer = item.getText("value")
-                        elif item.getText("number") == "3":
-                            self.verifier = item.getText("value")
-                        elif item.getText("number") == "4":
-                            self.approver = item.getText("value")
-                        elif item.getText("number") == "6":
-                            self.inspector = item.getText("value")
-                break
-                if self.getRefNumber() > comp.getRefNumber():
-                    # Указывать на обозначение с наименьшим номером
-                    self.reference = comp.reference
+        # Список цепей разбирается последовательно, чтение прекращается
+        # как только будет найдена основная надпись.
+        netItems = kicadnet.iterparse(
+            netlistName,
+            tags={"sheet"},
+            skip={"components", "libparts", "libraries", "nets"}
+        )
+        for _, sheet in netItems:
+            sheet.detach()
+            if sheet.getText("name") != "/":
+                continue
+            for title_block in sheet.items:
+                if title_block.name == "title_block":
+                    break
+            else:
+                continue
+            for item in title_block.items:
+                if item.name == "title":
+                    self.title = item.text if item.text is not None else ""
+                elif item.name == "company":
+                    self.company = item.text if item.text is not None else ""
+                elif item.name == "comment":
+                    if item.getText("number") == "1":
+                        self.number = item.getText("value")
+                    elif item.getText("number") == "2":
+                        self.developer = item.getText("value")
+                    elif item.getText("number") == "3":
+                        self.verifier = item.getText("value")
+                    elif item.getText("number") == "4":
+                        self.approver = item.getText("value")
+                    elif item.getText("number") == "6":
+                        self.inspector = item.getText("value")
+            break
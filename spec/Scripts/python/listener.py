@@ -7,8 +7,11 @@ import zipimport
 EMBEDDED_MODULES = (
     "textwidth",
     "kicadnet",
+    "netcache",
     "config",
     "schematic",
+    "tablelayout",
+    "odtwriter",
     "common",
 )
 
@@ -349,6 +352,16 @@ def init(*args):
                 toolbarPos
             )
 
+def isInitialized(*args):
+    """Выполнена ли начальная настройка документа?
+
+    Начальная настройка (init) выполняется по событию создания или открытия
+    документа уже после его загрузки. Используется при пакетном построении
+    документов (см. batch.py), чтобы дождаться импорта встроенных модулей.
+
+    """
+    return common is not None
+
 def cleanup(*args):
     """Удалить объекты встроенных модулей из системы импорта Python."""
 
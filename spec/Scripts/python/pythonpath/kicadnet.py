@@ -1,6 +1,92 @@
 """Объектное представление списка цепей KiCad."""
 
+import concurrent.futures
+import gc
 import html
+import mmap
+import os
+import re
+import sys
+import xml.parsers.expat
+
+# Лексемы списка цепей (S-выражения):
+TOKEN_OPEN = 1 # начало элемента: '(' и имя элемента
+TOKEN_CLOSE = 2 # конец элемента: ')'
+TOKEN_QUOTED = 3 # значение в кавычках
+TOKEN_ATOM = 4 # значение без кавычек
+TOKEN_ERROR = 5 # незакрытая кавычка
+
+TOKEN_PATTERN = (
+    r'\(([^ \t\r\n()]*)'
+    r'|(\))'
+    r'|"((?:[^"\\\n]|\\.)*)"'
+    r'|([^ \t\r\n()"][^ \t\r\n()]*)'
+    r'|(")'
+)
+UNESCAPE_PATTERN = r'\\([\\"])'
+TOKEN_REGEXP = re.compile(TOKEN_PATTERN)
+UNESCAPE_REGEXP = re.compile(UNESCAPE_PATTERN)
+# Служебные символы S-выражений -- ASCII, поэтому в кодировке UTF-8 они
+# однозначно распознаются и без декодирования файла.
+TOKEN_BYTES_REGEXP = re.compile(TOKEN_PATTERN.encode())
+UNESCAPE_BYTES_REGEXP = re.compile(UNESCAPE_PATTERN.encode())
+
+# Элементы списка цепей в формате XML, значения которых записываются
+# в виде атрибутов родительского элемента (в формате *.net они
+# представлены дочерними элементами).
+XML_ATTRIBUTES = {
+    "export": ("version",),
+    "sheet": ("number", "name", "tstamps"),
+    "comment": ("number", "value"),
+    "textvar": ("name",),
+    "comp": ("ref",),
+    "field": ("name",),
+    "libsource": ("lib", "part", "description"),
+    "property": ("name", "value"),
+    "sheetpath": ("names", "tstamps"),
+    "unit": ("name",),
+    "libpart": ("lib", "part"),
+    "pin": ("num", "name", "type"),
+    "library": ("logical",),
+    "net": ("code", "name", "class"),
+    "node": ("ref", "pin", "pinfunction", "pintype"),
+}
+XML_CHUNK_SIZE = 1024 * 1024
+
+# Имена элементов, для которых по умолчанию строится указатель (см.
+# Netlist). Указатель по всем элементам большого списка цепей занимает
+# слишком много памяти.
+INDEX_NAMES = frozenset(("comp", "libpart", "net"))
+
+# Элементы верхнего уровня файла схемы (*.kicad_sch), которые не содержат
+# данных о компонентах и основной надписи.
+SCHEMATIC_SKIP = {
+    "wire",
+    "bus",
+    "bus_entry",
+    "junction",
+    "no_connect",
+    "label",
+    "global_label",
+    "hierarchical_label",
+    "directive_label",
+    "netclass_flag",
+    "text",
+    "text_box",
+    "table",
+    "polyline",
+    "rectangle",
+    "circle",
+    "arc",
+    "bezier",
+    "image",
+    "rule_area",
+    "embedded_files",
+}
+# Поля компонента, которые в списке цепей указываются отдельно.
+SCHEMATIC_BASIC_FIELDS = ("Reference", "Value", "Footprint", "Datasheet", "Description")
+SCHEMATIC_MAX_WORKERS = 8
+DIGITS_REGEXP = re.compile(r"(\d+)")
 
 
 class ParseException(Exception):
@@ -21,6 +107,14 @@ class ParseException(Exception):
 class NetlistItem():
     """Элемент списка цепей."""
 
+    # Большой список цепей содержит сотни тысяч элементов, поэтому для
+    # экономии памяти атрибуты хранятся в слотах, а не в словаре.
+    __slots__ = ("parent", "name", "items", "text", "_children")
+
+    # Если дочерних элементов больше указанного количества, то для поиска
+    # по имени строится словарь, иначе выполняется простой перебор.
+    CHILDREN_SCAN_LIMIT = 8
+
     def __init__(self, parent, name, items=None, text=None):
         """Создать элемент списка цепей.
 
@@ -43,6 +137,7 @@ class NetlistItem():
         self.name = name
         self.items = [] if items is None else items
         self.text = text
+        self._children = None
 
     def getText(self, name):
         """Получить текст элемента списка цепей с указанным именем.
@@ -54,157 +149,846 @@ class NetlistItem():
         name (str) -- имя элемента.
 
         """
-        for item in self.items:
-            if item.name == name:
-                if type(item.text) is str:
-                    return item.text
-                elif type(item.text) is list:
-                    return ' '.join(item.text)
-                else:
-                    break
+        item = self._getChild(name)
+        if item is not None:
+            if type(item.text) is str:
+                return item.text
+            elif type(item.text) is list:
+                return ' '.join(item.text)
         return ""
 
+    def _getChild(self, name):
+        """Найти первый дочерний элемент с указанным именем."""
+        items = self.items
+        if len(items) <= self.CHILDREN_SCAN_LIMIT:
+            for item in items:
+                if item.name == name:
+                    return item
+            return None
+        # Словарь перестраивается, если изменилось количество дочерних
+        # элементов.
+        if self._children is None or self._children[0] != len(items):
+            children = {}
+            for item in reversed(items):
+                children[item.name] = item
+            self._children = (len(items), children)
+        return self._children[1].get(name)
+
+    def detach(self):
+        """Отсоединить элемент от родительского элемента.
 
-class Netlist():
-    """Список цепей."""
+        Используется при последовательном разборе списка цепей (iterparse),
+        чтобы уже обработанные элементы не накапливались в памяти.
+
+        """
+        if self.parent is None:
+            return
+        items = self.parent.items
+        if items and items[-1] is self:
+            items.pop()
+        else:
+            items.remove(self)
+        self.parent = None
+
+
+class _Lexer():
+    """Лексический анализатор списка цепей.
+
+    Файл считывается частями, поэтому объём используемой памяти не зависит
+    от размера файла. Номер строки и позиция вычисляются только при
+    возникновении ошибки.
+
+    """
+
+    CHUNK_SIZE = 1024 * 1024
 
     def __init__(self, fileName):
-        """Считать список цепей.
+        self._stream = open(fileName, encoding="utf-8")
+        self._buffer = ""
+        self._offset = 0 # Позиция начала буфера в файле
+        self._line = 1 # Номер строки начала буфера
+        self._column = 0 # Позиция начала буфера в строке
+        self._skip = False
 
-        Загрузить содержимое файла списка цепей KiCad (*.net, *.xml)
-        и построить его объектное представление.
+    def tokens(self):
+        """Разбить содержимое файла на лексемы.
 
-        Атрибуты:
-        fileName (str) -- полное имя файла списка цепей.
-        data (NetlistItem) -- объектное представление списка цепей.
+        Возвращается итератор, выдающий кортежи вида:
+        (тип лексемы, значение, позиция в файле).
 
         """
-        self.fileName = fileName
-        self.data = None
-        self._reset()
-        with open(fileName, encoding="utf-8") as netlist:
-            if self.fileName.endswith(".net"):
-                self._content = netlist.read()
-                self.data = self._parseNetItem(None)
-                self._reset()
-            elif self.fileName.endswith(".xml"):
-                netlist.readline() # Пропустить первую строку (заголовок)
-                self._content = netlist.read()
-                self.data = self._parseXmlItem(None)
-                self._reset()
-            else:
-                self._error("Формат файла не поддерживается.")
-
-    def _reset(self):
-        self._content = ""
-        self._index = 0
-        self._line = 1
-        self._pos = 1
-
-    def _error(self, message):
-        raise ParseException(
-            self._line,
-            self._pos,
-            message
-        )
+        eof = False
+        depth = 0 # Глубина вложенности внутри пропускаемого элемента
+        while not eof:
+            chunk = self._stream.read(self.CHUNK_SIZE)
+            eof = not chunk
+            buffer = self._buffer + chunk
+            self._buffer = buffer
+            rest = len(buffer)
+            for match in TOKEN_REGEXP.finditer(buffer):
+                kind = match.lastindex
+                if not eof:
+                    # Лексема на границе буфера может продолжаться
+                    # в следующей части файла.
+                    if match.end() == len(buffer) \
+                        or (kind == TOKEN_ERROR and '\n' not in buffer[match.start():]):
+                            rest = match.start()
+                            break
+                if depth:
+                    if kind == TOKEN_OPEN:
+                        depth += 1
+                        continue
+                    elif kind == TOKEN_CLOSE:
+                        depth -= 1
+                        if depth:
+                            continue
+                    elif kind != TOKEN_ERROR:
+                        continue
+                value = match.group(kind)
+                if kind == TOKEN_QUOTED and '\\' in value:
+                    value = UNESCAPE_REGEXP.sub(r"\1", value)
+                yield kind, value, self._offset + match.start()
+                if self._skip:
+                    self._skip = False
+                    depth = 1
+            if not eof:
+                lfPos = buffer.rfind('\n', 0, rest)
+                if lfPos == -1:
+                    self._column += rest
+                else:
+                    self._line += buffer.count('\n', 0, rest)
+                    self._column = rest - lfPos - 1
+                self._offset += rest
+                self._buffer = buffer[rest:]
 
-    def _hasChar(self):
-        return self._index < len(self._content)
+    def skip(self):
+        """Пропустить содержимое только что открытого элемента.
 
-    def _getChar(self, offset=0):
-        return self._content[self._index + offset]
+        Лексемы внутри элемента не выдаются, учитывается только парность
+        скобок. Следующей будет выдана лексема конца элемента.
 
-    def _nextChar(self, offset=1):
-        if offset > 1:
-            self._nextChar(offset - 1)
-        if self._hasChar() and self._getChar() == '\n':
-            self._line += 1
-            self._pos = 0
-        self._index += 1
-        self._pos += 1
+        """
+        self._skip = True
 
-    def _parseNetText(self):
-        if not self._hasChar():
-            return None
-        text = ""
-        quoted = False
-        if self._getChar() == '"':
-            quoted = True
-            self._nextChar()
-        if quoted:
-            while self._hasChar():
-                character = self._getChar()
-                if character == '\n':
-                    self._error(
-                        "Значение неожиданно закончилось " \
-                        "(должно заканчиваться символом '\"')!"
-                    )
-                previous = self._getChar(-1)
-                self._nextChar()
-                if character == '"' and previous != '\\':
-                    text = text.replace("\\\"", "\"")
-                    text = text.replace("\\\\", "\\")
-                    break
-                text += character
-            else:
-                self._error(
-                    "Значение неожиданно закончилось " \
-                    "(должно заканчиваться символом '\"')!"
-                )
+    def error(self, message, index):
+        """Сообщить об ошибке в указанной позиции файла."""
+        index = max(index - self._offset, 0)
+        line = self._line + self._buffer.count('\n', 0, index)
+        lfPos = self._buffer.rfind('\n', 0, index)
+        if lfPos == -1:
+            pos = self._column + index + 1
         else:
-            while self._hasChar():
-                character = self._getChar()
-                if character in " \t()\n":
-                    break
-                text += character
-                self._nextChar()
-            else:
-                self._error("Значение неожиданно закончилось!")
-        return text
+            pos = index - lfPos
+        raise ParseException(line, pos, message)
 
-    def _parseNetItem(self, parent):
-        if not self._hasChar():
-            return None
-        if self._getChar() != '(':
-            self._error("Элемент должен начинаться символом '('!")
-        self._nextChar()
-        name = ""
-        while self._hasChar():
-            character = self._getChar()
-            if character in " \t()\n":
+    def lineEnd(self, index):
+        """Вернуть позицию конца строки, содержащей указанную позицию."""
+        lfPos = self._buffer.find('\n', index - self._offset)
+        if lfPos == -1:
+            lfPos = len(self._buffer)
+        return self._offset + lfPos
+
+    def end(self):
+        """Вернуть позицию конца считанных данных."""
+        return self._offset + len(self._buffer)
+
+    def close(self):
+        """Закрыть файл."""
+        self._stream.close()
+
+
+class _MmapLexer():
+    """Лексический анализатор списка цепей, отображённого в память.
+
+    Файл не считывается и не декодируется целиком: разбор выполняется
+    непосредственно над байтами отображённого в память файла, а в строки
+    преобразуются только выдаваемые значения. Содержимое пропускаемых
+    элементов не декодируется вовсе.
+
+    """
+
+    def __init__(self, fileName):
+        with open(fileName, "rb") as netlist:
+            try:
+                self._data = mmap.mmap(
+                    netlist.fileno(),
+                    0,
+                    access=mmap.ACCESS_READ
+                )
+            except ValueError:
+                # Пустой файл невозможно отобразить в память.
+                self._data = b""
+        self._skip = False
+        self._tokens = None
+
+    def tokens(self):
+        """Разбить содержимое файла на лексемы.
+
+        Возвращается итератор, выдающий кортежи вида:
+        (тип лексемы, значение, позиция в файле).
+
+        """
+        self._tokens = self._iterTokens()
+        return self._tokens
+
+    def _iterTokens(self):
+        depth = 0 # Глубина вложенности внутри пропускаемого элемента
+        for match in TOKEN_BYTES_REGEXP.finditer(self._data):
+            kind = match.lastindex
+            if depth:
+                if kind == TOKEN_OPEN:
+                    depth += 1
+                    continue
+                elif kind == TOKEN_CLOSE:
+                    depth -= 1
+                    if depth:
+                        continue
+                elif kind != TOKEN_ERROR:
+                    continue
+            value = match.group(kind)
+            if kind == TOKEN_QUOTED and b'\\' in value:
+                value = UNESCAPE_BYTES_REGEXP.sub(rb"\1", value)
+            yield kind, value.decode("utf-8"), match.start()
+            if self._skip:
+                self._skip = False
+                depth = 1
+
+    def skip(self):
+        """Пропустить содержимое только что открытого элемента.
+
+        Лексемы внутри элемента не выдаются, учитывается только парность
+        скобок. Следующей будет выдана лексема конца элемента.
+
+        """
+        self._skip = True
+
+    def error(self, message, index):
+        """Сообщить об ошибке в указанной позиции файла."""
+        line = self._data[:index].count(b'\n') + 1
+        lfPos = self._data.rfind(b'\n', 0, index)
+        lineStart = self._data[lfPos + 1:index]
+        pos = len(lineStart.decode("utf-8", errors="replace")) + 1
+        raise ParseException(line, pos, message)
+
+    def lineEnd(self, index):
+        """Вернуть позицию конца строки, содержащей указанную позицию."""
+        lfPos = self._data.find(b'\n', index)
+        if lfPos == -1:
+            lfPos = len(self._data)
+        return lfPos
+
+    def end(self):
+        """Вернуть позицию конца считанных данных."""
+        return len(self._data)
+
+    def close(self):
+        """Освободить отображённый в память файл."""
+        if self._tokens is not None:
+            # Пока существуют результаты поиска, отображение закрыть нельзя.
+            self._tokens.close()
+            self._tokens = None
+        if isinstance(self._data, mmap.mmap):
+            self._data.close()
+
+
+def _parse(lexer, skip=None):
+    """Разобрать список цепей.
+
+    Возвращается итератор, выдающий кортежи вида (событие, элемент), где
+    событие -- "start" при открытии элемента или "end" при его закрытии.
+    Каждый новый элемент добавляется в список дочерних элементов родителя.
+
+    Разделы верхнего уровня, имена которых указаны в skip, пропускаются:
+    их содержимое проверяется только на парность скобок и кавычек, элементы
+    для них не создаются.
+
+    """
+    root = None
+    item = None
+    skipped = False
+    for kind, value, index in lexer.tokens():
+        if kind == TOKEN_OPEN:
+            if item is None and root is not None:
                 break
-            name += character
-            self._nextChar()
-        else:
-            self._error("Элемент неожиданно закончился!")
-        if name == "":
-            self._error("Элемент не имеет имени!")
-        item = NetlistItem(parent, name)
-        while self._hasChar():
-            character = self._getChar()
-            if character in ' \t\n':
-                self._nextChar()
-            elif character == '(':
-                subitem = self._parseNetItem(item)
+            if value == "":
+                lexer.error("Элемент не имеет имени!", index + 1)
+            # Имён элементов немного, а повторяются они многократно.
+            value = sys.intern(value)
+            if skip and item is not None and item is root and value in skip:
+                lexer.skip()
+                skipped = True
+                continue
+            subitem = NetlistItem(item, value)
+            if item is None:
+                root = subitem
+            else:
                 item.items.append(subitem)
-            elif character == ')':
-                self._nextChar()
+            item = subitem
+            yield "start", item
+        elif item is None:
+            if root is not None:
                 break
-            else:
-                text = self._parseNetText()
-                if item.text is None:
-                    item.text = text
-                else:
-                    if type(item.text) is not list:
-                        item.text = [item.text]
-                    item.text.append(text)
+            lexer.error("Элемент должен начинаться символом '('!", index)
+        elif kind == TOKEN_CLOSE:
+            if skipped:
+                # Конец пропущенного раздела.
+                skipped = False
+                continue
+            # Элемент может быть отсоединён от родителя при обработке события.
+            parent = item.parent
+            yield "end", item
+            item = parent
+        elif kind == TOKEN_ERROR:
+            lexer.error(
+                "Значение неожиданно закончилось " \
+                "(должно заканчиваться символом '\"')!",
+                lexer.lineEnd(index)
+            )
+        elif item.text is None:
+            item.text = value
         else:
-            self._error(
-                "Элемент неожиданно закончился " \
-                "(должен заканчиваться символом ')')!"
+            if type(item.text) is not list:
+                item.text = [item.text]
+            item.text.append(value)
+    if item is not None:
+        lexer.error(
+            "Элемент неожиданно закончился " \
+            "(должен заканчиваться символом ')')!",
+            lexer.end()
+        )
+
+
+def _parseXml(fileName, skip=None):
+    """Разобрать список цепей в формате XML.
+
+    Разбор выполняется средствами expat, файл считывается частями.
+    Атрибуты элемента XML становятся его дочерними элементами, а текст --
+    текстом элемента, поэтому дерево элементов совпадает с деревом,
+    полученным из файла *.net.
+
+    Возвращается итератор, выдающий кортежи вида (событие, элемент)
+    (см. _parse).
+
+    """
+    events = []
+    stack = []
+    textParts = []
+    skipDepth = 0 # Глубина вложенности внутри пропускаемого раздела
+
+    def startElement(name, attributes):
+        nonlocal skipDepth
+        if skip and len(stack) == 1 and name in skip:
+            # На время пропуска раздела обработчики заменяются
+            # простейшими, а текст не обрабатывается вовсе.
+            skipDepth = 1
+            parser.StartElementHandler = startSkippedElement
+            parser.EndElementHandler = endSkippedElement
+            parser.CharacterDataHandler = None
+            return
+        textParts.clear()
+        parent = stack[-1] if stack else None
+        item = NetlistItem(parent, sys.intern(name))
+        if parent is not None:
+            parent.items.append(item)
+        # Атрибуты представлены списком: [имя, значение, имя, значение...]
+        for i in range(0, len(attributes), 2):
+            item.items.append(
+                NetlistItem(item, sys.intern(attributes[i]), text=attributes[i + 1])
             )
+        stack.append(item)
+        events.append(("start", item))
+
+    def endElement(name):
+        item = stack.pop()
+        if textParts:
+            text = "".join(textParts)
+            textParts.clear()
+            if text.strip():
+                item.text = text
+        events.append(("end", item))
+
+    def startSkippedElement(name, attributes):
+        nonlocal skipDepth
+        skipDepth += 1
+
+    def endSkippedElement(name):
+        nonlocal skipDepth
+        skipDepth -= 1
+        if not skipDepth:
+            parser.StartElementHandler = startElement
+            parser.EndElementHandler = endElement
+            parser.CharacterDataHandler = textParts.append
+
+    parser = xml.parsers.expat.ParserCreate()
+    parser.ordered_attributes = True
+    parser.buffer_text = True
+    parser.StartElementHandler = startElement
+    parser.EndElementHandler = endElement
+    parser.CharacterDataHandler = textParts.append
+    with open(fileName, "rb") as netlist:
+        eof = False
+        while not eof:
+            chunk = netlist.read(XML_CHUNK_SIZE)
+            eof = not chunk
+            try:
+                parser.Parse(chunk, eof)
+            except xml.parsers.expat.ExpatError as error:
+                raise ParseException(
+                    error.lineno,
+                    error.offset + 1,
+                    "Неверная структура XML: {}.".format(
+                        xml.parsers.expat.ErrorString(error.code)
+                    )
+                )
+            # Элементы, разобранные в текущей части файла.
+            for event in events:
+                yield event
+            events.clear()
+
+
+class _SchematicReader():
+    """Чтение иерархии схемы KiCad (*.kicad_sch).
+
+    Из файлов схемы извлекаются основные надписи листов и данные
+    о компонентах, которые представляются в виде дерева элементов, имеющего
+    ту же структуру, что и дерево списка цепей (export/design/sheet,
+    export/components/comp). Это позволяет получать данные о схеме без
+    предварительного экспорта списка цепей.
+
+    Файлы листов иерархии загружаются параллельно.
+
+    """
+
+    def __init__(self, fileName):
+        self.fileName = os.path.abspath(fileName)
+        self.baseDir = os.path.dirname(self.fileName)
+        self._files = {} # Загруженные файлы листов: {полное имя: корень}
+        self._sheetNumber = 0
+        self._components = {} # Компоненты по обозначениям
+        self._legacyInstances = {}
+
+    def read(self):
+        """Прочитать иерархию схемы.
+
+        Возвращаемое значение -- корневой элемент дерева (export).
+
+        """
+        self._loadFiles()
+        root = self._files[self.fileName]
+        # В KiCad 6 обозначения компонентов хранятся в корневом файле.
+        for instances in root.items:
+            if instances.name == "symbol_instances":
+                for path in instances.items:
+                    if path.name == "path":
+                        self._legacyInstances[path.text] = path
+        export = NetlistItem(None, "export")
+        self._addItem(export, "version", "E")
+        design = self._addItem(export, "design")
+        self._addItem(design, "source", self.fileName)
+        self._addItem(design, "tool", "eskd-templates")
+        components = NetlistItem(export, "components")
+        self._readSheet(
+            design,
+            components,
+            self.fileName,
+            "/",
+            "/",
+            "/" + root.getText("uuid"),
+            ""
+        )
+        # Как и в списке цепей, компоненты упорядочиваются по обозначениям
+        # с учётом числовых значений (R2 < R10).
+        components.items.sort(key=self._getSortKey)
+        export.items.append(components)
+        return export
+
+    @staticmethod
+    def _getSortKey(comp):
+        """Вернуть ключ сортировки компонента по обозначению."""
+        parts = DIGITS_REGEXP.split(comp.getText("ref"))
+        for i in range(1, len(parts), 2):
+            parts[i] = int(parts[i])
+        return parts
+
+    def _loadFiles(self):
+        """Загрузить все файлы иерархии схемы.
+
+        Файлы загружаются по уровням иерархии: файлы листов одного уровня
+        загружаются параллельно.
+
+        """
+        pending = [self.fileName]
+        with concurrent.futures.ThreadPoolExecutor(
+                max_workers=min(SCHEMATIC_MAX_WORKERS, os.cpu_count() or 1)
+            ) as executor:
+            while pending:
+                loaded = list(executor.map(self._loadFile, pending))
+                for fileName, root in zip(pending, loaded):
+                    self._files[fileName] = root
+                pending = []
+                for root in loaded:
+                    for sheet in root.items:
+                        if sheet.name != "sheet":
+                            continue
+                        sheetFileName = self._getSheetFileName(sheet)
+                        if sheetFileName \
+                            and sheetFileName not in self._files \
+                            and sheetFileName not in pending:
+                                pending.append(sheetFileName)
+
+    @staticmethod
+    def _loadFile(fileName):
+        """Разобрать файл схемы."""
+        if not os.path.isfile(fileName):
+            raise ParseException(
+                1,
+                1,
+                "Файл листа схемы \"{}\" не найден.".format(fileName)
+            )
+        lexer = _createLexer(fileName)
+        try:
+            root, _ = Netlist._buildTree(
+                _parse(lexer, SCHEMATIC_SKIP),
+                indexNames=set()
+            )
+        except ParseException as error:
+            error.value = "Файл \"{}\"\n{}".format(
+                os.path.basename(fileName),
+                error.value
+            )
+            raise
+        finally:
+            lexer.close()
+        if root is None or root.name != "kicad_sch":
+            raise ParseException(
+                1,
+                1,
+                "Файл \"{}\" не является файлом схемы KiCad.".format(fileName)
+            )
+        return root
+
+    def _getSheetFileName(self, sheet):
+        """Вернуть полное имя файла листа схемы."""
+        properties = self._getProperties(sheet)
+        sheetFileName = properties.get("Sheetfile") \
+            or properties.get("Sheet file")
+        if not sheetFileName:
+            return ""
+        return os.path.normpath(os.path.join(self.baseDir, sheetFileName))
+
+    @staticmethod
+    def _getProperties(item):
+        """Вернуть словарь свойств (полей) элемента схемы."""
+        properties = {}
+        for prop in item.items:
+            if prop.name == "property" and type(prop.text) is list:
+                properties.setdefault(prop.text[0], prop.text[1])
+        return properties
+
+    @staticmethod
+    def _addItem(parent, name, text=None):
+        """Добавить дочерний элемент."""
+        item = NetlistItem(parent, name, text=text)
+        parent.items.append(item)
         return item
 
+    def _readSheet(self, design, components, fileName, names, tstamps, path, chain):
+        """Прочитать лист схемы и вложенные в него листы.
+
+        Аргументы:
+        design (NetlistItem) -- элемент, в который добавляются листы;
+        components (NetlistItem) -- элемент, в который добавляются
+            компоненты;
+        fileName (str) -- полное имя файла листа;
+        names (str) -- путь к листу из имён листов (/Лист/);
+        tstamps (str) -- путь к листу из идентификаторов листов (/uuid/);
+        path (str) -- путь экземпляра листа (/uuid корня/uuid листа);
+        chain (str) -- путь экземпляра листа без идентификатора корня
+            (используется в файлах KiCad 6).
+
+        """
+        root = self._files[fileName]
+        self._sheetNumber += 1
+        sheet = self._addItem(design, "sheet")
+        self._addItem(sheet, "number", str(self._sheetNumber))
+        self._addItem(sheet, "name", names)
+        self._addItem(sheet, "tstamps", tstamps)
+        titleBlock = self._addItem(sheet, "title_block")
+        for item in root.items:
+            if item.name == "title_block":
+                for field in item.items:
+                    if field.name == "comment":
+                        if type(field.text) is list and len(field.text) > 1:
+                            comment = self._addItem(titleBlock, "comment")
+                            self._addItem(comment, "number", field.text[0])
+                            self._addItem(comment, "value", field.text[1])
+                    elif field.name in ("title", "company", "rev", "date"):
+                        self._addItem(titleBlock, field.name, field.text)
+                break
+        self._addItem(
+            titleBlock,
+            "source",
+            os.path.relpath(fileName, self.baseDir)
+        )
+        subsheets = []
+        for item in root.items:
+            if item.name == "symbol":
+                self._readSymbol(components, root, item, names, tstamps, path, chain)
+            elif item.name == "sheet":
+                subsheets.append(item)
+        for subsheet in subsheets:
+            sheetFileName = self._getSheetFileName(subsheet)
+            uuid = subsheet.getText("uuid")
+            if sheetFileName not in self._files \
+                or uuid in path.split("/"):
+                    # Файл не указан или лист вложен сам в себя.
+                    continue
+            properties = self._getProperties(subsheet)
+            sheetName = properties.get("Sheetname") \
+                or properties.get("Sheet name") \
+                or uuid
+            self._readSheet(
+                design,
+                components,
+                sheetFileName,
+                names + sheetName + "/",
+                tstamps + uuid + "/",
+                path + "/" + uuid,
+                chain + "/" + uuid
+            )
+
+    def _getReference(self, symbol, path, chain):
+        """Определить обозначение экземпляра компонента."""
+        for instances in symbol.items:
+            if instances.name != "instances":
+                continue
+            for project in instances.items:
+                for instance in project.items:
+                    if instance.name == "path" and instance.text == path:
+                        return instance.getText("reference")
+        legacyInstance = self._legacyInstances.get(
+            chain + "/" + symbol.getText("uuid")
+        )
+        if legacyInstance is not None:
+            return legacyInstance.getText("reference")
+        return self._getProperties(symbol).get("Reference", "")
+
+    def _readSymbol(self, components, root, symbol, names, tstamps, path, chain):
+        """Добавить компонент схемы."""
+        reference = self._getReference(symbol, path, chain)
+        if not reference or reference.startswith("#"):
+            # Символы питания и т.п. в список цепей не попадают.
+            return
+        uuid = symbol.getText("uuid")
+        comp = self._components.get(reference)
+        if comp is not None:
+            # Очередная секция многосекционного компонента.
+            for item in comp.items:
+                if item.name == "tstamps":
+                    if type(item.text) is not list:
+                        item.text = [item.text]
+                    item.text.append(uuid)
+            return
+        properties = self._getProperties(symbol)
+        comp = NetlistItem(components, "comp")
+        components.items.append(comp)
+        self._components[reference] = comp
+        self._addItem(comp, "ref", reference)
+        self._addItem(comp, "value", properties.get("Value") or None)
+        self._addItem(comp, "footprint", properties.get("Footprint") or None)
+        self._addItem(comp, "datasheet", properties.get("Datasheet") or None)
+        fields = self._addItem(comp, "fields")
+        fieldNames = [
+            name for name in properties
+            if name not in SCHEMATIC_BASIC_FIELDS and not name.startswith("ki_")
+        ]
+        for name in fieldNames + ["Footprint", "Datasheet", "Description"]:
+            if name in properties:
+                field = self._addItem(fields, "field", properties[name] or None)
+                self._addItem(field, "name", name)
+        libId = symbol.getText("lib_id")
+        libName = symbol.getText("lib_name") or libId
+        lib, _, part = libId.rpartition(":")
+        libsource = self._addItem(comp, "libsource")
+        self._addItem(libsource, "lib", lib)
+        self._addItem(libsource, "part", part)
+        self._addItem(
+            libsource,
+            "description",
+            self._getLibDescription(root, libName) \
+                or properties.get("Description", "")
+        )
+        for name in fieldNames:
+            prop = self._addItem(comp, "property")
+            self._addItem(prop, "name", name)
+            self._addItem(prop, "value", properties[name])
+        if symbol.getText("in_bom") == "no":
+            prop = self._addItem(comp, "property")
+            self._addItem(prop, "name", "exclude_from_bom")
+        if symbol.getText("dnp") == "yes":
+            prop = self._addItem(comp, "property")
+            self._addItem(prop, "name", "dnp")
+        sheetpath = self._addItem(comp, "sheetpath")
+        self._addItem(sheetpath, "names", names)
+        self._addItem(sheetpath, "tstamps", tstamps)
+        self._addItem(comp, "tstamps", uuid)
+
+    def _getLibDescription(self, root, libName):
+        """Вернуть описание компонента из библиотеки, встроенной в схему."""
+        for libSymbols in root.items:
+            if libSymbols.name != "lib_symbols":
+                continue
+            for libSymbol in libSymbols.items:
+                if libSymbol.name == "symbol" and libSymbol.text == libName:
+                    properties = self._getProperties(libSymbol)
+                    return properties.get("Description") \
+                        or properties.get("ki_description", "")
+        return ""
+
+
+def _iterTree(item):
+    """Перебор элементов готового дерева в виде событий разбора.
+
+    Возвращается итератор, выдающий кортежи вида (событие, элемент)
+    (см. _parse).
+
+    """
+    yield "start", item
+    # Элементы могут быть отсоединены при обработке событий.
+    for subitem in list(item.items):
+        for event in _iterTree(subitem):
+            yield event
+    yield "end", item
+
+
+def _createLexer(fileName, useMmap=False):
+    """Создать лексический анализатор для файла списка цепей."""
+    if useMmap:
+        return _MmapLexer(fileName)
+    return _Lexer(fileName)
+
+
+def _iterEvents(fileName, skip=None, useMmap=False):
+    """Разобрать файл списка цепей в соответствии с его форматом.
+
+    Возвращается итератор, выдающий кортежи вида (событие, элемент)
+    (см. _parse).
+
+    """
+    if fileName.endswith(".net"):
+        lexer = _createLexer(fileName, useMmap)
+        try:
+            for event in _parse(lexer, skip):
+                yield event
+        finally:
+            lexer.close()
+    elif fileName.endswith(".xml"):
+        for event in _parseXml(fileName, skip):
+            yield event
+    elif fileName.endswith(".kicad_sch"):
+        export = _SchematicReader(fileName).read()
+        for subitem in list(export.items):
+            if skip and subitem.name in skip:
+                subitem.detach()
+        for event in _iterTree(export):
+            yield event
+    else:
+        raise ParseException(1, 1, "Формат файла не поддерживается.")
+
+
+def iterparse(fileName, events=("end",), tags=None, skip=None, useMmap=False):
+    """Последовательно разобрать список цепей.
+
+    В отличие от Netlist, файл не загружается в память целиком: элементы
+    возвращаются по мере их разбора. Дерево элементов строится так же, как и
+    в Netlist, но вызывающая сторона может отсоединить уже обработанный
+    элемент (NetlistItem.detach) и тем самым освободить занимаемую им память.
+    Если прекратить перебор досрочно, оставшаяся часть файла не будет
+    прочитана.
+
+    Возвращается итератор, выдающий кортежи вида (событие, элемент).
+
+    Аргументы:
+    fileName (str) -- полное имя файла списка цепей (*.net, *.xml) или
+        корневого файла схемы (*.kicad_sch);
+    events (tuple of str) -- события, о которых нужно сообщать: "start" --
+        элемент открыт (дочерние элементы ещё не разобраны), "end" --
+        элемент закрыт (разобран полностью);
+    tags (set of str) -- имена элементов, о которых нужно сообщать; если
+        не указаны -- сообщать обо всех элементах;
+    skip (set of str) -- имена разделов верхнего уровня (например "nets",
+        "libparts"), которые нужно пропустить без разбора;
+    useMmap (bool) -- разбирать отображённый в память файл (декодируются
+        только значения разобранных элементов; только для *.net).
+
+    """
+    for event, item in _iterEvents(fileName, skip, useMmap):
+        if event in events and (tags is None or item.name in tags):
+            yield event, item
+
+
+class Netlist():
+    """Список цепей."""
+
+    def __init__(self, fileName, skip=None, useMmap=False, indexNames=None):
+        """Считать список цепей.
+
+        Загрузить содержимое файла списка цепей KiCad (*.net, *.xml)
+        и построить его объектное представление. Вместо списка цепей может
+        быть указан корневой файл схемы (*.kicad_sch) -- в этом случае будет
+        построено дерево с данными о листах и компонентах схемы.
+
+        Аргументы:
+        fileName (str) -- полное имя файла списка цепей;
+        skip (set of str) -- имена разделов верхнего уровня (например "nets",
+            "libparts"), которые не нужно загружать. Пропущенные разделы
+            будут отсутствовать и при сохранении списка цепей;
+        useMmap (bool) -- разбирать отображённый в память файл, а не
+            считывать его содержимое (только для *.net). При этом
+            декодируются только значения загружаемых элементов;
+        indexNames (set of str) -- имена элементов, для которых при разборе
+            строится указатель, ускоряющий find и items; если не указаны --
+            используются имена из INDEX_NAMES.
+
+        Атрибуты:
+        fileName (str) -- полное имя файла списка цепей.
+        data (NetlistItem) -- объектное представление списка цепей.
+
+        """
+        if indexNames is None:
+            indexNames = INDEX_NAMES
+        self.fileName = fileName
+        self.data = None
+        self._index = None
+        self._indexNames = indexNames
+        self.data, self._index = self._buildTree(
+            _iterEvents(fileName, skip, useMmap),
+            indexNames
+        )
+
+    @staticmethod
+    def _buildTree(events, indexNames=INDEX_NAMES):
+        root = None
+        index = {}
+        # При построении дерева создаётся множество объектов, ни один из
+        # которых не становится мусором, поэтому циклический сборщик
+        # мусора на время разбора отключается.
+        gcEnabled = gc.isenabled()
+        gc.disable()
+        try:
+            for event, item in events:
+                if event != "start":
+                    continue
+                if item.parent is None:
+                    root = item
+                if item.name in indexNames:
+                    # Элементы добавляются в порядке следования в файле.
+                    index.setdefault(item.name, []).append(item)
+        finally:
+            if gcEnabled:
+                gc.enable()
+        return root, index
+
     @staticmethod
     def _formatNetText(text):
         text = text.replace("\\", "\\\\")
@@ -212,23 +996,95 @@ class Netlist():
         text = '"{}"'.format(text)
         return text
 
-    def _formatNetItem(self, item):
-        output = '(' + item.name
+    def _writeNetItem(self, netlist, item, depth=0):
+        """Записать элемент списка цепей в файл.
+
+        Элемент записывается по мере обхода дерева, без формирования
+        промежуточных строк. Дочерние элементы располагаются на отдельных
+        строках с отступом, соответствующим глубине вложенности. Начальный
+        отступ самого элемента записывается вызывающей стороной.
+
+        """
+        netlist.write('(' + item.name)
         if item.items:
-            output += '\n'
+            indent = '\n' + '\t' * (depth + 1)
             for subitem in item.items:
-                childText = self._formatNetItem(subitem)
-                for line in childText.splitlines():
-                    output += "\t{}\n".format(line)
+                netlist.write(indent)
+                self._writeNetItem(netlist, subitem, depth + 1)
+            if item.text is None:
+                netlist.write('\n' + '\t' * depth)
         if item.text is not None:
-            output = output.rstrip('\n')
             if type(item.text) is list:
                 for val in item.text:
-                    output += ' ' + self._formatNetText(val)
+                    netlist.write(' ' + self._formatNetText(val))
+            else:
+                netlist.write(' ' + self._formatNetText(item.text))
+        netlist.write(')')
+
+    def _writeXmlItem(self, netlist, item, depth=0):
+        """Записать элемент списка цепей в файл в формате XML.
+
+        Дочерние элементы, которые в формате XML являются атрибутами
+        (см. XML_ATTRIBUTES), записываются в виде атрибутов.
+
+        """
+        indent = "  " * depth
+        netlist.write(indent + '<' + item.name)
+        attributeNames = XML_ATTRIBUTES.get(item.name, ())
+        subitems = []
+        for subitem in item.items:
+            if subitem.name in attributeNames and not subitem.items:
+                text = subitem.text
+                if type(text) is list:
+                    text = ' '.join(text)
+                elif text is None:
+                    text = ""
+                netlist.write(' {}="{}"'.format(subitem.name, html.escape(text)))
             else:
-                output += ' ' + self._formatNetText(item.text)
-        output += ')'
-        return output
+                subitems.append(subitem)
+        text = item.text
+        if type(text) is list:
+            text = ' '.join(text)
+        if not subitems and text is None:
+            netlist.write('/>\n')
+            return
+        netlist.write('>')
+        if text is not None:
+            netlist.write(html.escape(text, quote=False))
+        if subitems:
+            netlist.write('\n')
+            for subitem in subitems:
+                self._writeXmlItem(netlist, subitem, depth + 1)
+            netlist.write(indent)
+        netlist.write('</{}>\n'.format(item.name))
+
+    def _getIndexedItems(self, name):
+        """Вернуть список элементов с указанным именем из указателя.
+
+        Если указатель для элементов с таким именем не строился --
+        будет возвращено значение None.
+
+        """
+        if self._index is None or name not in self._indexNames:
+            return None
+        return self._index.get(name, [])
+
+    @staticmethod
+    def _isInside(item, ancestor, name=None):
+        """Проверить, что элемент находится внутри указанного элемента.
+
+        Элемент считается находящимся внутри самого себя. Если указано имя,
+        то между элементом и указанным элементом (включительно) не должно
+        быть других элементов с таким именем.
+
+        """
+        while item is not None:
+            if item is ancestor:
+                return True
+            item = item.parent
+            if name is not None and item is not None and item.name == name:
+                return False
+        return False
 
     def find(self, name, item=None):
         """Найти элемент списка цепей с указанным именем.
@@ -238,10 +1094,19 @@ class Netlist():
         Если элемент найти не удастся -- будет возвращено значение None.
 
         Аргументы:
-        name (str) -- имя элемента.
+        name (str) -- имя элемента;
+        item (NetlistItem) -- элемент, внутри которого выполняется поиск;
+            если не указан -- поиск по всему списку цепей с использованием
+            указателя.
 
         """
         if item is None:
+            indexedItems = self._getIndexedItems(name)
+            if indexedItems is not None:
+                for indexedItem in indexedItems:
+                    if self._isInside(indexedItem, self.data):
+                        return indexedItem
+                return None
             item = self.data
         if item.name == name:
             return item
@@ -259,10 +1124,19 @@ class Netlist():
         цепей).
 
         Аргументы:
-        name (str) -- имя элемента.
+        name (str) -- имя элемента;
+        item (NetlistItem) -- элемент, внутри которого выполняется поиск;
+            если не указан -- поиск по всему списку цепей с использованием
+            указателя.
 
         """
         if item is None:
+            indexedItems = self._getIndexedItems(name)
+            if indexedItems is not None:
+                for indexedItem in indexedItems:
+                    if self._isInside(indexedItem, self.data, name):
+                        yield indexedItem
+                return
             item = self.data
         if item.name == name:
             yield item
@@ -282,8 +1156,8 @@ class Netlist():
             fileName = self.fileName
         with open(fileName, 'w', encoding='utf-8') as netlist:
             if fileName.endswith(".net"):
-                netlist.write(self._formatNetItem(self.data))
+                self._writeNetItem(netlist, self.data)
             else:
                 netlist.write('<?xml version="1.0" encoding="UTF-8"?>\n')
-                netlist.write(self._formatXmlItem(self.data))
+                self._writeXmlItem(netlist, self.data)
 
@@ -0,0 +1,282 @@
+"""Кэш данных, извлечённых из списков цепей.
+
+Разбор большого списка цепей занимает значительное время, при этом
+одни и те же данные о схеме запрашиваются многократно (при построении
+документа, заполнении основной надписи, обновлении). Извлечённые данные
+сохраняются в каталоге кэша пользователя и используются повторно, пока
+файл списка цепей остаётся неизменным (совпадают размер и время
+последнего изменения). Для иерархической схемы проверяются также все
+файлы вложенных листов.
+
+Запись, заменённая данными изменённого файла, сохраняется как предыдущая,
+что позволяет определить, какие изменения были внесены в схему.
+
+"""
+
+import hashlib
+import marshal
+import os
+import sys
+import tempfile
+import time
+
+# Версия формата записей. Должна изменяться при изменении состава
+# сохраняемых данных, чтобы устаревшие записи не использовались.
+CACHE_VERSION = 3
+# Записи, которые не использовались дольше указанного времени, удаляются.
+CACHE_MAX_AGE = 30 * 24 * 60 * 60 # 30 дней
+# Если общий размер кэша превышает указанный, удаляются наиболее давно
+# использованные записи.
+CACHE_MAX_SIZE = 64 * 1024 * 1024 # 64 МиБ
+CACHE_FILE_EXT = ".cache"
+CACHE_PREV_FILE_EXT = ".prev" + CACHE_FILE_EXT
+
+
+def getCacheDir():
+    """Вернуть путь к каталогу кэша."""
+    if sys.platform == "win32":
+        baseDir = os.environ.get("LOCALAPPDATA") or os.environ["APPDATA"]
+    else:
+        baseDir = os.environ.get("XDG_CACHE_HOME") \
+            or os.path.expanduser("~/.cache")
+    return os.path.join(baseDir, "eskd-templates", "netlists")
+
+def getCacheFileName(fileName, previous=False):
+    """Вернуть имя файла записи кэша для указанного файла.
+
+    Аргументы:
+    fileName (str) -- полное имя файла, из которого были получены данные;
+    previous (bool) -- вернуть имя файла предыдущей записи.
+
+    """
+    key = hashlib.sha1(
+        os.path.abspath(fileName).encode("utf-8", "surrogateescape")
+    ).hexdigest()
+    ext = CACHE_PREV_FILE_EXT if previous else CACHE_FILE_EXT
+    return os.path.join(getCacheDir(), key + ext)
+
+def _readRecord(cacheFileName, fileName):
+    """Считать запись кэша.
+
+    Возвращаемое значение -- запись или None, если запись отсутствует,
+        повреждена, имеет другой формат или относится к другому файлу.
+
+    """
+    try:
+        with open(cacheFileName, "rb") as cacheFile:
+            # Разбор предварительно считанных данных выполняется
+            # значительно быстрее, чем чтение из файла по частям.
+            record = marshal.loads(cacheFile.read())
+    except (OSError, EOFError, ValueError, TypeError):
+        return None
+    if type(record) is not dict \
+        or record.get("version") != CACHE_VERSION \
+        or record.get("path") != os.path.abspath(fileName):
+            return None
+    return record
+
+def _getFileState(fileName):
+    """Вернуть состояние файла (полное имя, размер, время изменения).
+
+    Если файл недоступен, возбуждается OSError.
+
+    """
+    stat = os.stat(fileName)
+    return (os.path.abspath(fileName), stat.st_size, stat.st_mtime_ns)
+
+def _getRecordState(record):
+    """Вернуть состояние файлов, для которого была сохранена запись."""
+    return (
+        record.get("size"),
+        record.get("mtime"),
+        [tuple(state) for state in record.get("dependencies", ())]
+    )
+
+def getFileStates(fileName):
+    """Получить состояние файла перед извлечением из него данных.
+
+    Состояние должно быть получено до разбора файла и передано в save():
+    если файл изменится во время разбора, сохранённая запись сразу же
+    окажется устаревшей. Вместе с файлом запоминается состояние известных
+    по имеющейся записи зависимостей (например, вложенных листов схемы).
+
+    Аргументы:
+    fileName (str) -- полное имя файла, из которого извлекаются данные.
+
+    Возвращаемое значение -- кортеж (время начала в нс, словарь
+        {полное имя: состояние}) или None, если файл недоступен.
+
+    """
+    startTime = time.time_ns()
+    try:
+        states = {os.path.abspath(fileName): _getFileState(fileName)}
+    except OSError:
+        return None
+    record = _readRecord(getCacheFileName(fileName), fileName)
+    if record is not None:
+        for state in record.get("dependencies", ()):
+            try:
+                states[state[0]] = _getFileState(state[0])
+            except (OSError, TypeError, IndexError):
+                pass
+    return (startTime, states)
+
+def load(fileName):
+    """Получить сохранённые данные для указанного файла.
+
+    Аргументы:
+    fileName (str) -- полное имя файла, из которого были получены данные.
+
+    Возвращаемое значение -- сохранённые данные или None, если данных нет
+        или файл был изменён после их сохранения.
+
+    """
+    cacheFileName = getCacheFileName(fileName)
+    try:
+        stat = os.stat(fileName)
+    except OSError:
+        return None
+    record = _readRecord(cacheFileName, fileName)
+    if record is None \
+        or record.get("size") != stat.st_size \
+        or record.get("mtime") != stat.st_mtime_ns:
+            return None
+    for state in record.get("dependencies", ()):
+        try:
+            if _getFileState(state[0]) != tuple(state):
+                return None
+        except (OSError, TypeError, IndexError):
+            return None
+    try:
+        # Время изменения записи -- время её последнего использования.
+        os.utime(cacheFileName)
+    except OSError:
+        pass
+    return record.get("data")
+
+def loadPrevious(fileName):
+    """Получить данные, сохранённые для предыдущей версии файла.
+
+    Аргументы:
+    fileName (str) -- полное имя файла, из которого были получены данные.
+
+    Возвращаемое значение -- данные, которые были получены из файла до
+        его последнего изменения, или None, если таких данных нет.
+
+    """
+    record = _readRecord(getCacheFileName(fileName, previous=True), fileName)
+    if record is None:
+        return None
+    return record.get("data")
+
+def save(fileName, data, fileStates, dependencies=()):
+    """Сохранить данные, полученные из указанного файла.
+
+    Если для файла уже имеется действительная запись, полученная из
+    другого состояния файлов, она сохраняется как предыдущая. Если запись
+    для того же состояния уже имеется (например, при параллельном
+    построении), она не изменяется. Если файлы изменились во время
+    разбора, данные не сохраняются.
+    Ошибки записи игнорируются, так как кэш не является обязательным.
+
+    Аргументы:
+    fileName (str) -- полное имя файла, из которого были получены данные;
+    data -- данные (должны поддерживаться модулем marshal);
+    fileStates -- состояние файлов до разбора (см. getFileStates);
+    dependencies (iterable) -- имена других файлов, из которых были
+        получены данные (например, вложенных листов схемы); при изменении
+        любого из них запись считается устаревшей.
+
+    """
+    if fileStates is None:
+        return
+    startTime, states = fileStates
+    cacheFileName = getCacheFileName(fileName)
+    cacheDir = os.path.dirname(cacheFileName)
+    try:
+        # Если файл изменился во время разбора, данные могут не
+        # соответствовать ни одному из его состояний.
+        fileState = states[os.path.abspath(fileName)]
+        if _getFileState(fileName) != fileState:
+            return
+        _, size, mtime = fileState
+        dependencyStates = []
+        for name in dependencies:
+            state = _getFileState(name)
+            prevState = states.get(state[0])
+            if prevState is not None and prevState != state:
+                return
+            # Зависимость, ставшая известной только при разборе, не должна
+            # изменяться после его начала.
+            if prevState is None and state[2] >= startTime:
+                return
+            dependencyStates.append(state)
+        record = {
+            "version": CACHE_VERSION,
+            "path": os.path.abspath(fileName),
+            "size": size,
+            "mtime": mtime,
+            "dependencies": dependencyStates,
+            "data": data,
+        }
+        os.makedirs(cacheDir, exist_ok=True)
+        # Запись выполняется во временный файл, который затем заменяет
+        # существующий, чтобы параллельно работающие документы никогда
+        # не прочитали запись частично.
+        tempFd, tempFileName = tempfile.mkstemp(
+            suffix=".tmp",
+            dir=cacheDir
+        )
+        try:
+            with os.fdopen(tempFd, "wb") as cacheFile:
+                cacheFile.write(marshal.dumps(record))
+            prevRecord = _readRecord(cacheFileName, fileName)
+            if prevRecord is None:
+                os.replace(tempFileName, cacheFileName)
+            elif _getRecordState(prevRecord) != _getRecordState(record):
+                os.replace(
+                    cacheFileName,
+                    getCacheFileName(fileName, previous=True)
+                )
+                os.replace(tempFileName, cacheFileName)
+            else:
+                # Запись для этого состояния уже сохранена (например,
+                # параллельно работающим документом).
+                os.remove(tempFileName)
+        except BaseException:
+            if os.path.exists(tempFileName):
+                os.remove(tempFileName)
+            raise
+    except (OSError, ValueError):
+        return
+    evict()
+
+def evict(maxAge=CACHE_MAX_AGE, maxSize=CACHE_MAX_SIZE):
+    """Удалить устаревшие записи кэша.
+
+    Удаляются записи, которые не использовались дольше maxAge секунд.
+    Затем, если общий размер оставшихся записей превышает maxSize байт,
+    удаляются наиболее давно использованные записи.
+
+    """
+    cacheDir = getCacheDir()
+    entries = []
+    try:
+        with os.scandir(cacheDir) as dirEntries:
+            for entry in dirEntries:
+                if entry.name.endswith(CACHE_FILE_EXT) and entry.is_file():
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+    except OSError:
+        return
+    entries.sort(reverse=True)
+    oldest = time.time() - maxAge
+    totalSize = 0
+    for mtime, size, path in entries:
+        if mtime >= oldest and totalSize + size <= maxSize:
+            totalSize += size
+            continue
+        try:
+            os.remove(path)
+        except OSError:
+            pass